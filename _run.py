@@ -3,9 +3,10 @@ import sys
 import tkinter
 import traceback
 import functools
+import itertools
 import webbrowser
 import tkinter
-from tkinter import filedialog, ttk
+from tkinter import filedialog, simpledialog, ttk
 import operator
 from operator import itemgetter
 
@@ -14,7 +15,7 @@ matplotlib.use('TkAgg')
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
-import tabs, utils, actions, dirs, settings
+import keywords, ngrams, parallel, sketch, tabs, statscache, tableview, tokenizer, tracing, utils, actions, dirs, settings, zipfplot
 
 m_root = None
 m_tab_manager = None
@@ -22,6 +23,10 @@ m_tab_manager = None
 m_dialog = None
 m_notebook = None
 
+# the statistics dialog shows this many of the most common n-grams
+_MAX_NGRAM_ROWS = 100000
+_KEYWORDS_PER_DOCUMENT = 10
+
 
 def init():
     global m_root
@@ -61,6 +66,15 @@ def quit():
         m_tab_manager.close_tab(tab)
     m_root.destroy()
 
+def _iter_file_chunks(path, encoding, n=10000):
+    # Yield the content of a file as chunks of n lines.
+    with open(path, 'r', encoding=encoding) as file:
+        while True:
+            chunk = ''.join(itertools.islice(file, n))
+            if not chunk:
+                break
+            yield chunk
+
 def _setup_actions():
     def new_file():
         m_tab_manager.add_tab(tabs.FileTab(m_tab_manager))
@@ -71,15 +85,7 @@ def _setup_actions():
 
         if not paths:
             return
-        for path in paths:
-            try:
-                tab = tabs.FileTab.open_file(m_tab_manager, path)
-            except(UnicodeError, OSError) as e:
-                utils.errordialog(type(e).__name__, "Opening failed!",
-                        traceback.format_exc())
-                continue
-
-            m_tab_manager.add_tab(tab)
+        m_tab_manager.open_files(paths)
 
     def close_selected_tab():
         tab = m_tab_manager.select()
@@ -87,38 +93,124 @@ def _setup_actions():
             m_tab_manager.close_tab(tab)
 
 
+    def load_or_tokenize(key, iter_chunks, path=None, size=0,
+                         from_file=False):
+        # Return a tokenizer.TokenSequence of the text that iter_chunks()
+        # returns. key is statscache.get_key() of the text. Texts of at
+        # least parallel.MIN_SIZE characters are tokenized in several
+        # processes, and with from_file=True the processes read the file
+        # at path instead of using iter_chunks().
+        tokens = statscache.load(key)
+        if tokens is None:
+            config = settings.get_section('General')
+            with tracing.span('tokenize', path=path, size=size):
+                if size < parallel.MIN_SIZE:
+                    tokens = tokenizer.TokenSequence.from_chunks(
+                        iter_chunks())
+                elif from_file:
+                    tokens = parallel.tokenize_file(path, config['encoding'])
+                else:
+                    tokens = parallel.tokenize_chunks(iter_chunks)
+            statscache.store(key, tokens,
+                             config['stats_cache_size'] * 1024 * 1024)
+        return tokens
+
+    def get_tokenize_args(tab):
+        # Return keyword arguments for load_or_tokenize().
+        if isinstance(tab, tabs.BigFileTab):
+            return {'path': tab.path, 'size': os.path.getsize(tab.path),
+                    'from_file': True}
+        if isinstance(tab, tabs.FileTab) and not tab.is_hibernating():
+            return {'path': tab.path, 'size': len(tab.textwidget.document)}
+        return {'path': getattr(tab, 'path', None)}
+
+    def get_tokenized(tab):
+        # Return a tokenizer.TokenSequence of the words in a tab. This
+        # tokenizes only if the same text hasn't been tokenized before.
+        if isinstance(tab, tabs.TokensTab):
+            return tab.tokens
+        if isinstance(tab, tabs.FileTab):
+            # tokenizing a half-loaded file would give wrong results
+            tab.finish_loading()
+        key = statscache.get_key(tab.iter_chunks())
+        return load_or_tokenize(key, tab.iter_chunks,
+                                **get_tokenize_args(tab))
+
     def tokenize_file(show=True):
         tab = m_tab_manager.select()
-        start = 1
-        content = tab.textwidget.get('%d.0' % start, 'end - 1 char')
-        # tokenize the content and display it on a new tab
-        words = []
-        new_content= ''
-        lines = content.split('\n')
-        for line in lines:
-            i = 0
-            while i < len(line):
-                while (i < len(line)) and (not line[i].isalpha()):
-                    i += 1
-                word = ''
-                while (i < len(line)) and line[i].isalpha():
-                    word += line[i]
-                    i += 1
-                if word != '':
-                    words.append(word.lower())
-        for word in words:
-            new_content += (word + "\n")
+        if isinstance(tab, tabs.TokensTab):
+            # already tokenized
+            return
+        tokens = get_tokenized(tab)
         if show:
-            # tokens should be kept as a property of FileTab
-            new_tab = m_tab_manager.add_tab(tabs.FileTab(m_tab_manager))
-            new_tab.textwidget.insert('1.0', new_content)
-            #tab.tokens (property setter)
-            new_tab.tokens = words
+            # display the tokens in a table on a new tab, the tabs can
+            # share the tokens because they are immutable
+            m_tab_manager.add_tab(tabs.TokensTab(
+                m_tab_manager, tokens, "Tokens of " + tab.title))
         #tab.tokens (property setter)
-        tab.tokens = words
+        tab.tokens = tokens
+
+    def goto_line():
+        tab = m_tab_manager.select()
+        lineno = simpledialog.askinteger(
+            "Go to Line", "Line number:", minvalue=1, parent=m_root)
+        if lineno is not None:
+            tab.goto_line(lineno)
 
     # word frequency, word count, keywords(top 6)
     def get_statistics():
+        with tracing.span('statistics'):
+            if settings.get_section('General')['approximate_statistics']:
+                _get_approximate_statistics()
+            else:
+                _get_statistics()
+
+    def _get_approximate_statistics():
+        # the words are counted chunk by chunk in fixed memory, without
+        # tokenizing the whole file or using the cache, see sketch.py
+        tab = m_tab_manager.select()
+        if isinstance(tab, tabs.FileTab):
+            tab.finish_loading()
+        error = settings.get_section('General')['approximate_error']
+        counter = sketch.ApproximateCounter(error / 1000000)
+        with tracing.span('count', approximate=True):
+            counter.add_chunks(tab.iter_chunks())
+            estimates = counter.most_common()
+
+        with tracing.span('render'):
+            _show_approximate_statistics_dialog(counter, estimates)
+
+    def _show_approximate_statistics_dialog(counter, estimates):
+        dialog = tkinter.Toplevel()
+        dialog.title("Statistics (approximate)")
+        dialog.geometry('600x400')
+
+        text = ("Total words: %d\n"
+                "Frequencies are at most %d too big, and with %g%% "
+                "probability at most %d too big.\n"
+                "Every word more common than %d is in the table, and its "
+                "frequency is at least the number in the Minimum column.\n"
+                "Memory used for counting: %.1f MB" % (
+                    counter.total, counter.max_error,
+                    100 * (1 - counter.sketch.delta),
+                    counter.likely_max_error, counter.max_error,
+                    counter.nbytes / (1024 * 1024)))
+        ttk.Label(dialog, text=text, wraplength=580).pack(
+            side='top', anchor='w')
+        tableview.WordTable(
+            dialog, [estimate.word for estimate in estimates],
+            numpy.arange(len(estimates)), [
+                ("Frequency", numpy.array(
+                    [estimate.count for estimate in estimates],
+                    dtype=numpy.int64)),
+                ("Minimum", numpy.array(
+                    [estimate.minimum for estimate in estimates],
+                    dtype=numpy.int64)),
+            ],
+        ).pack(fill='both', expand=True)
+        dialog.transient(m_root)
+
+    def _get_statistics():
         #read in stopwords
         m_stop_words = []
         path = os.path.dirname(os.path.abspath(__file__))
@@ -128,29 +220,42 @@ def _setup_actions():
             content = file.read()
         m_stop_words = content.split('\n')
 
-        tab = m_tab_manager.select()
-        #tab.tokens (property getter)
-        words = tab.tokens
-        if len(words) == 0:
-            tokenize_file(show=False)
-            #tab.tokens (property getter)
-            words = tab.tokens
-        # compute word frequency via dictionary
-        dict = {}
-        for word in words:
-            if word not in dict:
-                dict[word] = 1
-            else:
-                dict[word] += 1
-
-        sorted_dict = sorted(dict.items(),key=operator.itemgetter(1),reverse=True)
-        new_dict = {}
-        ranking_text = 'Total words: ' + str(len(words)) + "\nWord frequencies: \n"
-        for key, val in sorted_dict:
-            ranking_text += (key + "\t\t" + str(val) + "\n")
-            if key not in m_stop_words:
-                new_dict[key] = val
-
+        tokens = get_tokenized(m_tab_manager.select())
+
+        with tracing.span('count', words=len(tokens)):
+            # numpy.bincount() over the word ids, or counts from the cache
+            counts = tokens.counts()
+            # the graph shows the most common words that aren't stop words
+            top_words = []
+            for key, val in tokens.most_common():
+                if key not in m_stop_words:
+                    top_words.append((key, val))
+                    if len(top_words) == 6:
+                        break
+
+        with tracing.span('ngrams'):
+            bigrams = ngrams.count_ngrams(tokens, 2)
+            trigrams = ngrams.count_ngrams(tokens, 3)
+            collocations = ngrams.collocations(tokens, bigrams)
+
+        with tracing.span('render'):
+            _show_statistics_dialog(tokens, counts, top_words, m_stop_words,
+                                    bigrams, trigrams, collocations)
+
+    def _add_ngram_table(notebook, text, tokens, grams, columns):
+        # only the beginning of the arrays is shown, joining millions of
+        # n-grams to strings would take a long time
+        grams = grams[:_MAX_NGRAM_ROWS]
+        table = tableview.WordTable(
+            notebook, ngrams.join_grams(tokens, grams),
+            numpy.arange(len(grams)),
+            [(heading, numbers[:_MAX_NGRAM_ROWS])
+             for heading, numbers in columns],
+            word_heading="Words")
+        notebook.add(table, text=text)
+
+    def _show_statistics_dialog(tokens, counts, top_words, m_stop_words,
+                                bigrams, trigrams, collocations):
         # setup statistics dialog
         m_dialog = tkinter.Toplevel()
         m_dialog.withdraw()
@@ -162,10 +267,27 @@ def _setup_actions():
         m_notebook.pack(fill='both', expand=True)
 
         # add tabs to the frame
-        # ranking tab in tk.Text
-        ranking_frame = tkinter.Text(m_notebook)
+        # ranking tab, a table that renders only the visible rows
+        ranking_frame = ttk.Frame(m_notebook)
         m_notebook.add(ranking_frame, text="Ranking")
-        ranking_frame.insert('1.0', ranking_text)
+        ttk.Label(ranking_frame, text="Total words: %d" % len(tokens)).pack(
+            side='top', anchor='w')
+        tableview.WordTable(
+            ranking_frame, tokens.vocabulary,
+            numpy.arange(len(tokens.vocabulary)), [("Frequency", counts)],
+            sort_by=0, reverse=True,
+        ).pack(fill='both', expand=True)
+        _add_ngram_table(m_notebook, "Bigrams", tokens, bigrams[0],
+                         [("Frequency", bigrams[1])])
+        _add_ngram_table(m_notebook, "Trigrams", tokens, trigrams[0],
+                         [("Frequency", trigrams[1])])
+        grams, frequencies, pmi, log_likelihood = collocations
+        _add_ngram_table(m_notebook, "Collocations", tokens, grams,
+                         [("Frequency", frequencies), ("PMI", pmi),
+                          ("Log-likelihood", log_likelihood)])
+        # rank/frequency plot of the whole vocabulary
+        m_notebook.add(zipfplot.ZipfPlot(m_notebook, counts),
+                       text="Zipf Plot")
         # tab show bar graph
         draw_frame = ttk.Frame(m_notebook)
         m_notebook.add(draw_frame, text="Graph")
@@ -177,15 +299,9 @@ def _setup_actions():
         ax = fig.add_subplot(111)
         label = []
         data = []
-        i = 0
-        for key, val in new_dict.items():
-            if (i >= 6) or (i >= len(new_dict)):
-                break
-            if key in m_stop_words:
-                continue
+        for key, val in top_words:
             data.append(val)
             label.append(key.lower())
-            i += 1
         
         ind = numpy.arange(len(data))
         graph = ax.bar(ind, data, width=0.5)
@@ -205,6 +321,84 @@ def _setup_actions():
 
 
 
+    def get_term_counts(iter_chunks, **tokenize_args):
+        key = statscache.get_key(iter_chunks())
+        return keywords.get_term_counts(key, functools.partial(
+            load_or_tokenize, key, iter_chunks, **tokenize_args))
+
+    # distinctive words of each document with tf-idf
+    def show_keywords():
+        names = []
+        documents = []
+        errors = []
+        for tab in m_tab_manager.tabs():
+            if not isinstance(tab, tabs.FileTab):
+                continue
+            # a tab restored from the session reads its file here, and the
+            # file may have been deleted since then
+            try:
+                tab.finish_loading()
+                documents.append(get_term_counts(
+                    tab.iter_chunks, **get_tokenize_args(tab)))
+            except (OSError, UnicodeError) as e:
+                errors.append('%s: %s' % (tab.path, e))
+            else:
+                names.append(tab.title)
+
+        if errors:
+            utils.errordialog("Errors", "Reading %d files failed!"
+                              % len(errors), '\n'.join(errors))
+        _show_keywords_dialog(names, documents)
+
+    def show_directory_keywords():
+        directory = filedialog.askdirectory(parent=m_root)
+        if not directory:
+            return
+
+        encoding = settings.get_section('General')['encoding']
+        names = []
+        documents = []
+        errors = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not (name.endswith('.txt') and os.path.isfile(path)):
+                continue
+            try:
+                documents.append(get_term_counts(
+                    functools.partial(_iter_file_chunks, path, encoding),
+                    path=path, size=os.path.getsize(path), from_file=True))
+            except (OSError, UnicodeError) as e:
+                errors.append('%s: %s' % (path, e))
+            else:
+                names.append(name)
+
+        if errors:
+            utils.errordialog("Errors", "Reading %d files failed!"
+                              % len(errors), '\n'.join(errors))
+        _show_keywords_dialog(names, documents)
+
+    def _show_keywords_dialog(names, documents):
+        with tracing.span('tf-idf', documents=len(documents)):
+            results = keywords.extract_keywords(documents,
+                                                _KEYWORDS_PER_DOCUMENT)
+
+        dialog = tkinter.Toplevel()
+        dialog.title("Keywords")
+        dialog.geometry('600x400')
+        tree = ttk.Treeview(dialog, columns=('document', 'keywords'),
+                            show='headings')
+        tree.heading('document', text="Document")
+        tree.heading('keywords', text="Most distinctive words (TF-IDF)")
+        tree.column('document', width=150, stretch=False)
+        scrollbar = ttk.Scrollbar(dialog, command=tree.yview)
+        tree['yscrollcommand'] = scrollbar.set
+        tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='left', fill='y')
+        for name, words_and_scores in zip(names, results):
+            tree.insert('', 'end', values=(
+                name, ', '.join(word for word, score in words_and_scores)))
+        dialog.transient(m_root)
+
     actions.add_command("File/New File", new_file, '<Control-n>')
     actions.add_command("File/Open", open_files, '<Control-o>')
     actions.add_command("File/Save", (lambda: m_tab_manager.select().save()),
@@ -218,8 +412,13 @@ def _setup_actions():
     actions.add_command("File/Quit", quit, '<Control-q>')
 
     actions.add_command("Edit/Settings", settings.show_dialog)
+    actions.add_command("Edit/Go to Line", goto_line, '<Control-l>',
+                        tabtypes=[tabs.FileTab, tabs.BigFileTab])
     actions.add_command("Edit/Tokenize", tokenize_file)
     actions.add_command("Edit/Statistics", get_statistics)
+    actions.add_command("Edit/Keywords of Open Files", show_keywords)
+    actions.add_command("Edit/Keywords of a Directory...",
+                        show_directory_keywords)
 
     def add_link(path, url):
         actions.add_command(path, functools.partial(webbrowser.open, url))
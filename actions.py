@@ -2,6 +2,9 @@ import collections
 import tkinter
 import warnings
 
+import events
+import perfmonitor
+import recording
 import tabs
 import utils
 import _run
@@ -46,8 +49,8 @@ class _Action:
             self._enabled = is_enabled
             # if is_enabled is True, event is '<<ActionEnabled>>', otherwise it's '<<ActionDisabled>>'
             event = '<<ActionEnabled>>' if is_enabled else '<<ActionDisabled>>'
-            # the 'data' words in event_generate are extral information to deal with
-            _run.get_main_window().event_generate(event, data=self.path)
+            # the data is passed to the callbacks as is, see events.py
+            events.generate(_run.get_main_window(), event, self.path)
 
     def _var_set_check(self, *junk):
         value = self.var.get()
@@ -66,12 +69,19 @@ def _add_any_action(path, kind, callback_or_choices, binding, var, *,
     if path in _actions:
         raise RuntimeError("there's already an action with path %r" % path)
 
-    # event_generate must be before setting action.enabled, this way
+    if kind == 'command':
+        # this does nothing unless the performance_monitor setting is on
+        callback_or_choices = perfmonitor.wrap(
+            'action ' + path, callback_or_choices)
+        # and this does nothing unless the record_session setting is on
+        callback_or_choices = recording.wrap_action(path, callback_or_choices)
+
+    # events.generate() must be before setting action.enabled, this way
     # plugins get a chance to do something to the new action before it's
     # disabled
     action = _Action(path, kind, callback_or_choices, binding, var)
     _actions[path] = action
-    _run.get_main_window().event_generate('<<NewAction>>', data=path)
+    events.generate(_run.get_main_window(), '<<NewAction>>', path)
 
     if tabtypes is not None or filetype_names is not None:
         if tabtypes is not None:
@@ -96,13 +106,12 @@ def _add_any_action(path, kind, callback_or_choices, binding, var, *,
                     action.enabled = False
 
             def on_new_tab(event):
-                tab = event.data_widget
+                tab = event.data
                 if isinstance(tab, tabs.FileTab):
                     tab.bind('<<FiletypeChanged>>', enable_or_disable,
                              add=True)
 
-            utils.bind_with_data(_run.get_tab_manager(),
-                                 '<<NewTab>>', on_new_tab, add=True)
+            events.bind(_run.get_tab_manager(), '<<NewTab>>', on_new_tab)
 
         enable_or_disable()
         _run.get_tab_manager().bind(
@@ -0,0 +1,200 @@
+"""Tokenizing files and counting words without a GUI.
+
+Run like this:
+
+    python main.py tokenize FILE...
+    python main.py stats [--format csv] FILE...
+
+See ``python main.py stats --help`` for more options. This module must
+not import tkinter or matplotlib, directly or indirectly.
+
+Files are split into blocks at line boundaries, and the blocks are
+processed in parallel by worker processes. Only a few blocks are in
+memory at a time, so the memory usage doesn't depend on how big the
+files are. Splitting at b'\\n' bytes works with UTF-8 and other encodings
+that are compatible with ASCII, but not with e.g. UTF-16.
+"""
+import argparse
+import collections
+import concurrent.futures
+import csv
+import functools
+import json
+import os
+import sys
+
+import batchcommands
+import tokenizer
+
+_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def _split_file(path, block_size=_BLOCK_SIZE):
+    # Yield (path, start, end) tuples of blocks of a file that end at line
+    # boundaries.
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        start = 0
+        while start < size:
+            file.seek(min(start + block_size, size))
+            # the rest of the line goes to this block
+            file.readline()
+            end = min(file.tell(), size)
+            yield (path, start, end)
+            start = end
+
+
+def _read_block(block, encoding):
+    path, start, end = block
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return data.decode(encoding, errors='replace')
+
+
+def _tokenize_block(block, encoding):
+    return (block, tokenizer.tokenize([_read_block(block, encoding)]))
+
+
+def _count_block(block, encoding):
+    counts = collections.Counter()
+    counts.update(tokenizer.iter_words(_read_block(block, encoding)))
+    return counts
+
+
+def _map_in_order(func, items, jobs):
+    # Like map(), but in jobs processes. Only a few items are processed at
+    # a time, so the results don't pile up in memory if they are used
+    # slower than they are created.
+    if jobs == 1:
+        yield from map(func, items)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_blocks(paths):
+    for path in paths:
+        yield from _split_file(path)
+
+
+def _load_stop_words(path, encoding):
+    with open(path, 'r', encoding=encoding) as file:
+        return set(file.read().split())
+
+
+def _tokenize_files(args, output):
+    results = _map_in_order(
+        functools.partial(_tokenize_block, encoding=args.encoding),
+        _iter_blocks(args.files), args.jobs)
+
+    if args.format == 'text':
+        for block, words in results:
+            output.write(''.join(word + '\n' for word in words))
+    elif args.format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(['file', 'word'])
+        for block, words in results:
+            writer.writerows([block[0], word] for word in words)
+    else:
+        # a list of {"file": path, "words": [...]} objects, written piece
+        # by piece
+        output.write('[')
+        in_file = False
+        for block, words in results:
+            path, start, end = block
+            if start == 0:
+                if in_file:
+                    output.write(']},\n')
+                output.write('{"file": %s, "words": [' % json.dumps(path))
+                separator = ''
+                in_file = True
+            for word in words:
+                output.write(separator + json.dumps(word))
+                separator = ', '
+        if in_file:
+            output.write(']}')
+        output.write(']\n')
+
+
+def _count_files(args, output):
+    counts = collections.Counter()
+    for block_counts in _map_in_order(
+            functools.partial(_count_block, encoding=args.encoding),
+            _iter_blocks(args.files), args.jobs):
+        counts.update(block_counts)
+
+    total = sum(counts.values())
+    if args.stop_words is not None:
+        for word in _load_stop_words(args.stop_words, args.encoding):
+            counts.pop(word, None)
+    # most_common() sorts like the statistics dialog, most common first
+    frequencies = counts.most_common(args.top)
+
+    if args.format == 'text':
+        for word, count in frequencies:
+            output.write('%s\t%d\n' % (word, count))
+        # stdout is often piped to other programs, so this goes elsewhere
+        print("Total words: %d" % total, file=sys.stderr)
+    elif args.format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(['word', 'count'])
+        writer.writerows(frequencies)
+    else:
+        json.dump({'total_words': total, 'files': args.files,
+                   'frequencies': frequencies}, output)
+        output.write('\n')
+
+
+def main(argv):
+    # Run a command, argv is e.g. ['stats', 'file.txt']. Returns an exit
+    # status for sys.exit().
+    parser = argparse.ArgumentParser(
+        prog='main.py', description="Tokenize files or count words in them.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    for command, help_text in batchcommands.COMMANDS.items():
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument('files', nargs='+', metavar='FILE')
+        subparser.add_argument(
+            '--format', choices=['text', 'csv', 'json'], default='text')
+        subparser.add_argument(
+            '--output', '-o', metavar='FILE',
+            help="write to a file instead of stdout")
+        subparser.add_argument('--encoding', default='utf-8')
+        subparser.add_argument(
+            '--jobs', '-j', type=int, default=os.cpu_count() or 1,
+            help="number of processes, default: number of CPUs")
+    stats_parser = subparsers.choices['stats']
+    stats_parser.add_argument(
+        '--top', type=int, metavar='N', help="only show the N most common")
+    stats_parser.add_argument(
+        '--stop-words', metavar='FILE',
+        help="leave out the whitespace-separated words of a file")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    function = _tokenize_files if args.command == 'tokenize' else _count_files
+    try:
+        if args.output is None:
+            function(args, sys.stdout)
+            sys.stdout.flush()
+        else:
+            with open(args.output, 'w', encoding='utf-8', newline='') as file:
+                function(args, file)
+    except BrokenPipeError:
+        # e.g. 'python main.py tokenize file.txt | head', python would
+        # complain when flushing stdout on exit without this
+        sys.stdout = open(os.devnull, 'w')
+    except (OSError, UnicodeError) as e:
+        print("%s: error: %s" % (parser.prog, e), file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,12 @@
+"""The commands of the batch mode, see batch.py.
+
+This is not in batch.py because main.py checks its arguments against
+these before forwarding files to a running editor, and importing
+batch.py would import numpy, which takes much longer than forwarding.
+"""
+
+# {command: help text}
+COMMANDS = {
+    'tokenize': "print the words of the files",
+    'stats': "print how many times each word appears",
+}
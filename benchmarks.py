@@ -0,0 +1,321 @@
+"""Benchmarks for things that need to be fast.
+
+Run ``python benchmarks.py --help`` to see the available benchmarks.
+Benchmarks that create a tkinter window need a display, Xvfb works too.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import timeit
+
+
+def _report(name, seconds, count=1):
+    seconds /= count
+    for unit, factor in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if seconds >= factor:
+            break
+    print("%-45s %10.2f %s" % (name, seconds / factor, unit))
+
+
+def _parse_size(string):
+    # '64K' -> 65536
+    multipliers = {'K': 1024, 'M': 1024**2, 'G': 1024**3}
+    if string[-1:].upper() in multipliers:
+        return int(string[:-1]) * multipliers[string[-1].upper()]
+    return int(string)
+
+
+def _make_text(size, seed=0):
+    # Return about size characters of lines of random words.
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz')
+                          for i in range(rng.randint(1, 10)))
+                  for j in range(5000)]
+    line_count = max(size // 60, 1)
+    # generating every line separately would take longer than the
+    # benchmarks, so lines are picked from a smaller set of lines
+    lines = [' '.join(rng.choices(vocabulary, k=10))
+             for i in range(min(line_count, 10000))]
+    return '\n'.join(rng.choices(lines, k=line_count))
+
+
+def bench_events(args):
+    # cost of dispatching one event with data to one handler
+    import tkinter
+    root = tkinter.Tk()
+    root.withdraw()
+
+    import events, utils
+    payload = ('some', 'data', 123)
+    received = []
+
+    utils.bind_with_data(root, '<<TclBench>>',
+                         (lambda event: received.append(event.data)),
+                         add=True)
+    events.bind(root, '<<BusBench>>',
+                (lambda event: received.append(event.data)))
+
+    count = args.count
+    tcl_time = timeit.timeit(
+        lambda: root.event_generate('<<TclBench>>', data=payload),
+        number=count)
+    bus_time = timeit.timeit(
+        lambda: events.generate(root, '<<BusBench>>', payload),
+        number=count)
+    assert len(received) == 2 * count
+
+    _report("event_generate() + utils.bind_with_data()", tcl_time, count)
+    _report("events.generate() + events.bind()", bus_time, count)
+    print("speedup: %.1fx" % (tcl_time / bus_time))
+    root.destroy()
+
+
+def bench_document(args):
+    # document.Document operations on synthetic documents, no display needed
+    import document, tokenizer
+
+    for size_string in args.sizes.split(','):
+        size = _parse_size(size_string)
+        text = _make_text(size)
+        print("%s document, %d lines:" % (size_string, text.count('\n') + 1))
+
+        start = time.perf_counter()
+        doc = document.Document(text)
+        _report("  create", time.perf_counter() - start)
+        del text
+
+        rng = random.Random(1)
+        positions = [(rng.randint(1, doc.line_count()), rng.randint(0, 50))
+                     for i in range(args.count)]
+        start = time.perf_counter()
+        for position in positions:
+            doc.insert(position, 'x')
+        for position in positions:
+            doc.delete(position, (position[0], position[1] + 1))
+        _report("  insert or delete a character",
+                time.perf_counter() - start, 2 * args.count)
+
+        start = time.perf_counter()
+        doc.insert((doc.line_count() // 2, 0), 'a\nb\nc\n' * 1000)
+        _report("  insert 3000 lines", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        match_count = len(doc.find_all('the', full_words=True))
+        _report("  find all (%d matches)" % match_count,
+                time.perf_counter() - start)
+
+        start = time.perf_counter()
+        tokenizer.tokenize(doc.iter_chunks())
+        _report("  tokenize", time.perf_counter() - start)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            start = time.perf_counter()
+            with open(os.path.join(tempdir, 'saved.txt'), 'w',
+                      encoding='utf-8') as file:
+                for chunk in doc.iter_chunks():
+                    file.write(chunk)
+            _report("  save", time.perf_counter() - start)
+        del doc
+
+
+def bench_ngrams(args):
+    # n-gram counting and collocations on zipf-distributed token ids, no
+    # display needed
+    import numpy
+    import ngrams, tokenizer
+
+    for size_string in args.sizes.split(','):
+        token_count = _parse_size(size_string)
+        vocab_size = 100000
+        ids = numpy.random.default_rng(0).zipf(1.3, token_count)
+        tokens = tokenizer.TokenSequence(
+            ['w%d' % i for i in range(vocab_size)],
+            (numpy.minimum(ids, vocab_size) - 1).astype(numpy.uint32))
+        print("%s tokens:" % size_string)
+
+        start = time.perf_counter()
+        bigrams = ngrams.count_ngrams(tokens, 2)
+        _report("  bigrams (%d different)" % len(bigrams[1]),
+                time.perf_counter() - start)
+        start = time.perf_counter()
+        trigrams = ngrams.count_ngrams(tokens, 3)
+        _report("  trigrams (%d different)" % len(trigrams[1]),
+                time.perf_counter() - start)
+        start = time.perf_counter()
+        ngrams.collocations(tokens, bigrams)
+        _report("  collocations", time.perf_counter() - start)
+
+
+def bench_parallel(args):
+    # tokenizing in several processes with different numbers of
+    # processes, no display needed
+    import document, parallel, tokenizer
+
+    cpu_count = os.cpu_count() or 1
+    job_counts = sorted({2**i for i in range(cpu_count.bit_length())} |
+                        {cpu_count})
+    for size_string in args.sizes.split(','):
+        text = _make_text(_parse_size(size_string))
+        doc = document.Document(text)
+        print("%s document, %d CPUs:" % (size_string, cpu_count))
+
+        start = time.perf_counter()
+        expected = tokenizer.TokenSequence.from_chunks(doc.iter_chunks())
+        single = time.perf_counter() - start
+        _report("  in this process", single)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'text.txt')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(text)
+            del text
+
+            for jobs in job_counts:
+                for name, function in [
+                        ("shared memory", lambda: parallel.tokenize_chunks(
+                            doc.iter_chunks, jobs)),
+                        ("mmap", lambda: parallel.tokenize_file(
+                            path, 'utf-8', jobs))]:
+                    start = time.perf_counter()
+                    tokens = function()
+                    seconds = time.perf_counter() - start
+                    assert tokens.vocabulary == expected.vocabulary
+                    _report("  %d processes, %s (%.1fx)" % (
+                        jobs, name, single / seconds), seconds)
+
+
+def bench_zipf(args):
+    # preparing and drawing the points of the Zipf plot, drawn with the
+    # Agg backend without a display
+    import numpy
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import zipfplot
+
+    for size_string in args.sizes.split(','):
+        vocab_size = _parse_size(size_string)
+        counts = numpy.random.default_rng(0).zipf(1.5, vocab_size)
+        print("%s different words:" % size_string)
+
+        start = time.perf_counter()
+        frequencies = numpy.sort(counts)[::-1]
+        _report("  sort", time.perf_counter() - start)
+        start = time.perf_counter()
+        zipfplot.fit_exponent(frequencies)
+        _report("  fit the exponent", time.perf_counter() - start)
+
+        figure = Figure(figsize=(5, 4), dpi=100)
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot(111)
+        axes.set_xscale('log')
+        axes.set_yscale('log')
+        line, = axes.plot([], [], marker='.', markersize=3)
+        axes.set_xlim(0.8, vocab_size * 1.25)
+        axes.set_ylim(0.8, frequencies[0] * 1.25)
+        # the first draw creates fonts and other things that are cached
+        figure.canvas.draw()
+        for name, first, last in [("  draw everything", 1, vocab_size),
+                                  ("  draw zoomed in", vocab_size // 10,
+                                   vocab_size // 2)]:
+            start = time.perf_counter()
+            ranks = zipfplot.sample_ranks(first, last)
+            line.set_data(ranks, frequencies[ranks - 1])
+            figure.canvas.draw()
+            _report(name + " (%d points)" % len(ranks),
+                    time.perf_counter() - start)
+
+
+def bench_filewatch(args):
+    # computing the changes to apply when a file changes on disk, no
+    # display needed
+    import document, filewatch
+
+    for size_string in args.sizes.split(','):
+        text = _make_text(_parse_size(size_string))
+        old_lines = text.split('\n')
+        print("%s document, %d lines:" % (size_string, len(old_lines)))
+
+        rng = random.Random(1)
+        edited = list(old_lines)
+        for i in range(10):
+            edited[rng.randrange(len(edited))] = 'changed'
+        for name, new_lines in [
+                ("  one line changed in the middle", old_lines[:len(
+                    old_lines) // 2] + ['changed'] + old_lines[len(
+                        old_lines) // 2 + 1:]),
+                ("  10 lines changed here and there", edited),
+                ("  lines added to the end", old_lines + ['new'] * 100)]:
+            start = time.perf_counter()
+            changes = filewatch.diff_lines(old_lines, new_lines)
+            _report(name, time.perf_counter() - start)
+
+            doc = document.Document(text)
+            for change_start, change_end, new_text in changes:
+                doc.replace(change_start, change_end, new_text)
+            assert doc.get() == '\n'.join(new_lines)
+
+
+def bench_wordcount(args):
+    # keeping the live word counts up to date while typing, no display
+    # needed
+    import document, wordcount
+
+    for size_string in args.sizes.split(','):
+        doc = document.Document(_make_text(_parse_size(size_string)))
+        counter = wordcount.WordCounter()
+        counter.on_change([], list(doc.iter_chunks(100)))
+        doc.change_callbacks.append(counter.on_change)
+        print("%s document:" % size_string)
+
+        start = time.perf_counter()
+        batches = 1
+        while not counter.process(wordcount._TIME_BUDGET):
+            batches += 1
+        _report("  count everything (%d batches)" % batches,
+                time.perf_counter() - start)
+
+        rng = random.Random(1)
+        positions = [(rng.randint(1, doc.line_count()), rng.randint(0, 50))
+                     for i in range(args.count)]
+        start = time.perf_counter()
+        for position in positions:
+            doc.insert(position, 'x')
+            counter.process(wordcount._TIME_BUDGET)
+        _report("  type a character and update the counts",
+                time.perf_counter() - start, args.count)
+
+        start = time.perf_counter()
+        for i in range(100):
+            counter.most_common(wordcount._TOP_COUNT)
+        _report("  find the %d most common words" % wordcount._TOP_COUNT,
+                time.perf_counter() - start, 100)
+
+
+_BENCHMARKS = {
+    'document': bench_document,
+    'ngrams': bench_ngrams,
+    'parallel': bench_parallel,
+    'wordcount': bench_wordcount,
+    'events': bench_events,
+    'filewatch': bench_filewatch,
+    'zipf': bench_zipf,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('benchmark', choices=sorted(_BENCHMARKS))
+    parser.add_argument('--count', type=int, default=20000,
+                        help="how many times to repeat things")
+    parser.add_argument('--sizes', default='1K,1M,64M',
+                        help=("comma-separated sizes, document sizes for "
+                              "the document benchmark and token counts for "
+                              "the ngrams benchmark, e.g. 1K,1M,1G"))
+    args = parser.parse_args()
+    _BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
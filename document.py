@@ -0,0 +1,219 @@
+"""The content of a FileTab without tkinter.
+
+Document stores text as a list of lines and understands the same
+'line.column' indexes as tkinter.Text, with line numbers starting at 1
+and columns at 0. textwidget.Text applies every insert and delete to its
+Document too, so hashing, tokenizing, searching and saving can read the
+Document instead of asking Tk for the text. This module doesn't import
+tkinter, so Document can be used and benchmarked without a display.
+
+Tk 8.6 counts a character outside the Basic Multilingual Plane, e.g. an
+emoji, as two characters like UTF-16 does, but Python and Tk 8.7 count
+it as one. Document counts columns like the Tk in use, so that the same
+index means the same place in both, and converts them when slicing the
+lines. textwidget.Text asks Tcl how it counts, see set_astral_width().
+"""
+import re
+
+_ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+# how many columns a character outside the BMP uses, 1 until
+# set_astral_width() is called
+_astral_width = 1
+
+
+def set_astral_width(width):
+    # Set how many columns Tk uses for a character outside the BMP. This
+    # must be called before creating Documents that contain them.
+    global _astral_width
+    assert width in {1, 2}, width
+    _astral_width = width
+
+
+def tk_length(text):
+    # Return the number of characters that Tk sees in a string.
+    if _astral_width == 1 or text.isascii():
+        return len(text)
+    return len(text) + len(_ASTRAL.findall(text))
+
+
+def _column_to_offset(line, column):
+    # Convert a Tk column to an index of the Python string. A column
+    # between the two halves of a character goes after the character.
+    if (_astral_width == 1 or line.isascii() or
+            not _ASTRAL.search(line, 0, column)):
+        return column
+    offset = units = 0
+    while units < column and offset < len(line):
+        units += 2 if line[offset] > '\uffff' else 1
+        offset += 1
+    return offset
+
+
+def _offset_to_column(line, offset):
+    if _astral_width == 1 or line.isascii():
+        return offset
+    return offset + len(_ASTRAL.findall(line, 0, offset))
+
+
+class Document:
+
+    def __init__(self, text=''):
+        # the text is '\n'.join(self._lines), and like in tkinter.Text,
+        # there's always at least one line
+        self._lines = text.split('\n')
+        self._char_count = len(text)
+        # incremented on every change, for caching things computed from
+        # the content
+        self.version = 0
+        # every change calls these with two lists of strings: the lines
+        # that the change removed and the lines that replaced them, e.g.
+        # typing a character gives the line before and after the change
+        self.change_callbacks = []
+
+    def __len__(self):
+        return self._char_count
+
+    def line_count(self):
+        return len(self._lines)
+
+    def get_line(self, lineno):
+        # Return a line without the newline character, 1 is the first line.
+        return self._lines[lineno - 1]
+
+    def parse_index(self, index):
+        # Convert a 'line.column' string, 'end' or a (line, column) tuple to
+        # a (line, column) tuple. Indexes outside the text are moved to the
+        # closest place in the text like tkinter.Text does it. The text
+        # doesn't end with a newline like tk's text does, so 'end' and
+        # 'end - 1 char' are the same place, and 'line.column lineend' is
+        # also supported.
+        if index in {'end', 'end - 1 char'}:
+            return (len(self._lines), tk_length(self._lines[-1]))
+        if isinstance(index, str):
+            if index.endswith(' lineend'):
+                index = index[:-len(' lineend')].partition('.')[0] + '.end'
+            line, dot, column = index.partition('.')
+            line = int(line)
+            column = int(column) if column != 'end' else None
+        else:
+            line, column = index
+
+        if line < 1:
+            return (1, 0)
+        if line > len(self._lines):
+            return (len(self._lines), tk_length(self._lines[-1]))
+        length = tk_length(self._lines[line - 1])
+        if column is None or column > length:
+            column = length
+        return (line, max(column, 0))
+
+    def index(self, index):
+        # Like tkinter.Text.index(), e.g. '123.end' -> '123.45'.
+        return '%d.%d' % self.parse_index(index)
+
+    def insert(self, index, text):
+        # Insert text and return the index of the end of the inserted text.
+        line, column = self.parse_index(index)
+        if not text:
+            return '%d.%d' % (line, column)
+
+        old = self._lines[line - 1]
+        offset = _column_to_offset(old, column)
+        new_lines = text.split('\n')
+        if len(new_lines) == 1:
+            new_lines[0] = old[:offset] + text + old[offset:]
+            self._lines[line - 1] = new_lines[0]
+            end = (line, column + tk_length(text))
+        else:
+            end = (line + len(new_lines) - 1, tk_length(new_lines[-1]))
+            new_lines[0] = old[:offset] + new_lines[0]
+            new_lines[-1] += old[offset:]
+            self._lines[line - 1:line] = new_lines
+
+        self._char_count += len(text)
+        self.version += 1
+        for callback in self.change_callbacks:
+            callback([old], new_lines)
+        return '%d.%d' % end
+
+    def delete(self, start, end):
+        # Delete the text between two indexes and return the deleted text.
+        start_line, start_column = self.parse_index(start)
+        end_line, end_column = self.parse_index(end)
+        if (end_line, end_column) <= (start_line, start_column):
+            return ''
+
+        removed = self._lines[start_line - 1:end_line]
+        first = self._lines[start_line - 1]
+        start_column = _column_to_offset(first, start_column)
+        end_column = _column_to_offset(self._lines[end_line - 1], end_column)
+        if start_line == end_line:
+            deleted = first[start_column:end_column]
+            self._lines[start_line - 1] = (first[:start_column] +
+                                           first[end_column:])
+        else:
+            last = self._lines[end_line - 1]
+            deleted = '\n'.join([first[start_column:]] +
+                                self._lines[start_line:end_line - 1] +
+                                [last[:end_column]])
+            self._lines[start_line - 1:end_line] = [
+                first[:start_column] + last[end_column:]]
+
+        self._char_count -= len(deleted)
+        self.version += 1
+        for callback in self.change_callbacks:
+            callback(removed, [self._lines[start_line - 1]])
+        return deleted
+
+    def replace(self, start, end, text):
+        self.delete(start, end)
+        return self.insert(start, text)
+
+    def get(self, start='1.0', end='end'):
+        start_line, start_column = self.parse_index(start)
+        end_line, end_column = self.parse_index(end)
+        if (end_line, end_column) <= (start_line, start_column):
+            return ''
+        start_column = _column_to_offset(self._lines[start_line - 1],
+                                         start_column)
+        end_column = _column_to_offset(self._lines[end_line - 1], end_column)
+        if start_line == end_line:
+            return self._lines[start_line - 1][start_column:end_column]
+        return '\n'.join([self._lines[start_line - 1][start_column:]] +
+                         self._lines[start_line:end_line - 1] +
+                         [self._lines[end_line - 1][:end_column]])
+
+    def iter_chunks(self, n=1000):
+        # Iterate over the text as chunks of n lines. Joining the chunks
+        # gives the whole text.
+        last = len(self._lines)
+        for first in range(0, last, n):
+            chunk = '\n'.join(self._lines[first:first + n])
+            if first + n < last:
+                chunk += '\n'
+            if chunk:
+                yield chunk
+
+    def finditer(self, regex, start='1.0'):
+        # Yield (start, end) index pairs of non-overlapping matches of a
+        # compiled regex after start. Matches can't contain newlines.
+        start_line, start_column = self.parse_index(start)
+        for lineno in range(start_line, len(self._lines) + 1):
+            line = self._lines[lineno - 1]
+            offset = (_column_to_offset(line, start_column)
+                      if lineno == start_line else 0)
+            for match in regex.finditer(line, offset):
+                if match.end() == match.start():
+                    continue
+                yield ('%d.%d' % (lineno,
+                                  _offset_to_column(line, match.start())),
+                       '%d.%d' % (lineno,
+                                  _offset_to_column(line, match.end())))
+
+    def find_all(self, string, full_words=False, ignore_case=False):
+        # A list of (start, end) index pairs of string in the text.
+        regex = re.escape(string)
+        if full_words:
+            regex = r'\b' + regex + r'\b'
+        flags = re.IGNORECASE if ignore_case else 0
+        return list(self.finditer(re.compile(regex, flags)))
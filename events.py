@@ -0,0 +1,121 @@
+"""Virtual events with Python objects as data.
+
+Tk's ``event_generate(data=...)`` converts the data to a Tcl string and
+:func:`utils.bind_with_data` converts it back, which is slow and loses
+the type of the data. The events of this module never go through Tcl:
+
+    import events
+
+    def on_new_tab(event):
+        print(event.data)       # the same object that was passed below
+
+    events.bind(tab_manager, '<<NewTab>>', on_new_tab)
+    events.generate(tab_manager, '<<NewTab>>', tab)
+
+Only handlers bound with :func:`bind` run, bindings made with
+``widget.bind()`` or :func:`utils.bind_with_data` don't see these
+events.
+"""
+import functools
+import sys
+import tkinter
+import weakref
+
+import perfmonitor
+
+# {widget: {event_name: [callback, ...]}}
+_handlers = weakref.WeakKeyDictionary()
+
+
+class Event:
+    """The event object that callbacks get.
+
+    ``widget`` and ``data`` are the arguments of :func:`generate`. The
+    other attributes are compatible with :func:`utils.bind_with_data`,
+    but they are computed only if a callback uses them.
+    """
+
+    def __init__(self, widget, name, data):
+        self.widget = widget
+        self.name = name
+        self.data = data
+
+    def __repr__(self):
+        return '<%s %s data=%r>' % (type(self).__name__, self.name, self.data)
+
+    @functools.cached_property
+    def data_int(self):
+        try:
+            return int(self.data)
+        except (TypeError, ValueError):
+            return None
+
+    @functools.cached_property
+    def data_float(self):
+        try:
+            return float(self.data)
+        except (TypeError, ValueError):
+            return None
+
+    @functools.cached_property
+    def data_widget(self):
+        if isinstance(self.data, tkinter.Misc):
+            return self.data
+        if isinstance(self.data, str):
+            try:
+                return self.widget.nametowidget(self.data)
+            except Exception:
+                return None
+        return None
+
+    def data_tuple(self, *converters):
+        if isinstance(self.data, (tuple, list)):
+            items = self.data
+        else:
+            items = self.widget.tk.splitlist(self.data)
+        if len(items) != len(converters):
+            raise ValueError(
+                "the event data has %d elements, but %d converters "
+                "were given" % (len(items), len(converters)))
+        return tuple(converter(item)
+                     for converter, item in zip(converters, items))
+
+
+def bind(widget, name, callback):
+    # Run callback(event) when generate(widget, name, data) is called.
+    # Like widget.bind(name, callback, add=True), the old bindings are kept.
+    callback = perfmonitor.wrap(
+        perfmonitor.get_callback_name(callback), callback)
+    _handlers.setdefault(widget, {}).setdefault(name, []).append(callback)
+
+
+def unbind(widget, name, callback):
+    callbacks = _handlers[widget][name]
+    for wrapper in callbacks:
+        if wrapper.__wrapped__ == callback:
+            callbacks.remove(wrapper)
+            return
+    raise ValueError("%r is not bound to %s" % (callback, name))
+
+
+def generate(widget, name, data=None):
+    # Call the callbacks bound to the widget right away. If one of them
+    # returns 'break', the rest are not called and this returns 'break'.
+    # Like with tk's bindings, an error in a callback is reported and the
+    # other callbacks still run.
+    try:
+        callbacks = _handlers[widget][name]
+    except KeyError:
+        return None
+
+    event = Event(widget, name, data)
+    # copying is needed in case a callback binds or unbinds something
+    for callback in list(callbacks):
+        try:
+            result = callback(event)
+        except Exception:
+            widget._root().report_callback_exception(*sys.exc_info())
+            continue
+        if result == 'break':
+            return 'break'
+    return None
@@ -0,0 +1,567 @@
+"""Noticing when other programs change the files of open tabs.
+
+On Linux, inotify tells when a file changes. The directories of the files
+are watched instead of the files, because many programs save by writing
+a new file and renaming it over the old file. Elsewhere, or if inotify
+doesn't work, the files are stat()ed periodically, _STAT_BATCH_SIZE files
+at a time, so that many open files don't make the editor slow.
+
+When the file of a FileTab changes, only the change is applied to the
+text widget. If bytes were added to the end of the file, like log files
+grow, only the new bytes are read. Otherwise the new content is compared
+to the text line by line, and only the lines that differ are replaced.
+A general diff algorithm like difflib is slow with big files, so after
+each changed part, the closest lines that are the same again are looked
+up from the next _DIFF_WINDOW lines. The change is one step in the undo
+history, and the cursor and the scroll position stay in the same text.
+Tabs with unsaved changes are not changed without asking.
+"""
+import codecs
+import ctypes
+import logging
+import os
+import struct
+import sys
+import tkinter
+import weakref
+from tkinter import messagebox
+
+import events
+import settings
+
+log = logging.getLogger(__name__)
+
+_POLL_INTERVAL = 1000       # milliseconds
+_STAT_BATCH_SIZE = 200
+# programs often write a file in many pieces, and checking after each
+# piece would be slow
+_CHECK_DELAY = 100          # milliseconds
+# the end of the file that the text is known to match, an append is
+# noticed by checking that these bytes are still there
+_TAIL_SIZE = 4096
+_TOP_MARK = 'filewatch_top'
+# see _find_match()
+_FIRST_DIFF_WINDOW = 16
+_DIFF_WINDOW = 1024
+_MATCH_LINES = 2
+_SKIP_STEP = 1024
+
+# from <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_INOTIFY_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_TO |
+                 _IN_CREATE | _IN_ONLYDIR)
+# struct inotify_event without the name that comes after it
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+_watcher = None
+_tab_manager = None
+# {FileTab: _DiskState} for tabs whose text was the same as the file
+_states = weakref.WeakKeyDictionary()
+_pending_checks = weakref.WeakSet()
+_check_scheduled = False
+# mark_saved() of these tabs doesn't read the file, see _set_saved()
+_setting_saved = weakref.WeakSet()
+
+
+def _get_stat_key(stat):
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _stat_key_or_none(path):
+    try:
+        return _get_stat_key(os.stat(path))
+    except OSError:
+        return None
+
+
+class _InotifyWatcher:
+    # Calls callback(path) when a file of update() changes. Linux only.
+
+    def __init__(self, widget, callback):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd == -1:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._widget = widget
+        self._callback = callback
+        self._watches = {}      # {directory: watch descriptor}
+        self._names = {}        # {watch descriptor: {file name: path}}
+        widget.tk.createfilehandler(self._fd, tkinter.READABLE,
+                                    self._on_readable)
+
+    def update(self, paths):
+        # Watch these paths and stop watching others.
+        directories = {}
+        for path in paths:
+            directory, name = os.path.split(path)
+            directories.setdefault(directory, {})[name] = path
+
+        for directory in self._watches.keys() - directories.keys():
+            self._libc.inotify_rm_watch(self._fd,
+                                        self._watches.pop(directory))
+        self._names = {}
+        for directory, names in directories.items():
+            if directory not in self._watches:
+                descriptor = self._libc.inotify_add_watch(
+                    self._fd, os.fsencode(directory), _INOTIFY_MASK)
+                if descriptor == -1:
+                    log.warning("cannot watch '%s': %s", directory,
+                                os.strerror(ctypes.get_errno()))
+                    continue
+                self._watches[directory] = descriptor
+            self._names.setdefault(self._watches[directory], {}).update(names)
+
+    def _on_readable(self, junk_fd, junk_mask):
+        changed = set()
+        while True:
+            try:
+                # the kernel returns whole events only
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                log.exception("reading inotify events failed")
+                break
+
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, junk_cookie, length = (
+                    _INOTIFY_EVENT.unpack_from(data, offset))
+                offset += _INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+
+                if mask & _IN_Q_OVERFLOW:
+                    # some events were lost
+                    for names in self._names.values():
+                        changed.update(names.values())
+                elif mask & _IN_IGNORED:
+                    # the directory was deleted or unmounted
+                    self._names.pop(descriptor, None)
+                    for directory, value in list(self._watches.items()):
+                        if value == descriptor:
+                            del self._watches[directory]
+                else:
+                    path = self._names.get(descriptor, {}).get(name)
+                    if path is not None:
+                        changed.add(path)
+
+        for path in changed:
+            self._callback(path)
+
+    def close(self):
+        self._widget.tk.deletefilehandler(self._fd)
+        os.close(self._fd)
+
+
+class _PollingWatcher:
+    # Like _InotifyWatcher, but this checks the modification times and
+    # sizes of _STAT_BATCH_SIZE files every _POLL_INTERVAL milliseconds.
+
+    def __init__(self, widget, callback):
+        self._widget = widget
+        self._callback = callback
+        self._keys = {}         # {path: _get_stat_key() result or None}
+        self._queue = []        # paths not checked in this round yet
+        self._after_id = widget.after(_POLL_INTERVAL, self._poll)
+
+    def update(self, paths):
+        old_keys = self._keys
+        self._keys = {path: (old_keys[path] if path in old_keys
+                             else _stat_key_or_none(path))
+                      for path in paths}
+
+    def _poll(self):
+        if not self._queue:
+            self._queue = list(self._keys)
+        batch = self._queue[-_STAT_BATCH_SIZE:]
+        del self._queue[-_STAT_BATCH_SIZE:]
+
+        for path in batch:
+            if path not in self._keys:
+                # update() removed it
+                continue
+            key = _stat_key_or_none(path)
+            if key != self._keys[path]:
+                self._keys[path] = key
+                self._callback(path)
+        self._after_id = self._widget.after(_POLL_INTERVAL, self._poll)
+
+    def close(self):
+        self._widget.after_cancel(self._after_id)
+
+
+class _DiskState:
+    # The text of a tab is the same as the first size bytes of the file,
+    # and those bytes end with tail. key is from _get_stat_key().
+
+    def __init__(self, key, size, tail):
+        self.key = key
+        self.size = size
+        self.tail = tail
+
+
+def _find_match(old_lines, new_lines, i, j, old_end, new_end):
+    # Return (i2, j2) where old_lines[i:i2] and new_lines[j:j2] are
+    # different and the lines after them are the same again. The closest
+    # such place within _DIFF_WINDOW lines is returned, or the end of the
+    # window if there's none.
+    window = _FIRST_DIFF_WINDOW
+    while True:
+        window = min(window, _DIFF_WINDOW)
+        match = _find_match_in_window(old_lines, new_lines, i, j,
+                                      min(i + window, old_end),
+                                      min(j + window, new_end))
+        if match is not None:
+            return match
+        if window == _DIFF_WINDOW:
+            return (min(i + window, old_end), min(j + window, new_end))
+        # most changes are small, and looking at many lines after each of
+        # them would be slow
+        window *= 8
+
+
+def _find_match_in_window(old_lines, new_lines, i, j, old_stop, new_stop):
+    positions = {}
+    for index in range(j, new_stop):
+        positions.setdefault(new_lines[index], []).append(index)
+
+    best = None     # (distance, i2, j2)
+    for i2 in range(i, old_stop):
+        if best is not None and i2 - i >= best[0]:
+            break
+        for j2 in positions.get(old_lines[i2], ()):
+            distance = (i2 - i) + (j2 - j)
+            if best is not None and distance >= best[0]:
+                break
+            # one same line, e.g. an empty line, isn't enough, because then
+            # a change containing empty lines would become many changes
+            if (old_lines[i2:i2 + _MATCH_LINES] ==
+                    new_lines[j2:j2 + _MATCH_LINES]):
+                best = (distance, i2, j2)
+                break
+    return None if best is None else best[1:]
+
+
+def _iter_changed_ranges(old_lines, new_lines, old_end, new_end):
+    # Yield (i1, i2, j1, j2) tuples in order, old_lines[i1:i2] must be
+    # replaced with new_lines[j1:j2]. Lines after old_end and new_end are
+    # the same and not compared.
+    i = j = 0
+    while True:
+        # comparing lists is much faster than comparing lines one by one
+        while (i + _SKIP_STEP <= old_end and j + _SKIP_STEP <= new_end and
+               old_lines[i:i + _SKIP_STEP] == new_lines[j:j + _SKIP_STEP]):
+            i += _SKIP_STEP
+            j += _SKIP_STEP
+        while i < old_end and j < new_end and old_lines[i] == new_lines[j]:
+            i += 1
+            j += 1
+        if i == old_end or j == new_end:
+            if i < old_end or j < new_end:
+                yield (i, old_end, j, new_end)
+            return
+        i2, j2 = _find_match(old_lines, new_lines, i, j, old_end, new_end)
+        yield (i, i2, j, j2)
+        i, j = i2, j2
+
+
+def diff_lines(old_lines, new_lines):
+    # Return a list of (start, end, text) tuples. Replacing the text
+    # between the start and end indexes with text for each tuple in order
+    # changes a text with old_lines to new_lines. The changes are sorted
+    # from the end of the text, so that each change doesn't move the
+    # indexes of the next changes.
+    limit = min(len(old_lines), len(new_lines))
+    suffix = 0
+    while (suffix + _SKIP_STEP <= limit and
+           old_lines[len(old_lines) - suffix - _SKIP_STEP:
+                     len(old_lines) - suffix] ==
+           new_lines[len(new_lines) - suffix - _SKIP_STEP:
+                     len(new_lines) - suffix]):
+        suffix += _SKIP_STEP
+    while (suffix < limit and
+           old_lines[-1 - suffix] == new_lines[-1 - suffix]):
+        suffix += 1
+
+    ranges = []
+    for i1, i2, j1, j2 in _iter_changed_ranges(
+            old_lines, new_lines, len(old_lines) - suffix,
+            len(new_lines) - suffix):
+        if ranges and ranges[-1][1] == i1 and ranges[-1][3] == j1:
+            # _get_change() needs changes that don't touch each other
+            ranges[-1] = (ranges[-1][0], i2, ranges[-1][2], j2)
+        else:
+            ranges.append((i1, i2, j1, j2))
+    return [_get_change(old_lines, new_lines, *changed)
+            for changed in reversed(ranges)]
+
+
+def _get_change(old_lines, new_lines, i1, i2, j1, j2):
+    # Convert a range from _iter_changed_ranges() to a (start, end, text)
+    # tuple. The lines are numbered from 0 here and from 1 in the text
+    # indexes. Columns are left to tk, because it counts some characters
+    # differently, see document.tk_length().
+    end_of_text = 'end - 1 char'
+    if i2 < len(old_lines):
+        # all changed lines end with a newline
+        return ('%d.0' % (i1 + 1), '%d.0' % (i2 + 1),
+                ''.join(line + '\n' for line in new_lines[j1:j2]))
+
+    # changes don't touch each other, so this is the last change and the
+    # ends of both texts changed
+    if j1 == j2:
+        # lines were deleted from the end, and the newline before them too
+        return ('%d.0 lineend' % i1, end_of_text, '')
+    if i1 == len(old_lines):
+        # lines were added after the last line
+        return (end_of_text, end_of_text, '\n' + '\n'.join(new_lines[j1:j2]))
+    return ('%d.0' % (i1 + 1), end_of_text, '\n'.join(new_lines[j1:j2]))
+
+
+def _read_state(path):
+    # Return a _DiskState for the whole file.
+    with open(path, 'rb') as file:
+        stat = os.fstat(file.fileno())
+        start = max(stat.st_size - _TAIL_SIZE, 0)
+        file.seek(start)
+        tail = file.read(_TAIL_SIZE)
+    return _DiskState(_get_stat_key(stat), start + len(tail), tail)
+
+
+def _set_saved(tab, state, appended=None):
+    # the file may have grown after state was created, and then reading
+    # it again in _on_saved() would skip the new bytes
+    _states[tab] = state
+    _setting_saved.add(tab)
+    try:
+        tab.mark_saved(appended)
+    finally:
+        _setting_saved.discard(tab)
+
+
+def _decode(data, encoding):
+    # Return (text, number of bytes used). An incomplete character or a
+    # '\r' that may be a part of '\r\n' at the end of data is not used.
+    decoder = codecs.getincrementaldecoder(encoding)()
+    text = decoder.decode(data)
+    used = len(data) - len(decoder.getstate()[0])
+    if text.endswith('\r'):
+        text = text[:-1]
+        used -= len('\r'.encode(encoding))
+    # like open() does it when reading the file
+    return (text.replace('\r\n', '\n').replace('\r', '\n'), used)
+
+
+def _append_tail(tab, state):
+    # If bytes were added to the end of the file, insert them to the end
+    # of the text and return True. Otherwise return False.
+    encoding = settings.get_section('General')['encoding']
+    with open(tab.path, 'rb') as file:
+        stat = os.fstat(file.fileno())
+        if stat.st_size <= state.size:
+            return False
+        file.seek(state.size - len(state.tail))
+        data = file.read(stat.st_size - state.size + len(state.tail))
+    if not data.startswith(state.tail):
+        return False
+
+    text, used = _decode(data[len(state.tail):], encoding)
+    textwidget = tab.textwidget
+    # keep showing the end if it was visible, like 'tail -f'
+    follow = textwidget.yview()[1] == 1.0
+    if text:
+        textwidget.edit_separator()
+        textwidget.insert('end - 1 char', text)
+        textwidget.edit_separator()
+    if follow:
+        textwidget.see('end - 1 char')
+
+    # if some bytes weren't used, they are used when the file changes next
+    # time, and the stat key is for the whole file
+    tail = data[:len(state.tail) + used][-_TAIL_SIZE:]
+    # only _check() calls this, and only for a saved text
+    _set_saved(tab, _DiskState(_get_stat_key(stat), state.size + used, tail),
+               text)
+    return True
+
+
+def _apply_diff(tab):
+    encoding = settings.get_section('General')['encoding']
+    with open(tab.path, 'rb') as file:
+        stat = os.fstat(file.fileno())
+        data = file.read()
+    text = data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+
+    textwidget = tab.textwidget
+    changes = diff_lines(textwidget.document.get().split('\n'),
+                         text.split('\n'))
+    # tk's marks stay in the same text when text before them changes
+    textwidget.mark_set(_TOP_MARK, '@0,0')
+    textwidget.mark_gravity(_TOP_MARK, 'left')
+    textwidget.edit_separator()
+    with textwidget.undo_batch():
+        for start, end, new_text in changes:
+            if start != end:
+                textwidget.delete(start, end)
+            if new_text:
+                textwidget.insert(start, new_text)
+    textwidget.edit_separator()
+    textwidget.yview(_TOP_MARK)
+    textwidget.mark_unset(_TOP_MARK)
+
+    _set_saved(tab, _DiskState(_get_stat_key(stat), len(data),
+                               data[-_TAIL_SIZE:]))
+
+
+def _check(tab):
+    state = _states.get(tab)
+    if (state is None or tab.path is None or tab.is_hibernating() or
+            tab.is_loading() or tab.textwidget['state'] == 'disabled'):
+        # a hibernating tab is checked when it wakes up
+        return
+    try:
+        stat = os.stat(tab.path)
+    except OSError:
+        # deleted, or another program is replacing it and there will be
+        # another event when it's back
+        return
+    key = _get_stat_key(stat)
+    if key == state.key:
+        return
+
+    old_inode = state.key[0]
+    if stat.st_ino != old_inode:
+        # e.g. saved by renaming a new file over the old file
+        _tab_manager.update_file_key(tab)
+    saved = tab.is_saved()
+    if not saved:
+        # ask only once for each change
+        state.key = key
+        if not messagebox.askyesno(
+                "File changed",
+                "'%s' was changed by another program, and it has unsaved "
+                "changes. Do you want to load the new content? Your "
+                "changes can be undone." % os.path.basename(tab.path)):
+            return
+
+    try:
+        if not (saved and stat.st_ino == old_inode and
+                _append_tail(tab, state)):
+            _apply_diff(tab)
+    except (OSError, UnicodeError):
+        # e.g. the program writing the file isn't done yet, and the next
+        # change tries again
+        log.exception("loading the changes of '%s' failed", tab.path)
+
+
+def _run_checks():
+    global _check_scheduled
+    _check_scheduled = False
+    tabs_to_check = list(_pending_checks)
+    _pending_checks.clear()
+    for tab in tabs_to_check:
+        if tab.winfo_exists():
+            _check(tab)
+
+
+def _schedule_check(tab):
+    global _check_scheduled
+    _pending_checks.add(tab)
+    if not _check_scheduled:
+        _check_scheduled = True
+        _tab_manager.after(_CHECK_DELAY, _run_checks)
+
+
+def _get_file_tabs():
+    import tabs
+    return [tab for tab in _tab_manager.tabs()
+            if isinstance(tab, tabs.FileTab) and tab.path is not None]
+
+
+def _update_watcher(junk_event=None):
+    _watcher.update({os.path.abspath(tab.path) for tab in _get_file_tabs()})
+
+
+def _on_file_changed(path):
+    if not settings.get_section('General')['watch_files']:
+        return
+    found = False
+    for tab in _get_file_tabs():
+        if os.path.abspath(tab.path) == path:
+            _schedule_check(tab)
+            found = True
+    if not found:
+        # the tab was closed
+        _update_watcher()
+
+
+def _save_state(tab):
+    if tab.disk_snapshot is not None:
+        # the file may have changed after the text was read from it, and
+        # reading the state now would hide that change
+        stat, size, tail = tab.disk_snapshot
+        tab.disk_snapshot = None
+        _states[tab] = _DiskState(_get_stat_key(stat), size,
+                                  tail[-_TAIL_SIZE:])
+        # changes before the file was watched don't come as events
+        _schedule_check(tab)
+        return
+    try:
+        _states[tab] = _read_state(tab.path)
+    except OSError:
+        _states.pop(tab, None)
+
+
+def _on_saved(event):
+    if event.widget not in _setting_saved and event.widget.path is not None:
+        _save_state(event.widget)
+
+
+def _on_new_tab(event):
+    import tabs
+    tab = event.data
+    if not isinstance(tab, tabs.FileTab):
+        return
+    events.bind(tab, '<<Saved>>', _on_saved)
+    tab.bind('<<PathChanged>>', _update_watcher, add=True)
+    # changes while hibernating are applied when the tab wakes up
+    tab.bind('<<TextWidgetCreated>>',
+             (lambda event: _schedule_check(tab)), add=True)
+    if (tab.path is not None and not tab.is_hibernating() and
+            not tab.is_loading()):
+        # a loading tab gets its state from <<Saved>> when it's loaded
+        _save_state(tab)
+    _update_watcher()
+
+
+def setup():
+    import _run
+    global _watcher, _tab_manager
+    config = settings.get_section('General')
+    config.add_option('watch_files', True)
+    config.add_checkbutton('watch_files',
+                           "Load changes that other programs make to files")
+
+    root = _run.get_main_window()
+    _tab_manager = _run.get_tab_manager()
+    _watcher = None
+    if sys.platform.startswith('linux'):
+        try:
+            _watcher = _InotifyWatcher(root, _on_file_changed)
+        except (OSError, AttributeError):
+            # AttributeError means that libc doesn't have inotify_init1()
+            log.exception("cannot use inotify, polling files instead")
+    if _watcher is None:
+        _watcher = _PollingWatcher(root, _on_file_changed)
+    events.bind(_tab_manager, '<<NewTab>>', _on_new_tab)
+    root.bind('<<SimpleEditorQuit>>', (lambda event: _watcher.close()),
+              add=True)
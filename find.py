@@ -1,4 +1,5 @@
 """Find/replace widget."""
+import functools
 import re
 import sys
 import tkinter as tk
@@ -6,7 +7,7 @@ from tkinter import ttk
 import weakref
 
 from _run import get_tab_manager
-import images, tabs, actions
+import images, tabs, actions, perfmonitor, recording, settings, tracing, utils
 
 
 # keys are tabs, values are Finder widgets
@@ -80,7 +81,11 @@ class Finder(ttk.Frame):
 
         closebutton['image'] = images.get('closebutton')
 
-        textwidget.bind('<<Selection>>', self._update_buttons, add=True)
+        # selecting with the mouse generates lots of <<Selection>> events
+        textwidget.bind(
+            '<<Selection>>',
+            (lambda event: utils.schedule_update(self._update_buttons)),
+            add=True)
 
     def _add_entry(self, row, text):
         ttk.Label(self, text=text).grid(row=row, column=0, sticky='w')
@@ -113,15 +118,15 @@ class Finder(ttk.Frame):
     # must be called when going to another match or replacing becomes possible
     # or impossible, i.e. when find_highlight areas or the selection changes
     def _update_buttons(self, junk_event=None):
-        matches_something_state = (
-            'normal' if self.get_match_ranges() else 'disabled')
+        match_ranges = self.get_match_ranges()
+        matches_something_state = 'normal' if match_ranges else 'disabled'
 
         try:
             start, end = map(str, self._textwidget.tag_ranges('sel'))
         except ValueError:
             replace_this_state = 'disabled'
         else:
-            if (start, end) in self.get_match_ranges():
+            if (start, end) in match_ranges:
                 replace_this_state = 'normal'
             else:
                 replace_this_state = 'disabled'
@@ -132,37 +137,14 @@ class Finder(ttk.Frame):
         self.replace_all_button['state'] = matches_something_state
 
     def _get_matches_to_highlight(self, lookingfor):
-        search_opts = {'nocase': self.ignore_case_var.get()}
-        if self.full_words_var.get():
-            # tk doesn't have python-style \b, but it has \m and \M that match
-            # the beginning and end of word, see re_syntax(3tcl)
-            search_arg = r'\m' + lookingfor + r'\M'
-            search_opts['regexp'] = True
-        else:
-            search_arg = lookingfor
-
-        start_index = '1.0'
-        first_time = True
-
-        while True:
-            # searching at the beginning of a match gives that match, not
-            # the next match, so we need + 1 char... unless we are looking
-            # at the beginning of the file, and to avoid infinite
-            # recursion, we check for that by checking if we have done it
-            # before
-            if first_time:
-                start_index_for_search = start_index
-                first_time = False
-            else:
-                start_index_for_search = '%s + 1 char' % start_index
-
-            start_index = self._textwidget.search(
-                search_arg, start_index_for_search, 'end', **search_opts)
-            if not start_index:
-                # no more matches
-                break
-            yield start_index
-
+        # the document is searched with python's re instead of the text
+        # widget's search command, which would be called once per match
+        return self._textwidget.document.find_all(
+            lookingfor, full_words=self.full_words_var.get(),
+            ignore_case=self.ignore_case_var.get())
+
+    @perfmonitor.timed('Finder.highlight_all_matches')
+    @tracing.traced('find')
     def highlight_all_matches(self, *junk):
         # clear previous highlights
         self._textwidget.tag_remove('find_highlight', '1.0', 'end')
@@ -182,12 +164,15 @@ class Finder(ttk.Frame):
                                             'checked.' % match.group(0))
                 return
 
-        count = 0
-        for start_index in self._get_matches_to_highlight(lookingfor):
-            self._textwidget.tag_add(
-                'find_highlight', start_index,
-                '%s + %d chars' % (start_index, len(lookingfor)))
-            count += 1
+        recording.record('find', text=lookingfor,
+                         full_words=self.full_words_var.get(),
+                         ignore_case=self.ignore_case_var.get())
+        matches = self._get_matches_to_highlight(lookingfor)
+        count = len(matches)
+        if matches:
+            # one tag_add call can add all the ranges
+            self._textwidget.tag_add('find_highlight', *[
+                index for match in matches for index in match])
 
         self._update_buttons()
         if count == 0:
@@ -205,6 +190,7 @@ class Finder(ttk.Frame):
         self._textwidget.mark_set('insert', start)
         self._textwidget.see(start)
 
+    @perfmonitor.timed('Finder.go_to_next_match')
     def _go_to_next_match(self, junk_event=None):
         pairs = self.get_match_ranges()
         if not pairs:
@@ -226,6 +212,7 @@ class Finder(ttk.Frame):
         self._update_buttons()
 
     # see _go_to_next_match for comments
+    @perfmonitor.timed('Finder.go_to_previous_match')
     def _go_to_previous_match(self, junk_event=None):
         pairs = self.get_match_ranges()
         if not pairs:
@@ -243,6 +230,8 @@ class Finder(ttk.Frame):
         self._update_buttons()
         return
 
+    @perfmonitor.timed('Finder.replace_this')
+    @tracing.traced('replace')
     def _replace_this(self, junk_event=None):
         if str(self.replace_this_button['state']) == 'disabled':
             self.statuslabel['text'] = (
@@ -269,13 +258,16 @@ class Finder(ttk.Frame):
             self.statuslabel['text'] = (
                 "Replaced a match. There are %d more matches." % left)
 
+    @perfmonitor.timed('Finder.replace_all')
+    @tracing.traced('replace all')
     def _replace_all(self):
         match_ranges = self.get_match_ranges()
 
         # must do this backwards because replacing may screw up indexes AFTER
         # the replaced place
-        for start, end in reversed(match_ranges):
-            self._textwidget.replace(start, end, self.replace_entry.get())
+        with self._textwidget.undo_batch():
+            for start, end in reversed(match_ranges):
+                self._textwidget.replace(start, end, self.replace_entry.get())
         self._textwidget.tag_remove('find_highlight', '1.0', 'end')
         self._update_buttons()
 
@@ -286,14 +278,111 @@ class Finder(ttk.Frame):
                                         len(match_ranges))
 
 
+class BigFileFinder(ttk.Frame):
+    # A find widget for BigFileTab. The file isn't in a text widget, so
+    # this searches the memory-mapped file with a bytes regex and doesn't
+    # support replacing or highlighting all matches.
+
+    def __init__(self, parent, tab, **kwargs):
+        super().__init__(parent, **kwargs)
+        self._tab = tab
+
+        ttk.Label(self, text="Find:").grid(row=0, column=0, sticky='w')
+        self.find_entry = ttk.Entry(self, width=35, font='TkFixedFont')
+        self.find_entry.grid(row=0, column=1, sticky='we')
+        self.find_entry.bind('<Escape>', self.hide)
+        self.find_entry.bind('<Shift-Return>', self._go_to_previous_match)
+        self.find_entry.bind('<Return>', self._go_to_next_match)
+        self.grid_columnconfigure(2, minsize=30)
+        self.grid_columnconfigure(3, weight=1)
+
+        buttonframe = ttk.Frame(self)
+        buttonframe.grid(row=1, column=0, columnspan=4, sticky='we')
+        ttk.Button(buttonframe, text="Previous match",
+                   command=self._go_to_previous_match).pack(side='left')
+        ttk.Button(buttonframe, text="Next match",
+                   command=self._go_to_next_match).pack(side='left')
+
+        self.full_words_var = tk.BooleanVar()
+        self.ignore_case_var = tk.BooleanVar()
+        ttk.Checkbutton(
+            self, text="Full words only", variable=self.full_words_var).grid(
+                row=0, column=3, sticky='w')
+        ttk.Checkbutton(
+            self, text="Ignore case", variable=self.ignore_case_var).grid(
+                row=1, column=3, sticky='w')
+
+        self.statuslabel = ttk.Label(self)
+        self.statuslabel.grid(row=2, column=0, columnspan=4, sticky='we')
+        ttk.Separator(self, orient='horizontal').grid(
+            row=3, column=0, columnspan=4, sticky='we')
+
+        closebutton = ttk.Label(self, cursor='hand2')
+        closebutton.place(relx=1, rely=0, anchor='ne')
+        closebutton.bind('<Button-1>', self.hide)
+        closebutton['image'] = images.get('closebutton')
+
+    def show(self):
+        self.pack(fill='x')
+        self.find_entry.focus_set()
+
+    def hide(self, junk_event=None):
+        self.pack_forget()
+        self._tab.on_focus()
+
+    def _get_pattern(self):
+        lookingfor = self.find_entry.get()
+        if not lookingfor:
+            return None
+        encoding = settings.get_section('General')['encoding']
+        regex = re.escape(lookingfor.encode(encoding, errors='replace'))
+        if self.full_words_var.get():
+            regex = rb'\b' + regex + rb'\b'
+        flags = re.IGNORECASE if self.ignore_case_var.get() else 0
+        return re.compile(regex, flags)
+
+    @perfmonitor.timed('BigFileFinder.search')
+    @tracing.traced('find')
+    def _search(self, backwards):
+        pattern = self._get_pattern()
+        if pattern is None:
+            self.statuslabel['text'] = "Type something to find."
+            return
+        # searching a big file takes a while, but doesn't block the GUI
+        self.statuslabel['text'] = "Searching..."
+        self._tab.search(pattern, backwards, functools.partial(
+            self._on_search_done, backwards))
+
+    def _on_search_done(self, backwards, found):
+        if found:
+            self.statuslabel['text'] = ""
+        elif backwards:
+            self.statuslabel['text'] = "No matches before the cursor."
+        else:
+            self.statuslabel['text'] = "No matches after the cursor."
+
+    def _go_to_next_match(self, junk_event=None):
+        self._search(backwards=False)
+
+    def _go_to_previous_match(self, junk_event=None):
+        self._search(backwards=True)
+
+
 def find():
     tab = get_tab_manager().select()
-    assert isinstance(tab, tabs.FileTab)
+    assert isinstance(tab, (tabs.FileTab, tabs.BigFileTab))
+    if tab in finders and isinstance(tab, tabs.FileTab) and (
+            finders[tab]._textwidget is not tab.textwidget):
+        # the tab has hibernated and got a new text widget after that
+        finders.pop(tab).destroy()
     if tab not in finders:
-        finders[tab] = Finder(tab.bottom_frame, tab.textwidget)
+        if isinstance(tab, tabs.BigFileTab):
+            finders[tab] = BigFileFinder(tab.bottom_frame, tab)
+        else:
+            finders[tab] = Finder(tab.bottom_frame, tab.textwidget)
     finders[tab].show()
 
 
 def setup():
     actions.add_command("Edit/Find and Replace", find, '<Control-f>',
-                        tabtypes=[tabs.FileTab])
+                        tabtypes=[tabs.FileTab, tabs.BigFileTab])
@@ -0,0 +1,110 @@
+"""Finding the words that make documents different from each other.
+
+The documents are rows of a sparse document-term matrix in the CSR
+format, built with numpy only. A word gets a high TF-IDF score in a
+document if it's common in that document but appears in few other
+documents, so words that are common everywhere get low scores even if
+they aren't in the stop word list.
+
+The word counts of each document are cached in memory by the content
+hash from statscache.get_key(), so adding a document only tokenizes
+the new document. This module doesn't use tkinter.
+"""
+import collections
+
+import numpy
+
+# how many documents' word counts are kept in memory
+_MAX_CACHED = 256
+
+# keys are content hashes, values are (vocabulary, counts) pairs
+_term_counts = collections.OrderedDict()
+
+Matrix = collections.namedtuple('Matrix', ['terms', 'indptr', 'indices',
+                                           'data'])
+
+
+def get_term_counts(key, get_tokens):
+    # Return (vocabulary, counts) of a document. get_tokens() should return
+    # a tokenizer.TokenSequence, and it's called only if the key isn't
+    # cached.
+    try:
+        _term_counts.move_to_end(key)
+        return _term_counts[key]
+    except KeyError:
+        pass
+
+    tokens = get_tokens()
+    # the token ids aren't needed, only the counts are kept
+    result = (tokens.vocabulary, tokens.counts())
+    _term_counts[key] = result
+    while len(_term_counts) > _MAX_CACHED:
+        _term_counts.popitem(last=False)
+    return result
+
+
+def build_matrix(documents):
+    # Build a document-term matrix from a list of (vocabulary, counts)
+    # pairs. Row i of the matrix is documents[i], and the values are
+    # word counts.
+    term_ids = {}
+    indptr = numpy.zeros(len(documents) + 1, dtype=numpy.int64)
+    indices = []
+    data = []
+    for row, (vocabulary, counts) in enumerate(documents):
+        setdefault = term_ids.setdefault
+        indices.append(numpy.fromiter(
+            (setdefault(word, len(term_ids)) for word in vocabulary),
+            dtype=numpy.int64, count=len(vocabulary)))
+        data.append(numpy.asarray(counts, dtype=numpy.float64))
+        indptr[row + 1] = indptr[row] + len(vocabulary)
+
+    if documents:
+        indices = numpy.concatenate(indices)
+        data = numpy.concatenate(data)
+    else:
+        indices = numpy.zeros(0, dtype=numpy.int64)
+        data = numpy.zeros(0, dtype=numpy.float64)
+    return Matrix(list(term_ids), indptr, indices, data)
+
+
+def tf_idf(matrix):
+    # Return a matrix with the same structure and TF-IDF scores as values.
+    # TF is the count divided by the length of the document, and IDF is
+    # smoothed like in scikit-learn: ln((1 + n) / (1 + df)) + 1.
+    document_count = len(matrix.indptr) - 1
+    row_lengths = numpy.diff(matrix.indptr)
+    row_of_value = numpy.repeat(numpy.arange(document_count), row_lengths)
+
+    totals = numpy.bincount(row_of_value, weights=matrix.data,
+                            minlength=document_count)
+    document_frequency = numpy.bincount(matrix.indices,
+                                        minlength=len(matrix.terms))
+    idf = numpy.log((1 + document_count) / (1 + document_frequency)) + 1
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        tf = matrix.data / totals[row_of_value]
+    return matrix._replace(data=numpy.nan_to_num(tf) * idf[matrix.indices])
+
+
+def top_terms(matrix, count):
+    # Return a list with a list of (term, value) pairs for each row, the
+    # count biggest values first.
+    result = []
+    for row in range(len(matrix.indptr) - 1):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        values = matrix.data[start:end]
+        if len(values) > count:
+            best = numpy.argpartition(-values, count)[:count]
+        else:
+            best = numpy.arange(len(values))
+        best = best[numpy.argsort(-values[best], kind='stable')]
+        result.append([(matrix.terms[matrix.indices[start + i]],
+                        float(values[i])) for i in best.tolist()])
+    return result
+
+
+def extract_keywords(documents, count=10):
+    # Return the count most distinctive words of each (vocabulary, counts)
+    # pair in documents, as lists of (word, score) pairs.
+    return top_terms(tf_idf(build_matrix(documents)), count)
@@ -1,15 +1,50 @@
-import _run
+import sys
 
-def main():
-
-    _run.init()
+# _run is imported in the functions because it imports tkinter and
+# matplotlib, and the batch mode and forwarding files to a running editor
+# must work without them
 
-    import find, geometry, menubar
+def setup_plugins():
+    import find, geometry, menubar, perfmonitor, recording, statusbar, tracing
+    import filewatch, session, wordcount
+    perfmonitor.setup()
+    tracing.setup()
+    recording.setup()
     find.setup()
     geometry.setup()
     menubar.setup()
+    statusbar.setup()
+    wordcount.setup()
+    filewatch.setup()
+    # last because the other plugins must see the restored tabs
+    session.setup()
+
+def main():
+    import batchcommands
+    if len(sys.argv) > 1 and sys.argv[1] in batchcommands.COMMANDS:
+        import batch
+        sys.exit(batch.main(sys.argv[1:]))
+
+    import argparse, singleinstance
+    parser = argparse.ArgumentParser(
+        prog='main.py', description=(
+            "A text editor. Run 'main.py tokenize --help' or "
+            "'main.py stats --help' for the batch mode."))
+    parser.add_argument('files', nargs='*', metavar='FILE[:LINE]')
+    parser.add_argument(
+        '--new-instance', action='store_true',
+        help="don't open the files in an editor that is already running")
+    args = parser.parse_args()
+    files = singleinstance.parse_file_args(args.files)
+    # this is much faster than starting another editor
+    if not args.new_instance and singleinstance.forward(files):
+        return
 
+    import _run
+    _run.init()
+    setup_plugins()
+    singleinstance.setup(files, listen=not args.new_instance)
     _run.run()
-    
+
 if __name__ == '__main__':
     main()
@@ -1,7 +1,7 @@
 import tkinter
 
 from _run import get_main_window
-import actions, utils
+import actions, events, utils
 
 
 class MenuManager:
@@ -86,14 +86,11 @@ def setup():
     menubar = MenuManager()
     window['menu'] = menubar.main_menu
 
-    utils.bind_with_data(
-        window, '<<NewAction>>', menubar.on_new_action, add=True)
-    utils.bind_with_data(
-        window, '<<ActionEnabled>>',
-        (lambda event: menubar.on_enable_disable(event.data)), add=True)
-    utils.bind_with_data(
-        window, '<<ActionDisabled>>',
-        (lambda event: menubar.on_enable_disable(event.data)), add=True)
+    events.bind(window, '<<NewAction>>', menubar.on_new_action)
+    events.bind(window, '<<ActionEnabled>>',
+                (lambda event: menubar.on_enable_disable(event.data)))
+    events.bind(window, '<<ActionDisabled>>',
+                (lambda event: menubar.on_enable_disable(event.data)))
 
     for action in actions.get_all_actions():
         menubar.setup_action(action)
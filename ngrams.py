@@ -0,0 +1,100 @@
+"""N-gram counts and collocation scores of a tokenizer.TokenSequence.
+
+Everything is computed with numpy from the token id array. The ids of an
+n-gram are combined into one uint64 key, so counting n-grams is one
+numpy.unique() call instead of a dict of tuples. This module doesn't use
+tkinter.
+"""
+import numpy
+
+
+def _combine(ids, vocab_size, n):
+    # Return a uint64 key for each n-gram, the keys are ids in base
+    # vocab_size.
+    count = len(ids) - n + 1
+    keys = ids[:count].astype(numpy.uint64)
+    for offset in range(1, n):
+        keys *= numpy.uint64(vocab_size)
+        keys += ids[offset:offset + count]
+    return keys
+
+
+def count_ngrams(tokens, n):
+    # Return (grams, counts) where grams is a (k, n) array of vocabulary
+    # ids and counts[i] is the number of times grams[i] appears. The most
+    # common n-grams are first, and n-grams that appear equally many times
+    # are in the order of the vocabulary ids.
+    vocab_size = max(len(tokens.vocabulary), 1)
+    if len(tokens) < n:
+        return (numpy.zeros((0, n), dtype=numpy.uint32),
+                numpy.zeros(0, dtype=numpy.int64))
+
+    if vocab_size ** n < 2**64:
+        keys, counts = numpy.unique(_combine(tokens.ids, vocab_size, n),
+                                    return_counts=True)
+        grams = numpy.empty((len(keys), n), dtype=numpy.uint32)
+        for column in reversed(range(n)):
+            grams[:, column] = keys % numpy.uint64(vocab_size)
+            keys //= numpy.uint64(vocab_size)
+    else:
+        # the keys would overflow, this is slower but rarely needed
+        windows = numpy.lib.stride_tricks.sliding_window_view(tokens.ids, n)
+        grams, counts = numpy.unique(windows, axis=0, return_counts=True)
+
+    order = numpy.argsort(-counts, kind='stable')
+    return grams[order], counts[order]
+
+
+def _log_likelihood_term(observed, expected):
+    # k * ln(k / E), and 0 when k is 0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        result = observed * numpy.log(observed / expected)
+    return numpy.where(observed > 0, result, 0.0)
+
+
+def collocations(tokens, bigrams, min_count=3):
+    # Score word pairs that appear together more often than by chance.
+    # bigrams is the return value of count_ngrams(tokens, 2). Returns
+    # (grams, counts, pmi, log_likelihood) for the bigrams that appear at
+    # least min_count times, the highest log-likelihood first.
+    #
+    # PMI is log2(P(xy) / (P(x) P(y))). It likes rare pairs, hence
+    # min_count. The log-likelihood is Dunning's G^2 for the 2x2 table of
+    # "first word is x" and "second word is y", and it is less sensitive
+    # to rare pairs.
+    grams, counts = bigrams
+    keep = counts >= min_count
+    grams = grams[keep]
+    counts = counts[keep]
+
+    unigram_counts = tokens.counts().astype(numpy.float64)
+    total = float(max(len(tokens) - 1, 1))
+    k11 = counts.astype(numpy.float64)
+    x_counts = unigram_counts[grams[:, 0]]
+    y_counts = unigram_counts[grams[:, 1]]
+    pmi = numpy.log2(k11 * total / (x_counts * y_counts))
+
+    k12 = numpy.maximum(x_counts - k11, 0)
+    k21 = numpy.maximum(y_counts - k11, 0)
+    k22 = numpy.maximum(total - x_counts - y_counts + k11, 0)
+    row1, row2 = k11 + k12, k21 + k22
+    column1, column2 = k11 + k21, k12 + k22
+    expected11 = row1 * column1 / total
+    log_likelihood = 2 * (
+        _log_likelihood_term(k11, expected11) +
+        _log_likelihood_term(k12, row1 * column2 / total) +
+        _log_likelihood_term(k21, row2 * column1 / total) +
+        _log_likelihood_term(k22, row2 * column2 / total))
+    # G^2 is big for pairs that appear together less often than by chance
+    # too, and those go last
+    log_likelihood = numpy.where(k11 < expected11, -log_likelihood,
+                                 log_likelihood)
+
+    order = numpy.argsort(-log_likelihood, kind='stable')
+    return grams[order], counts[order], pmi[order], log_likelihood[order]
+
+
+def join_grams(tokens, grams):
+    # Return a list of n-grams as strings like 'of the'.
+    vocabulary = tokens.vocabulary
+    return [' '.join(vocabulary[i] for i in gram) for gram in grams.tolist()]
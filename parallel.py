@@ -0,0 +1,165 @@
+"""Tokenizing one big text in several processes.
+
+The text is split into shards that end at line boundaries, and each
+worker process tokenizes one shard at a time. The text isn't pickled to
+the workers: a file on disk is memory-mapped by every worker, and other
+text is copied once to a multiprocessing.shared_memory block that the
+workers attach to. Each worker returns the vocabulary, ids and word
+counts of its shard, and merge() combines them into one
+tokenizer.TokenSequence that is equal to what
+tokenizer.TokenSequence.from_chunks() returns.
+
+Splitting at b'\\n' bytes works with UTF-8 and other encodings that are
+compatible with ASCII, but not with e.g. UTF-16. This module doesn't use
+tkinter.
+"""
+import concurrent.futures
+import functools
+import mmap
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy
+
+import tokenizer
+
+# smaller texts are tokenized in the current process, because starting
+# the worker processes takes longer than tokenizing
+MIN_SIZE = 32 * 1024 * 1024
+
+# every worker gets this many shards, so that a worker that finishes
+# early can take some of the work of slower workers
+_SHARDS_PER_JOB = 4
+_MIN_SHARD_SIZE = 1024 * 1024
+
+
+def _get_job_count(jobs):
+    return jobs or os.cpu_count() or 1
+
+
+def split_lines(buffer, shard_count):
+    # Return a list of (start, end) pairs that split a bytes or mmap
+    # object into about shard_count pieces that end at line boundaries.
+    size = len(buffer)
+    shard_size = max(size // max(shard_count, 1), _MIN_SHARD_SIZE)
+    shards = []
+    start = 0
+    while start < size:
+        end = buffer.find(b'\n', min(start + shard_size, size) - 1)
+        end = size if end == -1 else end + 1
+        shards.append((start, end))
+        start = end
+    return shards
+
+
+def _tokenize_bytes(data, encoding):
+    tokens = tokenizer.TokenSequence.from_chunks(
+        [str(data, encoding, 'replace')])
+    return (tokens.vocabulary, tokens.ids, tokens.counts())
+
+
+def _tokenize_file_shard(path, encoding, shard):
+    start, end = shard
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped)[start:end] as data:
+                return _tokenize_bytes(data, encoding)
+
+
+def _tokenize_memory_shard(name, shard):
+    start, end = shard
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        # the view must be released before closing
+        with memory.buf[start:end] as data:
+            return _tokenize_bytes(data, 'utf-8')
+    finally:
+        memory.close()
+
+
+def merge(results):
+    # Combine (vocabulary, ids, counts) tuples of consecutive shards to a
+    # tokenizer.TokenSequence.
+    results = list(results)
+    indexes = {}
+    setdefault = indexes.setdefault
+    mappings = []
+    for vocabulary, ids, counts in results:
+        # local id -> global id, new words are numbered in the order that
+        # they first appear like in TokenSequence.from_chunks()
+        mappings.append(numpy.array(
+            [setdefault(word, len(indexes)) for word in vocabulary],
+            dtype=numpy.uint32))
+
+    ids = numpy.empty(sum(len(result[1]) for result in results),
+                      dtype=numpy.uint32)
+    counts = numpy.zeros(len(indexes), dtype=numpy.uint64)
+    position = 0
+    for (vocabulary, shard_ids, shard_counts), mapping in zip(results,
+                                                              mappings):
+        ids[position:position + len(shard_ids)] = mapping[shard_ids]
+        position += len(shard_ids)
+        counts[mapping] += shard_counts
+    return tokenizer.TokenSequence(indexes, ids, counts)
+
+
+def _map_shards(function, shards, jobs):
+    # the editor process has threads, and forking a process with threads
+    # can deadlock, so the workers are started with 'spawn'
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(
+            jobs, mp_context=context) as executor:
+        return merge(executor.map(function, shards))
+
+
+def tokenize_file(path, encoding, jobs=None):
+    # Return a tokenizer.TokenSequence of the words in a file. jobs is the
+    # number of processes, None means one for each CPU.
+    jobs = _get_job_count(jobs)
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return tokenizer.TokenSequence()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            shards = split_lines(mapped, jobs * _SHARDS_PER_JOB)
+    return _map_shards(functools.partial(_tokenize_file_shard, path,
+                                         encoding), shards, jobs)
+
+
+def _get_encoded_size(chunk):
+    if chunk.isascii():
+        return len(chunk)
+    return len(chunk.encode('utf-8', errors='replace'))
+
+
+def tokenize_chunks(iter_chunks, jobs=None):
+    # Like tokenizer.TokenSequence.from_chunks(iter_chunks()), but in
+    # several processes. iter_chunks() is called twice, and the chunks
+    # must end at line boundaries.
+    jobs = _get_job_count(jobs)
+    # the size is needed for creating the shared memory, and computing it
+    # first means that only one encoded chunk is in memory at a time, so
+    # the text is in memory about twice, as str and in the shared memory
+    size = sum(map(_get_encoded_size, iter_chunks()))
+    if size == 0:
+        return tokenizer.TokenSequence()
+
+    shard_size = max(size // (jobs * _SHARDS_PER_JOB), _MIN_SHARD_SIZE)
+    shards = []
+    memory = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        start = position = 0
+        for chunk in iter_chunks():
+            chunk = chunk.encode('utf-8', errors='replace')
+            memory.buf[position:position + len(chunk)] = chunk
+            position += len(chunk)
+            if position - start >= shard_size:
+                shards.append((start, position))
+                start = position
+        if start < position:
+            shards.append((start, position))
+        return _map_shards(functools.partial(_tokenize_memory_shard,
+                                             memory.name), shards, jobs)
+    finally:
+        memory.close()
+        memory.unlink()
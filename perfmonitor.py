@@ -0,0 +1,232 @@
+"""Finding out why the editor is slow.
+
+When the performance_monitor setting is enabled, this module measures
+how late tkinter runs a periodic after() callback (the mainloop lag)
+and how long actions, event handlers and Finder operations take.
+Callbacks that take longer than the slow_callback_threshold setting are
+logged, and Help/Performance shows the worst ones with histograms.
+
+When the setting is disabled, the wrappers just call the wrapped
+function.
+"""
+import functools
+import logging
+import time
+import tkinter
+from tkinter import ttk
+
+import _run
+
+log = logging.getLogger(__name__)
+
+_HEARTBEAT_INTERVAL = 50        # milliseconds
+# upper limits of histogram buckets in milliseconds, the last bucket is
+# for everything slower than this
+_BUCKET_LIMITS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+_LAG_NAME = "(mainloop lag)"
+
+_enabled = False
+_threshold = 0.05               # seconds, see setup()
+_heartbeat_id = None
+_stats = {}                     # {name: _Stats}
+
+
+class _Stats:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(_BUCKET_LIMITS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        milliseconds = seconds * 1000
+        for index, limit in enumerate(_BUCKET_LIMITS):
+            if milliseconds < limit:
+                break
+        else:
+            index = len(_BUCKET_LIMITS)
+        self.histogram[index] += 1
+
+
+def record(name, seconds):
+    # Add a measurement, this is called by wrap()'ed functions.
+    try:
+        stats = _stats[name]
+    except KeyError:
+        stats = _stats[name] = _Stats()
+    stats.add(seconds)
+    if seconds > _threshold:
+        log.warning("%s took %.1f ms", name, seconds * 1000)
+
+
+def wrap(name, func):
+    # Return a function that calls func and records how long it took.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def timed(name):
+    # A decorator version of wrap().
+    return functools.partial(wrap, name)
+
+
+def get_callback_name(callback):
+    # A name for wrap() that tells where the callback is from.
+    try:
+        return callback.__module__ + '.' + callback.__qualname__
+    except AttributeError:
+        return repr(callback)
+
+
+def _heartbeat(expected_time):
+    global _heartbeat_id
+    now = time.perf_counter()
+    record(_LAG_NAME, max(0.0, now - expected_time))
+    _heartbeat_id = _run.get_main_window().after(
+        _HEARTBEAT_INTERVAL, _heartbeat, now + _HEARTBEAT_INTERVAL / 1000)
+
+
+def _set_enabled(enabled):
+    global _enabled, _heartbeat_id
+    _enabled = enabled
+    window = _run.get_main_window()
+    if enabled and _heartbeat_id is None:
+        _heartbeat_id = window.after(
+            _HEARTBEAT_INTERVAL, _heartbeat,
+            time.perf_counter() + _HEARTBEAT_INTERVAL / 1000)
+    elif not enabled and _heartbeat_id is not None:
+        window.after_cancel(_heartbeat_id)
+        _heartbeat_id = None
+
+
+def _set_threshold(milliseconds):
+    global _threshold
+    _threshold = milliseconds / 1000
+
+
+class PerformanceDialog:
+
+    def __init__(self):
+        self.window = tkinter.Toplevel()
+        self.window.title("Performance")
+        self.window.geometry('650x450')
+
+        big_frame = ttk.Frame(self.window)
+        big_frame.pack(fill='both', expand=True)
+
+        columns = ('count', 'total', 'mean', 'max')
+        self._tree = ttk.Treeview(big_frame, columns=columns, height=10)
+        self._tree.heading('#0', text="Callback")
+        self._tree.column('#0', width=300)
+        for column, text in zip(columns, ["Calls", "Total (ms)", "Mean (ms)",
+                                          "Max (ms)"]):
+            self._tree.heading(column, text=text)
+            self._tree.column(column, width=80, anchor='e')
+        self._tree.pack(fill='both', expand=True)
+        self._tree.bind('<<TreeviewSelect>>', self._draw_histogram)
+
+        self._canvas = tkinter.Canvas(big_frame, height=150,
+                                      background='white')
+        self._canvas.pack(fill='x')
+
+        buttonframe = ttk.Frame(big_frame)
+        buttonframe.pack(fill='x')
+        ttk.Button(buttonframe, text="Refresh",
+                   command=self.refresh).pack(side='right')
+        ttk.Button(buttonframe, text="Reset",
+                   command=self._reset).pack(side='right')
+        self._label = ttk.Label(buttonframe)
+        self._label.pack(side='left')
+
+        self.refresh()
+
+    def refresh(self):
+        self._tree.delete(*self._tree.get_children())
+        # the worst offenders are the ones that block the GUI the most
+        for name, stats in sorted(_stats.items(), reverse=True,
+                                  key=(lambda item: item[1].total)):
+            self._tree.insert('', 'end', iid=name, text=name, values=(
+                stats.count, '%.1f' % (stats.total * 1000),
+                '%.2f' % (stats.total / stats.count * 1000),
+                '%.1f' % (stats.max * 1000)))
+
+        if _enabled:
+            self._label['text'] = ""
+        else:
+            self._label['text'] = ("Monitoring is off, turn it on in "
+                                   "Edit/Settings.")
+        self._draw_histogram()
+
+    def _reset(self):
+        _stats.clear()
+        self.refresh()
+
+    def _draw_histogram(self, junk_event=None):
+        self._canvas.delete('all')
+        selection = self._tree.selection()
+        if not selection or selection[0] not in _stats:
+            self._canvas.create_text(
+                10, 10, anchor='nw',
+                text="Select a row to see a histogram of its durations.")
+            return
+
+        histogram = _stats[selection[0]].histogram
+        labels = ['<%d' % limit for limit in _BUCKET_LIMITS]
+        labels.append('>=%d' % _BUCKET_LIMITS[-1])
+
+        width = max(self._canvas.winfo_width(), 600)
+        height = int(self._canvas['height'])
+        bar_width = width // len(histogram)
+        biggest = max(histogram) or 1
+        for index, (count, label) in enumerate(zip(histogram, labels)):
+            x = index * bar_width
+            bar_height = (height - 40) * count // biggest
+            self._canvas.create_rectangle(
+                x + 5, height - 20 - bar_height, x + bar_width - 5,
+                height - 20, fill='steelblue', outline='')
+            self._canvas.create_text(x + bar_width // 2, height - 10,
+                                     text=label + ' ms')
+            self._canvas.create_text(x + bar_width // 2,
+                                     height - 25 - bar_height,
+                                     anchor='s', text=str(count))
+
+
+_dialog = None
+
+
+def show_dialog():
+    global _dialog
+    if _dialog is None or not _dialog.window.winfo_exists():
+        _dialog = PerformanceDialog()
+        _dialog.window.transient(_run.get_main_window())
+    else:
+        _dialog.refresh()
+        _dialog.window.deiconify()
+
+
+def setup():
+    import actions, settings
+    config = settings.get_section('General')
+    config.add_option('performance_monitor', False)
+    config.add_checkbutton(
+        'performance_monitor', "Measure performance (see Help/Performance)")
+    config.add_option('slow_callback_threshold', 50)
+    config.add_spinbox('slow_callback_threshold', 1, 100000,
+                       "Log callbacks slower than (ms):")
+    config.connect('slow_callback_threshold', _set_threshold)
+    config.connect('performance_monitor', _set_enabled)
+
+    actions.add_command("Help/Performance", show_dialog)
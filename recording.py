@@ -0,0 +1,463 @@
+"""Recording editor sessions and replaying them.
+
+When the record_session setting is on, keystrokes in text widgets,
+actions, opened files, tab switches and find queries are collected and
+written to a JSON file in dirs.cachedir when recording stops or the
+editor quits. The file can be replayed to see how long each step takes:
+
+    python recording.py SESSION.json            # in a new editor window
+    python recording.py --headless SESSION.json
+
+Replaying in a window needs a display, Xvfb works too. The headless
+replay applies the steps to document.Document objects without tkinter,
+so it only measures the document model, and it skips things that the
+model doesn't have, e.g. undo and most keys pressed with Control or Alt.
+
+A recording is a JSON object like this:
+
+    {"version": 1,
+     "steps": [{"type": "open", "time": 0.5, "path": "/tmp/a.txt"},
+               {"type": "key", "time": 1.2, "keysym": "a", "char": "a",
+                "state": 0, "cursor": "1.0", "selection": null},
+               ...]}
+
+The time of a step is in seconds after starting the recording. Other
+step types are "select" (a tab switch, with the index of the tab),
+"action" (with the path of the action and whether it was started with
+a key binding) and "find" (with the text and the options).
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import sys
+import time
+
+import dirs
+
+log = logging.getLogger(__name__)
+
+_VERSION = 1
+_OPEN_TIMEOUT = 60      # seconds
+
+# these actions ask the user something, and their effect is recorded as
+# other steps, e.g. File/Open as "open" steps
+_NOT_RECORDED_ACTIONS = {'File/Open', 'File/Save As...', 'File/Quit',
+                         'Edit/Go to Line', 'Edit/Settings'}
+
+# the bindtag of text widgets that runs before tk's own key bindings
+_BINDTAG = 'SessionRecorder'
+
+# modifier bits of the state of a key event
+_CONTROL = 0x4
+_ALT = 0x8
+
+_steps = None               # a list while recording, None otherwise
+_start_time = None
+_in_key_event = False
+
+
+def is_recording():
+    return _steps is not None
+
+
+def record(step_type, **info):
+    # Add a step to the recording if recording is on.
+    if _steps is not None:
+        info['type'] = step_type
+        info['time'] = round(time.perf_counter() - _start_time, 6)
+        _steps.append(info)
+
+
+def wrap_action(path, callback):
+    # actions.py calls this for every command action
+    if path in _NOT_RECORDED_ACTIONS:
+        return callback
+
+    def wrapper(*args, **kwargs):
+        record('action', path=path, by_key=_in_key_event)
+        return callback(*args, **kwargs)
+    return wrapper
+
+
+def start():
+    # Start recording. This discards steps recorded before.
+    global _steps, _start_time
+    _steps = []
+    _start_time = time.perf_counter()
+
+
+def stop():
+    # Stop recording and write the steps to a file. Returns the path of
+    # the file or None if there was nothing to write.
+    global _steps
+    steps = _steps
+    _steps = None
+    if not steps:
+        return None
+
+    recording_dir = os.path.join(dirs.cachedir, 'recordings')
+    path = os.path.join(recording_dir,
+                        time.strftime('session-%Y%m%d-%H%M%S.json'))
+    try:
+        os.makedirs(recording_dir, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'version': _VERSION, 'steps': steps}, file, indent=1)
+    except OSError:
+        log.exception("writing the recording to '%s' failed", path)
+        return None
+
+    log.info("recorded %d steps to '%s'", len(steps), path)
+    return path
+
+
+def _set_recording(enabled):
+    if enabled and not is_recording():
+        start()
+    elif not enabled and is_recording():
+        stop()
+
+
+def _end_key_event():
+    global _in_key_event
+    _in_key_event = False
+
+
+def _on_key(event):
+    global _in_key_event
+    if _steps is None:
+        return
+    widget = event.widget
+    selection = widget.tag_ranges('sel')
+    record('key', keysym=event.keysym, char=event.char, state=event.state,
+           cursor=widget.index('insert'),
+           selection=list(map(str, selection)) if selection else None)
+
+    # actions started by this key are replayed by replaying the key, and
+    # they run before tk gets back to idle callbacks
+    _in_key_event = True
+    widget.after_idle(_end_key_event)
+
+
+def _on_focus_in(event):
+    import textwidget
+    widget = event.widget
+    if isinstance(widget, textwidget.Text):
+        tags = widget.bindtags()
+        if tags[0] != _BINDTAG:
+            widget.bindtags((_BINDTAG,) + tags)
+
+
+def _on_tab_changed(tab_manager):
+    tab = tab_manager.select()
+    if tab is not None:
+        record('select', index=tab_manager.tabs().index(tab))
+
+
+def _on_new_tab(event):
+    path = getattr(event.data, 'path', None)
+    if path is not None:
+        record('open', path=path)
+
+
+# replaying in an editor window
+class _GuiReplayer:
+
+    def __init__(self, root, tab_manager):
+        self._root = root
+        self._tab_manager = tab_manager
+
+    def run_step(self, step):
+        # Return False if the step was skipped.
+        method = getattr(self, '_' + step['type'])
+        result = method(step)
+        # idle callbacks, e.g. utils.schedule_update(), are a part of the
+        # step
+        self._root.update()
+        return result is not False
+
+    def _open(self, step):
+        self._tab_manager.open_files([step['path']])
+        # open_files() reads the file in another thread
+        deadline = time.perf_counter() + _OPEN_TIMEOUT
+        while not any(getattr(tab, 'path', None) == step['path']
+                      for tab in self._tab_manager.tabs()):
+            if time.perf_counter() > deadline:
+                log.warning("opening '%s' took too long", step['path'])
+                return False
+            self._root.update()
+            time.sleep(0.001)
+        return None
+
+    def _select(self, step):
+        tabs = self._tab_manager.tabs()
+        if step['index'] >= len(tabs):
+            return False
+        self._tab_manager.select(tabs[step['index']])
+        return None
+
+    def _action(self, step):
+        import actions
+        if step['by_key']:
+            # the key step before this ran the action already
+            return False
+        action = actions.get_action(step['path'])
+        if not action.enabled:
+            return False
+        action.callback()
+        return None
+
+    def _key(self, step):
+        import tabs
+        tab = self._tab_manager.select()
+        if not isinstance(tab, tabs.FileTab):
+            return False
+        tab.wake_up()
+        if tab.is_hibernating():
+            # wake_up() failed and showed an error
+            return False
+        widget = tab.textwidget
+        widget.focus_force()
+        widget.mark_set('insert', step['cursor'])
+        widget.tag_remove('sel', '1.0', 'end')
+        if step['selection']:
+            widget.tag_add('sel', *step['selection'])
+        widget.event_generate('<KeyPress>', keysym=step['keysym'],
+                              state=step['state'])
+        return None
+
+    def _find(self, step):
+        import find, tabs
+        tab = self._tab_manager.select()
+        if not isinstance(tab, tabs.FileTab):
+            return False
+        finder = find.finders.get(tab)
+        if finder is None or finder._textwidget is not tab.textwidget:
+            find.find()
+            finder = find.finders[tab]
+        finder.full_words_var.set(step['full_words'])
+        finder.ignore_case_var.set(step['ignore_case'])
+        finder.find_entry.delete(0, 'end')
+        finder.find_entry.insert(0, step['text'])
+        return None
+
+
+# replaying with document.Document objects only
+class _HeadlessReplayer:
+
+    def __init__(self, encoding):
+        self._encoding = encoding
+        self._documents = []
+        self._selected = None
+
+    def run_step(self, step):
+        method = getattr(self, '_' + step['type'])
+        return method(step) is not False
+
+    def _open(self, step):
+        import document
+        with open(step['path'], 'r', encoding=self._encoding) as file:
+            self._documents.append(document.Document(file.read()))
+        self._selected = len(self._documents) - 1
+
+    def _select(self, step):
+        if step['index'] >= len(self._documents):
+            return False
+        self._selected = step['index']
+        return None
+
+    def _action(self, step):
+        import document, tokenizer
+        path = step['path']
+        if path == 'File/New File':
+            self._documents.append(document.Document())
+            self._selected = len(self._documents) - 1
+            return None
+        if self._selected is None:
+            return False
+
+        doc = self._documents[self._selected]
+        if path == 'File/Close':
+            del self._documents[self._selected]
+            self._selected = (min(self._selected, len(self._documents) - 1)
+                              if self._documents else None)
+        elif path == 'File/Save':
+            # the recorded files must not be overwritten
+            with open(os.devnull, 'w', encoding=self._encoding) as file:
+                for chunk in doc.iter_chunks():
+                    file.write(chunk)
+        elif path == 'Edit/Tokenize':
+            words = tokenizer.tokenize(doc.iter_chunks())
+            self._documents.append(document.Document(
+                ''.join(word + '\n' for word in words)))
+            self._selected = len(self._documents) - 1
+        elif path == 'Edit/Statistics':
+            tokens = tokenizer.TokenSequence.from_chunks(doc.iter_chunks())
+            tokens.most_common()
+        else:
+            return False
+        return None
+
+    def _key(self, step):
+        if self._selected is None or step['state'] & (_CONTROL | _ALT):
+            return False
+        doc = self._documents[self._selected]
+        keysym = step['keysym']
+        if keysym == 'Return':
+            text = '\n'
+        elif keysym == 'Tab':
+            text = '\t'
+        elif step['char'] and step['char'].isprintable():
+            text = step['char']
+        elif keysym in {'BackSpace', 'Delete'}:
+            text = None
+        else:
+            # moving the cursor, the next key step knows where it is
+            return False
+
+        if step['selection']:
+            doc.delete(*step['selection'])
+            cursor = step['selection'][0]
+        else:
+            cursor = step['cursor']
+            line, column = doc.parse_index(cursor)
+            if keysym == 'BackSpace':
+                if column > 0:
+                    doc.delete((line, column - 1), (line, column))
+                elif line > 1:
+                    doc.delete('%d.end' % (line - 1), (line, 0))
+            elif keysym == 'Delete':
+                if column < len(doc.get_line(line)):
+                    doc.delete((line, column), (line, column + 1))
+                elif line < doc.line_count():
+                    doc.delete((line, column), (line + 1, 0))
+        if text is not None:
+            doc.insert(cursor, text)
+        return None
+
+    def _find(self, step):
+        if self._selected is None or not step['text']:
+            return False
+        self._documents[self._selected].find_all(
+            step['text'], full_words=step['full_words'],
+            ignore_case=step['ignore_case'])
+        return None
+
+
+def replay(steps, replayer, verbose=False):
+    # Run the steps and return a list of (step, seconds) pairs, seconds is
+    # None for skipped steps.
+    results = []
+    for number, step in enumerate(steps, start=1):
+        start = time.perf_counter()
+        ran = replayer.run_step(step)
+        seconds = time.perf_counter() - start
+        results.append((step, seconds if ran else None))
+        if verbose:
+            print("%5d  %-8s %10s  %s" % (
+                number, step['type'],
+                "%.2f ms" % (seconds * 1000) if ran else "skipped",
+                step.get('path') or step.get('keysym') or
+                step.get('text') or step.get('index', '')))
+    return results
+
+
+def _print_summary(results):
+    by_type = collections.defaultdict(list)
+    skipped = 0
+    for step, seconds in results:
+        if seconds is None:
+            skipped += 1
+        else:
+            by_type[step['type']].append(seconds * 1000)
+
+    print("%-8s %6s %10s %10s %10s" % ("step", "count", "mean ms",
+                                       "95% ms", "max ms"))
+    for step_type, times in sorted(by_type.items()):
+        times.sort()
+        print("%-8s %6d %10.2f %10.2f %10.2f" % (
+            step_type, len(times), sum(times) / len(times),
+            times[int(0.95 * (len(times) - 1))], times[-1]))
+    if skipped:
+        print("%d steps were skipped" % skipped)
+
+
+def _replay_in_window(steps, verbose):
+    import _run, main
+    _run.init()
+    main.setup_plugins()
+    root = _run.get_main_window()
+    root.update()
+    replayer = _GuiReplayer(root, _run.get_tab_manager())
+    try:
+        return replay(steps, replayer, verbose)
+    finally:
+        root.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded editor session.")
+    parser.add_argument('recording', help="a JSON file from record_session")
+    parser.add_argument('--headless', action='store_true',
+                        help="replay with the document model only")
+    parser.add_argument('--encoding', default='utf-8',
+                        help="encoding of opened files in headless mode")
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help="print the time of every step")
+    parser.add_argument('--output', metavar='FILE',
+                        help="write the time of every step to a JSON file")
+    parser.add_argument('--fail-above', type=float, metavar='MS',
+                        help="exit with status 1 if a step takes longer")
+    args = parser.parse_args()
+
+    with open(args.recording, 'r') as file:
+        recording = json.load(file)
+    if recording.get('version') != _VERSION:
+        parser.error("unsupported recording version: %r"
+                     % recording.get('version'))
+
+    if args.headless:
+        results = replay(recording['steps'], _HeadlessReplayer(args.encoding),
+                         args.verbose)
+    else:
+        results = _replay_in_window(recording['steps'], args.verbose)
+    _print_summary(results)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump([dict(step, replay_ms=(None if seconds is None
+                                             else seconds * 1000))
+                       for step, seconds in results], file, indent=1)
+
+    if args.fail_above is not None:
+        slow = [step for step, seconds in results
+                if seconds is not None and seconds * 1000 > args.fail_above]
+        if slow:
+            print("%d steps took longer than %g ms"
+                  % (len(slow), args.fail_above), file=sys.stderr)
+            sys.exit(1)
+
+
+def setup():
+    import _run, events, settings
+    config = settings.get_section('General')
+    config.add_option('record_session', False)
+    config.add_checkbutton(
+        'record_session', "Record the session for replaying to " +
+        os.path.join(dirs.cachedir, 'recordings'))
+    config.connect('record_session', _set_recording)
+
+    root = _run.get_main_window()
+    tab_manager = _run.get_tab_manager()
+    root.bind_class(_BINDTAG, '<KeyPress>', _on_key)
+    root.bind_all('<FocusIn>', _on_focus_in, add=True)
+    tab_manager.bind('<<NotebookTabChanged>>',
+                     (lambda event: _on_tab_changed(tab_manager)), add=True)
+    events.bind(tab_manager, '<<NewTab>>', _on_new_tab)
+    root.bind('<<SimpleEditorQuit>>', (lambda event: stop()), add=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Saving the open files when the editor quits and opening them again.
+
+The session is saved to session.json in dirs.cachedir. Restoring it
+doesn't read any files: the tabs are created with FileTab.open_lazily(),
+and a tab reads its file when it's selected the first time. Files that
+don't exist anymore are left out.
+"""
+import json
+import logging
+import os
+import re
+import time
+
+import dirs
+import tracing
+
+log = logging.getLogger(__name__)
+
+_VERSION = 1
+
+
+def _get_path():
+    return os.path.join(dirs.cachedir, 'session.json')
+
+
+def save(tab_manager):
+    import tabs
+    tab_infos = []
+    selected = None
+    for tab in tab_manager.tabs():
+        if isinstance(tab, tabs.FileTab) and tab.path is not None:
+            cursor, yview = tab.get_view_state()
+            tab_infos.append({'type': 'file', 'path': tab.path,
+                              'cursor': cursor, 'yview': yview})
+        elif isinstance(tab, tabs.BigFileTab):
+            tab_infos.append({'type': 'big', 'path': tab.path})
+        else:
+            # new files and token tabs can't be restored
+            continue
+        if tab is tab_manager.select():
+            selected = len(tab_infos) - 1
+
+    path = _get_path()
+    try:
+        os.makedirs(dirs.cachedir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'version': _VERSION, 'tabs': tab_infos,
+                       'selected': selected}, file)
+    except OSError:
+        log.exception("saving the session to '%s' failed", path)
+
+
+def _parse(session):
+    # Return a list of (type, path, cursor, yview) tuples and the index of
+    # the selected tab or None. Raises KeyError, TypeError or ValueError
+    # if session isn't what save() writes.
+    if session['version'] != _VERSION:
+        raise ValueError("unknown session version %r" % session['version'])
+    tab_infos = []
+    for info in session['tabs']:
+        path = info['path']
+        if not isinstance(path, str):
+            raise TypeError("bad path %r" % (path,))
+        if info['type'] == 'big':
+            tab_infos.append(('big', path, None, None))
+        elif info['type'] == 'file':
+            cursor = info['cursor']
+            if not (isinstance(cursor, str) and
+                    re.fullmatch(r'\d+\.\d+', cursor)):
+                raise ValueError("bad cursor %r" % (cursor,))
+            tab_infos.append(('file', path, cursor, float(info['yview'])))
+        else:
+            raise ValueError("unknown tab type %r" % (info['type'],))
+
+    selected = session['selected']
+    if selected is not None and type(selected) is not int:
+        raise TypeError("bad selected tab %r" % (selected,))
+    return (tab_infos, selected)
+
+
+@tracing.traced('restore session')
+def restore(tab_manager):
+    import tabs
+    try:
+        with open(_get_path(), 'r', encoding='utf-8') as file:
+            session = json.load(file)
+        tab_infos, selected_index = _parse(session)
+    except FileNotFoundError:
+        return
+    except (OSError, KeyError, TypeError, ValueError):
+        # a broken session must not prevent starting the editor
+        log.exception("reading the session failed")
+        return
+
+    start = time.perf_counter()
+    new_tabs = []
+    selected = None
+    for index, (tab_type, path, cursor, yview) in enumerate(tab_infos):
+        if not os.path.isfile(path):
+            continue
+        try:
+            if tab_type == 'big':
+                tab = tabs.BigFileTab(tab_manager, path)
+            else:
+                tab = tabs.FileTab.open_lazily(tab_manager, path, cursor,
+                                               yview)
+        except OSError:
+            log.exception("restoring '%s' failed", path)
+            continue
+        if index == selected_index:
+            selected = tab
+        new_tabs.append(tab)
+
+    tab_manager.add_tabs(new_tabs, select=False)
+    if selected is not None:
+        # only this tab reads its file now
+        tab_manager.select(selected)
+    log.info("restored %d tabs in %.3f seconds", len(new_tabs),
+             time.perf_counter() - start)
+
+
+def setup():
+    import _run, settings
+    config = settings.get_section('General')
+    config.add_option('restore_session', True)
+    config.add_checkbutton('restore_session',
+                           "Open the files of the previous session on startup")
+
+    tab_manager = _run.get_tab_manager()
+    _run.get_main_window().bind(
+        '<<SimpleEditorQuit>>', (lambda event: save(tab_manager)), add=True)
+    if config['restore_session']:
+        restore(tab_manager)
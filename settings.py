@@ -322,6 +322,36 @@ def _init():
     general.add_entry('encoding', "Encoding of opened and saved files:")
     general.connect('encoding', _validate_encoding)
 
+    # see TabManager.hibernate_inactive_tabs()
+    general.add_option('hibernate_after', 60)
+    general.add_spinbox('hibernate_after', 1, 100000,
+                        "Hibernate tabs that aren't used for (minutes):")
+    general.add_option('tab_memory_limit', 1024)
+    general.add_spinbox('tab_memory_limit', 10, 1000000,
+                        "Memory limit of all tabs (MB):")
+
+    # see textwidget.UndoJournal
+    general.add_option('undo_memory_limit_per_tab', 64)
+    general.add_spinbox('undo_memory_limit_per_tab', 1, 1000000,
+                        "Undo history limit of one tab (MB):")
+    general.add_option('undo_memory_limit', 256)
+    general.add_spinbox('undo_memory_limit', 1, 1000000,
+                        "Undo history limit of all tabs (MB):")
+
+    # see statscache
+    general.add_option('stats_cache_size', 1024)
+    general.add_spinbox('stats_cache_size', 0, 1000000,
+                        "Disk space for cached statistics (MB):")
+
+    # see sketch and _get_approximate_statistics() in _run.py
+    general.add_option('approximate_statistics', False)
+    general.add_checkbutton(
+        'approximate_statistics',
+        "Approximate statistics in fixed memory (for huge files)")
+    general.add_option('approximate_error', 100)
+    general.add_spinbox('approximate_error', 1, 100000,
+                        "Max error of approximate counts (per million):")
+
 def show_dialog():
     # Show the settings dialog.
     _init()
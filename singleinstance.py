@@ -0,0 +1,226 @@
+"""Opening files in an editor that is already running.
+
+The first editor process listens on a Unix domain socket in
+dirs.cachedir. When main.py starts and something is listening on the
+socket, it sends its file arguments there and exits without creating a
+tkinter window, and the running editor opens the files. Files can be
+given as PATH or PATH:LINE, e.g. 'python main.py notes.txt:12'.
+
+The message is one JSON object, the client closes its end after sending
+it and waits for b'ok' from the editor:
+
+    {"files": [["/absolute/path.txt", 12], ["/other/file.txt", null]]}
+
+This module doesn't import tkinter, so forwarding is fast. Platforms
+without Unix domain sockets always start a new editor.
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+
+import dirs
+
+log = logging.getLogger(__name__)
+
+_TIMEOUT = 2                # seconds
+_POLL_INTERVAL = 100        # milliseconds
+
+_server = None              # a socket while listening
+# (path, lineno) pairs waiting to be opened by the tkinter thread
+_requests = queue.Queue()
+
+
+def _get_socket_path():
+    return os.path.join(dirs.cachedir, 'editor.sock')
+
+
+def parse_file_args(args):
+    # Convert command line arguments to a list of (absolute path, line
+    # number or None) pairs.
+    result = []
+    for arg in args:
+        path, colon, line = arg.rpartition(':')
+        if colon and line.isdigit() and not os.path.isfile(arg):
+            result.append((os.path.abspath(path), int(line)))
+        else:
+            result.append((os.path.abspath(arg), None))
+    return result
+
+
+def _connect():
+    # Return a socket connected to a running editor, or None.
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(_TIMEOUT)
+    try:
+        client.connect(_get_socket_path())
+    except OSError:
+        client.close()
+        return None
+    return client
+
+
+def forward(files):
+    # Send (path, lineno) pairs to a running editor. Returns True if an
+    # editor is running and received them.
+    client = _connect()
+    if client is None:
+        return False
+    try:
+        with client:
+            client.sendall(json.dumps({'files': files}).encode('utf-8'))
+            client.shutdown(socket.SHUT_WR)
+            return client.recv(2) == b'ok'
+    except OSError:
+        log.exception("sending files to the running editor failed")
+        return False
+
+
+def _receive(connection):
+    with connection:
+        connection.settimeout(_TIMEOUT)
+        data = b''
+        while True:
+            piece = connection.recv(65536)
+            if not piece:
+                break
+            data += piece
+        files = json.loads(data.decode('utf-8'))['files']
+        for path, lineno in files:
+            _requests.put((path, lineno))
+        # an empty request means "show the editor"
+        _requests.put(None)
+        connection.sendall(b'ok')
+
+
+def _serve(server):
+    while True:
+        try:
+            connection, junk = server.accept()
+        except OSError:
+            # the socket was closed, the editor is quitting
+            break
+        try:
+            _receive(connection)
+        except (OSError, ValueError, KeyError, TypeError):
+            log.exception("receiving files from another editor failed")
+
+
+def _start_server():
+    global _server
+    if not hasattr(socket, 'AF_UNIX'):
+        return
+    path = _get_socket_path()
+    client = _connect()
+    if client is not None:
+        # another editor started at the same time and listens already
+        client.close()
+        return
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        os.makedirs(dirs.cachedir, exist_ok=True)
+        try:
+            # left behind by an editor that crashed
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        server.bind(path)
+        server.listen()
+    except OSError:
+        log.exception("cannot listen on '%s'", path)
+        server.close()
+        return
+
+    _server = server
+    threading.Thread(target=_serve, args=[server], daemon=True).start()
+
+
+def _stop_server():
+    global _server
+    if _server is not None:
+        _server.close()
+        _server = None
+        try:
+            os.remove(_get_socket_path())
+        except OSError:
+            pass
+
+
+def _find_tab(tab_manager, path):
+    for tab in tab_manager.tabs():
+        tab_path = getattr(tab, 'path', None)
+        if tab_path is not None and os.path.normcase(
+                os.path.abspath(tab_path)) == os.path.normcase(path):
+            return tab
+    return None
+
+
+def open_files(tab_manager, files):
+    # Open (path, lineno) pairs in the editor, lineno can be None.
+    paths = []
+    linenos = {}
+    for path, lineno in files:
+        tab = _find_tab(tab_manager, path)
+        if tab is None:
+            paths.append(path)
+            if lineno is not None:
+                linenos[path] = lineno
+        else:
+            tab_manager.select(tab)
+            if lineno is not None:
+                tab.goto_line(lineno)
+    # this calls TabManager.add_tabs() when the files have been read, and
+    # it can also find an open tab of the same file, e.g. via a symlink
+    tab_manager.open_files(paths, callback=functools.partial(
+        _go_to_lines, linenos))
+
+
+def _go_to_lines(linenos, opened):
+    for path, tab in opened:
+        if path in linenos:
+            tab.goto_line(linenos[path])
+
+
+def _poll(root, tab_manager):
+    files = []
+    show = False
+    while True:
+        try:
+            request = _requests.get_nowait()
+        except queue.Empty:
+            break
+        if request is None:
+            show = True
+        else:
+            files.append(request)
+
+    if files:
+        open_files(tab_manager, files)
+    if show:
+        root.deiconify()
+        root.lift()
+        root.focus_force()
+    root.after(_POLL_INTERVAL, _poll, root, tab_manager)
+
+
+def setup(files, listen=True):
+    # Open the files given on the command line, and the files that other
+    # editor processes send if listen is True.
+    import _run
+    root = _run.get_main_window()
+    tab_manager = _run.get_tab_manager()
+    if files:
+        open_files(tab_manager, files)
+
+    if listen:
+        _start_server()
+        if _server is not None:
+            root.bind('<<SimpleEditorQuit>>', (lambda event: _stop_server()),
+                      add=True)
+            _poll(root, tab_manager)
@@ -0,0 +1,169 @@
+"""Approximate word counts in a fixed amount of memory.
+
+Counting words exactly needs memory for every different word, and that
+is too much for texts full of ids and hashes. ApproximateCounter
+combines two structures whose size depends only on the allowed error:
+
+  * A Count-Min sketch estimates the count of any word. The estimate is
+    never too small, and with probability 1 - delta it's at most
+    epsilon * total too big.
+  * Space-Saving keeps ceil(1 / epsilon) candidates for the most common
+    words. Every word that appears more than epsilon * total times is
+    guaranteed to be a candidate, and a candidate's count is at most
+    total / capacity too big.
+
+The sketch hashes words with hash(), which is randomized for each
+process, so the sketches can't be saved to disk or combined between
+processes. This module doesn't use tkinter.
+"""
+import collections
+import heapq
+import math
+import random
+
+import numpy
+
+import tokenizer
+
+Estimate = collections.namedtuple('Estimate', ['word', 'count', 'minimum'])
+
+
+class CountMinSketch:
+
+    def __init__(self, epsilon, delta):
+        # the width is rounded up to a power of two, so that the hash can
+        # be reduced to a column with a shift instead of a division
+        width = 2 ** max(1, math.ceil(math.log2(math.e / epsilon)))
+        depth = max(1, math.ceil(math.log(1 / delta)))
+        self.epsilon = math.e / width
+        self.delta = math.exp(-depth)
+        self._shift = numpy.uint64(64 - int(math.log2(width)))
+        self._table = numpy.zeros((depth, width), dtype=numpy.uint64)
+
+        # multiply-add-shift hashing, the multipliers must be odd
+        randomizer = random.Random(0)
+        self._multipliers = [numpy.uint64(randomizer.getrandbits(64) | 1)
+                             for row in range(depth)]
+        self._increments = [numpy.uint64(randomizer.getrandbits(64))
+                            for row in range(depth)]
+
+    @property
+    def nbytes(self):
+        return self._table.nbytes
+
+    def _get_columns(self, words):
+        hashes = numpy.fromiter(map(hash, words), dtype=numpy.int64,
+                                count=len(words)).view(numpy.uint64)
+        with numpy.errstate(over='ignore'):
+            for a, b in zip(self._multipliers, self._increments):
+                yield (hashes * a + b) >> self._shift
+
+    def add(self, words, counts):
+        # Add counts[i] to the count of words[i] for each i. The words
+        # don't need to be different.
+        counts = numpy.asarray(counts, dtype=numpy.uint64)
+        for row, columns in zip(self._table, self._get_columns(words)):
+            numpy.add.at(row, columns, counts)
+
+    def estimate(self, words):
+        # Return a numpy array of the estimated counts of words.
+        result = None
+        for row, columns in zip(self._table, self._get_columns(words)):
+            result = row[columns] if result is None else numpy.minimum(
+                result, row[columns])
+        return result
+
+
+class SpaceSaving:
+    # The weighted version of the Space-Saving algorithm from "Efficient
+    # Computation of Frequent and Top-k Elements in Data Streams" by
+    # Metwally, Agrawal and El Abbadi.
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._counts = {}       # {word: count}
+        self._errors = {}       # {word: how much count may be too big}
+        # (count, word) pairs, and pairs whose count has changed since
+        # they were added are skipped when popping
+        self._heap = []
+
+    def add(self, word, count=1):
+        counts = self._counts
+        if word in counts:
+            counts[word] += count
+        elif len(counts) < self.capacity:
+            counts[word] = count
+            self._errors[word] = 0
+        else:
+            # the least common candidate is replaced, and the new word
+            # may have appeared as many times as that candidate did
+            heap = self._heap
+            while counts.get(heap[0][1]) != heap[0][0]:
+                heapq.heappop(heap)
+            minimum, old_word = heapq.heappop(heap)
+            del counts[old_word]
+            del self._errors[old_word]
+            counts[word] = minimum + count
+            self._errors[word] = minimum
+
+        heapq.heappush(self._heap, (counts[word], word))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, word) for word, count in counts.items()]
+            heapq.heapify(self._heap)
+
+    def items(self):
+        # Yield (word, count, error) triples in no particular order.
+        for word, count in self._counts.items():
+            yield (word, count, self._errors[word])
+
+
+class ApproximateCounter:
+
+    def __init__(self, epsilon, delta=0.01):
+        self.total = 0
+        self.sketch = CountMinSketch(epsilon, delta)
+        self.heavy_hitters = SpaceSaving(math.ceil(1 / epsilon))
+
+    def add_chunks(self, chunks):
+        # Count the words in an iterable of strings, see
+        # tokenizer.tokenize(). Only one chunk is in memory at a time.
+        for chunk in chunks:
+            chunk_counts = collections.Counter(tokenizer.iter_words(chunk))
+            if not chunk_counts:
+                continue
+            words = list(chunk_counts)
+            counts = list(chunk_counts.values())
+            self.total += sum(counts)
+            self.sketch.add(words, counts)
+            for word, count in zip(words, counts):
+                self.heavy_hitters.add(word, count)
+
+    @property
+    def max_error(self):
+        # No count is too big by more than this.
+        return self.total // self.heavy_hitters.capacity
+
+    @property
+    def likely_max_error(self):
+        # With probability 1 - self.sketch.delta, no count is too big by
+        # more than this.
+        return math.floor(self.sketch.epsilon * self.total)
+
+    @property
+    def nbytes(self):
+        # a rough estimate, about 100 bytes for each candidate word
+        return self.sketch.nbytes + 100 * self.heavy_hitters.capacity
+
+    def most_common(self):
+        # Return a list of Estimate tuples, the most common words first.
+        # The count is never too small, and minimum is never too big.
+        items = list(self.heavy_hitters.items())
+        if not items:
+            return []
+        sketch_counts = self.sketch.estimate([word for word, c, e in items])
+        result = [
+            Estimate(word, min(count, sketch_count), count - error)
+            for (word, count, error), sketch_count
+            in zip(items, sketch_counts.tolist())]
+        result.sort(key=lambda estimate: (-estimate.count, estimate.word))
+        return result
@@ -0,0 +1,140 @@
+"""A cache of tokenizing results in dirs.cachedir.
+
+Tokenizing a big file takes a long time, so the words and word counts
+are saved to a binary file named by a hash of the text and the
+tokenizer configuration. The files use this format, with all integers
+in little-endian byte order:
+
+    header:       _MAGIC, then uint32 _VERSION, then uint64 vocabulary
+                  size, token count and vocabulary byte count
+    counts:       a uint64 for each word in the vocabulary
+    ids:          a uint32 for each token, indexes of the vocabulary
+    vocabulary:   UTF-8 words separated by b'\\n', in the order that
+                  they first appear in the text
+
+The files are removed in least recently used order when they use more
+than a given amount of disk space. This module doesn't use tkinter.
+"""
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+
+import numpy
+
+import dirs
+import tokenizer
+
+log = logging.getLogger(__name__)
+
+_MAGIC = b'SEWC'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQQQ')
+
+
+def _get_cache_dir():
+    return os.path.join(dirs.cachedir, 'stats')
+
+
+def get_key(chunks):
+    # Return a cache key for the text in an iterable of strings.
+    result = hashlib.blake2b(tokenizer.CONFIG.encode('utf-8'),
+                             digest_size=20)
+    for chunk in chunks:
+        result.update(chunk.encode('utf-8', errors='surrogatepass'))
+    return result.hexdigest()
+
+
+def load(key):
+    # Return a tokenizer.TokenSequence or None if the key isn't in the cache.
+    path = os.path.join(_get_cache_dir(), key + '.bin')
+    try:
+        with open(path, 'rb') as file:
+            magic, version, vocab_size, token_count, vocab_bytes = (
+                _HEADER.unpack(file.read(_HEADER.size)))
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError("unknown file format")
+            counts = numpy.fromfile(file, dtype='<u8', count=vocab_size)
+            ids = numpy.fromfile(file, dtype='<u4', count=token_count)
+            vocabulary = file.read(vocab_bytes).decode(
+                'utf-8', errors='surrogatepass').split('\n')
+        if vocab_size == 0:
+            # ''.split('\n') is [''], not []
+            vocabulary = []
+        if (len(counts) != vocab_size or len(ids) != token_count or
+                len(vocabulary) != vocab_size):
+            raise ValueError("the file is truncated")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error):
+        log.exception("reading '%s' failed, removing it", path)
+        _remove(path)
+        return None
+
+    # the modification time is the last use time for evicting
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return tokenizer.TokenSequence(vocabulary, ids, counts)
+
+
+def store(key, tokens, max_size):
+    # Add a tokenizer.TokenSequence to the cache and remove old entries
+    # until the cache uses at most max_size bytes.
+    cache_dir = _get_cache_dir()
+    vocab_bytes = '\n'.join(tokens.vocabulary).encode(
+        'utf-8', errors='surrogatepass')
+    temp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # other editor processes must not see half-written files
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+        with open(fd, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, _VERSION, len(tokens.vocabulary),
+                                    len(tokens.ids), len(vocab_bytes)))
+            file.write(tokens.counts().astype('<u8').tobytes())
+            file.write(tokens.ids.astype('<u4').tobytes())
+            file.write(vocab_bytes)
+        os.replace(temp_path, os.path.join(cache_dir, key + '.bin'))
+    except OSError:
+        log.exception("adding to the statistics cache failed")
+        if temp_path is not None:
+            _remove(temp_path)
+        return
+    evict(max_size)
+
+
+def evict(max_size):
+    # Remove least recently used entries until the cache uses at most
+    # max_size bytes.
+    cache_dir = _get_cache_dir()
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return
+
+    files = []
+    for name in names:
+        if name.endswith('.bin'):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for mtime, size, path in files)
+    for mtime, size, path in sorted(files):
+        if total <= max_size:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
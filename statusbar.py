@@ -0,0 +1,47 @@
+"""The status bar at the bottom of the main window."""
+from tkinter import ttk
+
+from _run import get_main_window, get_tab_manager
+import events
+
+
+class StatusBar(ttk.Frame):
+    # Shows the status of the selected tab. Tab.status can contain \t
+    # characters, and each part goes to a separate label.
+
+    def __init__(self, master, tab_manager, **kwargs):
+        super().__init__(master, **kwargs)
+        self._tab_manager = tab_manager
+        self._labels = []
+
+    def set_status(self, status):
+        parts = status.split('\t') if status else []
+        while len(self._labels) < len(parts):
+            # the first part goes to the left, the rest to the right
+            label = ttk.Label(self)
+            label.pack(side=('left' if not self._labels else 'right'),
+                       padx=3)
+            self._labels.append(label)
+
+        for label, text in zip(self._labels, parts):
+            label['text'] = text
+        for label in self._labels[len(parts):]:
+            label['text'] = ''
+
+    def on_new_tab(self, event):
+        event.data.bind('<<StatusChanged>>', self.update_status, add=True)
+
+    def update_status(self, junk_event=None):
+        tab = self._tab_manager.select()
+        self.set_status('' if tab is None else tab.status)
+
+
+def setup():
+    tab_manager = get_tab_manager()
+    statusbar = StatusBar(get_main_window(), tab_manager)
+    statusbar.pack(side='bottom', fill='x', before=tab_manager)
+
+    events.bind(tab_manager, '<<NewTab>>', statusbar.on_new_tab)
+    tab_manager.bind('<<NotebookTabChanged>>', statusbar.update_status,
+                     add=True)
+    statusbar.update_status()
@@ -0,0 +1,277 @@
+"""A table of words that can have millions of rows.
+
+A ttk.Treeview gets slow when it has lots of items, so WordTable puts
+only the rows that fit on the screen into the Treeview and renders them
+again when scrolling, like BigFileTab does with lines. The rows are
+numpy arrays of vocabulary indexes and numbers, e.g. the ids of a
+tokenizer.TokenSequence, and sorting and filtering only create a new
+array of row indexes.
+"""
+import bisect
+import functools
+import tkinter
+from tkinter import ttk
+import tkinter.font as tkfont
+
+import numpy
+
+import utils
+
+
+class WordTable(ttk.Frame):
+    # Row i shows vocabulary[word_ids[i]] and a number from each column.
+    # columns is a list of (heading, numbers) pairs, and the column shows
+    # numbers[i] or i + 1 if numbers is None, e.g. the position of a
+    # token. sort_by can be 'word' or an index of columns.
+
+    def __init__(self, master, vocabulary, word_ids, columns, *,
+                 word_heading="Word", sort_by=None, reverse=False,
+                 **kwargs):
+        super().__init__(master, **kwargs)
+        self._vocabulary = vocabulary
+        self._word_ids = word_ids
+        self._headings = [word_heading] + [heading for heading, numbers
+                                           in columns]
+        self._numbers = [numbers for heading, numbers in columns]
+
+        # these are created when they are needed the first time, see
+        # _get_word_ranks()
+        self._sorted_vocabulary = None
+        self._word_ranks = None
+
+        # indexes of the rows that are shown, in the order that they are
+        # shown, or None for all rows in the original order
+        self._rows = None
+        self._sort_by = None          # None, 'word' or a column index
+        self._reverse = False
+        self._prefix = ''
+
+        self._first = 0             # index of the first visible row
+        self._visible_rows = 1
+
+        filterframe = ttk.Frame(self)
+        filterframe.pack(side='top', fill='x')
+        ttk.Label(filterframe, text="Words starting with:").pack(side='left')
+        self._filter_var = tkinter.StringVar()
+        self._filter_var.trace('w', self._on_filter_changed)
+        entry = ttk.Entry(filterframe, textvariable=self._filter_var)
+        entry.pack(side='left')
+        self._count_label = ttk.Label(filterframe)
+        self._count_label.pack(side='left', padx=5)
+
+        self._tree = ttk.Treeview(
+            self, columns=list(range(len(self._headings))), show='headings',
+            selectmode='browse')
+        for index in range(len(self._headings)):
+            if index > 0:
+                self._tree.column(index, anchor='e')
+            self._tree.heading(index, command=functools.partial(
+                self.sort, 'word' if index == 0 else index - 1,
+                toggle=True))
+        self._tree.pack(side='left', fill='both', expand=True)
+        self._scrollbar = ttk.Scrollbar(self, command=self._on_scrollbar)
+        self._scrollbar.pack(side='left', fill='y')
+
+        self._tree.bind('<Configure>', self._on_configure, add=True)
+        self._tree.bind('<MouseWheel>', self._on_wheel)
+        self._tree.bind('<Button-4>', functools.partial(self._scroll, -3))
+        self._tree.bind('<Button-5>', functools.partial(self._scroll, 3))
+        for sequence, how in [('<Up>', -1), ('<Down>', 1),
+                              ('<Prior>', 'page-up'), ('<Next>', 'page-down'),
+                              ('<Home>', 'start'), ('<End>', 'end')]:
+            self._tree.bind(sequence, functools.partial(self._on_key, how))
+
+        if sort_by is None:
+            self._update_headings()
+            self._render()
+        else:
+            self.sort(sort_by, reverse)
+
+    def focus(self):
+        self._tree.focus_set()
+
+    def get_row_count(self):
+        if self._rows is None:
+            return len(self._word_ids)
+        return len(self._rows)
+
+    # sorting and filtering
+    def _get_word_ranks(self):
+        # word_ranks[i] is the position of vocabulary[i] in the sorted
+        # vocabulary
+        if self._word_ranks is None:
+            order = sorted(range(len(self._vocabulary)),
+                           key=self._vocabulary.__getitem__)
+            self._sorted_vocabulary = [self._vocabulary[i] for i in order]
+            # the smallest possible dtype makes numpy's sorting faster
+            dtype = (numpy.uint16 if len(order) <= 2**16 else numpy.uint32)
+            self._word_ranks = numpy.empty(len(order), dtype=dtype)
+            self._word_ranks[order] = numpy.arange(len(order), dtype=dtype)
+        return self._word_ranks
+
+    def sort(self, column, reverse=False, *, toggle=False):
+        # Sort by 'word' or a column index. With toggle=True, sorting by the
+        # same column again reverses the order.
+        if toggle and column == self._sort_by:
+            reverse = not self._reverse
+        self._sort_by = column
+        self._reverse = reverse
+        self._update_rows()
+        self._update_headings()
+
+    def _update_headings(self):
+        arrow = ' \N{black down-pointing triangle}' if self._reverse else \
+                ' \N{black up-pointing triangle}'
+        sort_index = 0 if self._sort_by == 'word' else (
+            None if self._sort_by is None else self._sort_by + 1)
+        for index, text in enumerate(self._headings):
+            if index == sort_index:
+                text += arrow
+            self._tree.heading(index, text=text)
+
+    def _on_filter_changed(self, *junk):
+        # typing a word quickly would filter for every character
+        utils.schedule_update(self._apply_filter)
+
+    def _apply_filter(self):
+        prefix = self._filter_var.get().lower()
+        if prefix != self._prefix:
+            self._prefix = prefix
+            self._update_rows()
+
+    def _update_rows(self):
+        rows = None
+        if self._prefix:
+            ranks = self._get_word_ranks()
+            # words with the prefix are next to each other in the sorted
+            # vocabulary
+            start = bisect.bisect_left(self._sorted_vocabulary, self._prefix)
+            end = bisect.bisect_left(self._sorted_vocabulary,
+                                     self._prefix + '\U0010ffff')
+            row_ranks = ranks[self._word_ids]
+            rows = numpy.flatnonzero(
+                (row_ranks >= start) & (row_ranks < end))
+
+        keys = None
+        if self._sort_by == 'word':
+            keys = self._get_word_ranks()[
+                self._word_ids if rows is None else self._word_ids[rows]]
+        elif self._sort_by is not None:
+            numbers = self._numbers[self._sort_by]
+            if numbers is not None:
+                keys = numbers if rows is None else numbers[rows]
+
+        if keys is not None:
+            if self._reverse:
+                # reversing the result would also reverse the order of
+                # rows with equal keys
+                keys = -(keys if keys.dtype.kind == 'f' else
+                         keys.astype(numpy.int64))
+            order = numpy.argsort(keys, kind='stable')
+            rows = order if rows is None else rows[order]
+        elif self._sort_by is not None and self._reverse:
+            # the rows are numbered in order, so this only needs reversing
+            if rows is None:
+                rows = numpy.arange(len(self._word_ids))
+            rows = rows[::-1]
+
+        self._rows = rows
+        self._first = 0
+        self._render()
+
+    # rendering
+    def _on_configure(self, event):
+        rowheight = ttk.Style().lookup('Treeview', 'rowheight')
+        if not rowheight:
+            rowheight = tkfont.nametofont('TkDefaultFont').metrics(
+                'linespace') + 2
+        # one row goes to the headings
+        self._visible_rows = max(1, event.height // int(rowheight) - 1)
+        self._render()
+
+    def _render(self):
+        row_count = self.get_row_count()
+        self._first = min(max(0, self._first),
+                          max(0, row_count - self._visible_rows))
+        end = min(self._first + self._visible_rows, row_count)
+        if self._rows is None:
+            indexes = numpy.arange(self._first, end)
+        else:
+            indexes = self._rows[self._first:end]
+
+        columns = [[self._vocabulary[i]
+                    for i in self._word_ids[indexes].tolist()]]
+        for numbers in self._numbers:
+            if numbers is None:
+                columns.append((indexes + 1).tolist())
+            elif numbers.dtype.kind == 'f':
+                columns.append(['%.2f' % number
+                                for number in numbers[indexes].tolist()])
+            else:
+                columns.append(numbers[indexes].tolist())
+
+        # keep the focused row at the same place on the screen
+        children = self._tree.get_children()
+        focus = self._tree.focus()
+        focus_index = children.index(focus) if focus in children else None
+
+        self._tree.delete(*children)
+        items = [self._tree.insert('', 'end', values=values)
+                 for values in zip(*columns)]
+        if focus_index is not None and items:
+            item = items[min(focus_index, len(items) - 1)]
+            self._tree.focus(item)
+            self._tree.selection_set(item)
+
+        total = max(row_count, 1)
+        self._scrollbar.set(self._first / total, end / total)
+        if row_count == len(self._word_ids):
+            self._count_label['text'] = "%d rows" % row_count
+        else:
+            self._count_label['text'] = "%d of %d rows" % (
+                row_count, len(self._word_ids))
+
+    # scrolling
+    def _on_scrollbar(self, action, number, what=None):
+        if action == 'moveto':
+            self._first = int(float(number) * self.get_row_count())
+        elif what == 'pages':
+            self._first += int(number) * self._visible_rows
+        else:
+            self._first += int(number)
+        self._render()
+
+    def _scroll(self, rows, junk_event=None):
+        self._first += rows
+        self._render()
+        return 'break'
+
+    def _on_wheel(self, event):
+        return self._scroll(-3 if event.delta > 0 else 3)
+
+    def _on_key(self, how, junk_event):
+        children = self._tree.get_children()
+        if not children:
+            return 'break'
+        focus = self._tree.focus()
+        index = children.index(focus) if focus in children else 0
+
+        if how == 'page-up':
+            self._first -= self._visible_rows
+        elif how == 'page-down':
+            self._first += self._visible_rows
+        elif how == 'start':
+            self._first = 0
+            index = 0
+        elif how == 'end':
+            self._first = self.get_row_count()
+            index = len(children) - 1
+        elif 0 <= index + how < len(children):
+            index += how
+        else:
+            # moving past the first or last visible row scrolls
+            self._first += how
+
+        self._tree.focus(children[index])
+        self._render()
+        return 'break'
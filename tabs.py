@@ -1,13 +1,52 @@
+import codecs
+import collections
+import concurrent.futures
 import functools
+import gzip
 import hashlib
+import io
 import itertools
+import logging
+import mmap
 import os
+import tempfile
+import time
 import tkinter
 from tkinter import ttk, messagebox, filedialog
 import traceback
 import importlib
+import zlib
 
-import images, utils, settings
+import numpy
+
+import dirs, document, events, images, tableview, textwidget, tokenizer, tracing, utils, settings
+
+log = logging.getLogger(__name__)
+
+# open_files() doesn't start more reader threads than this
+_MAX_READER_THREADS = 8
+# how often open_files() checks if the reader threads are done
+_OPEN_POLL_INTERVAL = 10    # milliseconds
+
+# files bigger than this are inserted to the text widget gradually
+_PROGRESSIVE_LOAD_SIZE = 4 * 1024 * 1024    # bytes
+_LOAD_BLOCK_SIZE = 256 * 1024               # bytes
+# how long one piece of gradual loading may block the GUI
+_LOAD_SLICE_TIME = 0.03                     # seconds
+# FileTab.disk_snapshot has this many bytes from the end of the file
+_SNAPSHOT_TAIL_SIZE = 4096                  # bytes
+
+# files bigger than this are opened in a read-only BigFileTab
+_VIEWER_SIZE = 256 * 1024 * 1024            # bytes
+# BigFileTab indexes this much of the file at a time
+_INDEX_BLOCK_SIZE = 64 * 1024 * 1024        # bytes
+# longer lines are cut when BigFileTab displays them
+_MAX_DISPLAYED_LINE = 10000                 # bytes
+
+# how often TabManager looks for tabs to hibernate
+_HIBERNATION_CHECK_INTERVAL = 30 * 1000     # milliseconds
+# rough memory usage of a line in a text widget, excluding the characters
+_TEXT_LINE_OVERHEAD = 100                   # bytes
 
 class TabManager(ttk.Notebook):
 
@@ -28,11 +67,57 @@ class TabManager(ttk.Notebook):
         self.bind('<<NotebookTabChanged>>', self._focus_selected_tab, add=True)
         self.bind('<Button-1>', self._on_click, add=True)
 
+        # tabs() is called a lot, so the tabs are kept in a tuple instead of
+        # asking tk and calling nametowidget() for each tab every time
+        self._tabs = ()
+        self._tab_set = set()       # for checking if a tab is added
+        # {(st_dev, st_ino): tab} for tabs that are saved to some file, this
+        # way add_tab() doesn't need to os.path.samefile() every open tab
+        self._path_registry = {}
+        self._registry_keys = {}    # {tab: (st_dev, st_ino)}
+        # tabs that have a path but the file didn't exist when registering
+        self._unregistered_tabs = set()
+
+        # {tab: time.monotonic() when selected}, least recently used first
+        self._last_selected = collections.OrderedDict()
+        self.after(_HIBERNATION_CHECK_INTERVAL, self._check_hibernation)
+
+    @tracing.traced('tab switch')
     def _focus_selected_tab(self, event):
         tab = self.select()
         if tab is not None:
+            if tab.is_hibernating():
+                tab.wake_up()
+            self._last_selected[tab] = time.monotonic()
+            self._last_selected.move_to_end(tab)
             tab.on_focus()
 
+    def _check_hibernation(self):
+        config = settings.get_section('General')
+        self.hibernate_inactive_tabs(
+            config['hibernate_after'] * 60,
+            config['tab_memory_limit'] * 1024 * 1024)
+        self.after(_HIBERNATION_CHECK_INTERVAL, self._check_hibernation)
+
+    def hibernate_inactive_tabs(self, max_age, memory_limit):
+        # Hibernate tabs that haven't been selected in max_age seconds, and
+        # then more tabs in least recently used order until the tabs use
+        # less than memory_limit bytes. The selected tab isn't hibernated.
+        selected = self.select()
+        memory_usages = {tab: tab.get_memory_usage() for tab in self._tabs
+                         if not tab.is_hibernating()}
+        total = sum(memory_usages.values())
+        too_old = time.monotonic() - max_age
+
+        for tab, last_selected in list(self._last_selected.items()):
+            if last_selected > too_old and total <= memory_limit:
+                # all other tabs have been selected more recently
+                break
+            if tab is selected or tab not in memory_usages:
+                continue
+            if tab.hibernate():
+                total -= memory_usages[tab]
+
     def _on_click(self, event):
         if self.identify(event.x, event.y) != 'label':
             # something else than the top label was clicked
@@ -76,31 +161,201 @@ class TabManager(ttk.Notebook):
 
     def tabs(self):
         # return a tuple of tabs in the tab manager.
-        return tuple(self.nametowidget(str(tab)) for tab in super().tabs())
+        return self._tabs
+
+    @staticmethod
+    def _get_registry_key(tab):
+        # tabs are equivalent when they are saved to the same file, and
+        # (st_dev, st_ino) identifies the file like os.path.samefile() does
+        path = getattr(tab, 'path', None)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # e.g. save_as() sets the path before the file is created
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def _register_tab(self, tab):
+        key = self._get_registry_key(tab)
+        if key is None:
+            if getattr(tab, 'path', None) is not None:
+                self._unregistered_tabs.add(tab)
+        elif key not in self._path_registry:
+            self._path_registry[key] = tab
+            self._registry_keys[tab] = key
+
+    def _unregister_tab(self, tab):
+        self._unregistered_tabs.discard(tab)
+        key = self._registry_keys.pop(tab, None)
+        if key is not None and self._path_registry.get(key) is tab:
+            del self._path_registry[key]
+
+    def _on_path_changed(self, tab, junk_event=None):
+        self._unregister_tab(tab)
+        self._register_tab(tab)
+
+    def update_file_key(self, tab):
+        # Call this when the file of a tab is replaced by another file with
+        # the same path, e.g. when a program saves by renaming a new file
+        # over the old one. Otherwise opening the path again would add
+        # another tab for the same file.
+        self._on_path_changed(tab)
+
+    def _find_equivalent_tab(self, tab):
+        key = self._get_registry_key(tab)
+        if key is None:
+            return None
+
+        existing_tab = self._path_registry.get(key)
+        if existing_tab is None and self._unregistered_tabs:
+            # a tab whose file didn't exist when it was registered may
+            # have been saved since then
+            for unregistered in list(self._unregistered_tabs):
+                self._unregister_tab(unregistered)
+                self._register_tab(unregistered)
+            existing_tab = self._path_registry.get(key)
+
+        if existing_tab is None:
+            return None
+        if self._get_registry_key(existing_tab) != key:
+            # the file of existing_tab was deleted or replaced, and the
+            # inode number was reused for the file of the new tab
+            self._on_path_changed(existing_tab)
+            return None
+        # the registry keys are the same, so the tabs are saved to the same
+        # file and os.path.samefile() isn't needed
+        if tab.is_same_kind(existing_tab):
+            return existing_tab
+        return None
 
     def add_tab(self, tab, select=True):
         # append a Tab to this tab manager.
-        assert tab not in self.tabs(), "cannot add the same tab twice"
-        for existing_tab in self.tabs():
-            if tab.equivalent(existing_tab):
-                if select:
-                    self.select(existing_tab)
-                return existing_tab
-
-        self.add(tab, text=tab.title, image=images.get('closebutton'),
-                 compound='right')
-        if select:
-            self.select(tab)
+        return self.add_tabs([tab], select=select)[0]
+
+    def add_tabs(self, new_tabs, select=True):
+        # append many Tabs at once. Returns a list of the added tabs, or the
+        # equivalent existing tabs that were used instead of them. This
+        # generates a <<NewTab>> event with events.generate() for each
+        # added tab.
+        result = []
+        really_added = []
+        for tab in new_tabs:
+            assert tab not in self._tab_set, "cannot add the same tab twice"
+            existing_tab = self._find_equivalent_tab(tab)
+            if existing_tab is not None:
+                # the new tab would never be shown, and it may be e.g.
+                # loading a big file in the background
+                tab.destroy()
+                result.append(existing_tab)
+                continue
+
+            self.add(tab, text=tab.title, image=images.get('closebutton'),
+                     compound='right')
+            self._tabs += (tab,)
+            self._tab_set.add(tab)
+            self._last_selected[tab] = time.monotonic()
+            self._register_tab(tab)
+            tab.bind('<<PathChanged>>',
+                     functools.partial(self._on_path_changed, tab), add=True)
+            result.append(tab)
+            really_added.append(tab)
+
+        if select and result:
+            self.select(result[0])
+
+        # tk's virtual events needed an update() here because they don't
+        # run if the widget isn't visible yet, but these events don't
+        # go through tk at all
+        for tab in really_added:
+            events.generate(self, '<<NewTab>>', tab)
+        return result
+
+    def open_files(self, paths, select=True, callback=None):
+        # Open files as FileTabs without freezing the GUI. The files are
+        # read and decoded concurrently in other threads, the first file
+        # that is ready is added right away and the rest are added with
+        # add_tabs() when all of them have been read. Errors are shown in
+        # one dialog at the end instead of one dialog per file. Then
+        # callback(opened) is called with a list of (path, tab) pairs,
+        # where tab is the new tab or the already open tab of the file.
+        if not paths:
+            if callback is not None:
+                callback([])
+            return
 
-        # the update() is needed in some cases because virtual events
-        # don't run if the widget isn't visible yet
-        self.update()
-        self.event_generate('<<NewTab>>', data=tab)
-        return tab
+        encoding = settings.get_section('General')['encoding']
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(paths), _MAX_READER_THREADS))
+        # the numbers are for adding the tabs in the order of paths
+        pending = [(number, path,
+                    executor.submit(_read_unless_big, path, encoding))
+                   for number, path in enumerate(paths)]
+        executor.shutdown(wait=False)    # the threads exit when they're done
+        self._poll_opened_files(pending, [], [], select, callback, None)
+
+    def _poll_opened_files(self, pending, ready, errors, select, callback,
+                           shown):
+        # ready is a list of (number, path, tab) tuples, and shown is None
+        # or the first of them that was added right away
+        still_pending = []
+        for number, path, future in pending:
+            if not future.done():
+                still_pending.append((number, path, future))
+                continue
+
+            try:
+                result = future.result()
+                if result is None:
+                    # big file, this doesn't take long because the content
+                    # is loaded in the background or not loaded at all
+                    if os.path.getsize(path) >= _VIEWER_SIZE:
+                        tab = BigFileTab(self, path)
+                    else:
+                        tab = FileTab.open_file(self, path)
+                else:
+                    content, snapshot = result
+                    tab = FileTab(self, content, path, disk_snapshot=snapshot)
+            except (UnicodeError, LookupError, OSError) as e:
+                # LookupError comes from a bad encoding setting, and not
+                # catching it would drop the rest of the pending files
+                errors.append((path, e))
+                continue
+
+            if shown is None:
+                # the user gets to see something while other files load
+                shown = (number, path, self.add_tab(tab, select=select))
+            else:
+                ready.append((number, path, tab))
+
+        if still_pending:
+            self.after(_OPEN_POLL_INTERVAL, self._poll_opened_files,
+                       still_pending, ready, errors, select, callback, shown)
+            return
+
+        # the files are read in parallel, so the order of ready depends on
+        # the file sizes and thread scheduling
+        ready.sort(key=lambda item: item[0])
+        # add_tabs() may return an existing tab instead of the new tab
+        added = self.add_tabs([tab for number, path, tab in ready],
+                              select=False)
+        opened = [(path, tab) for (number, path, junk), tab
+                  in zip(ready, added)]
+        if shown is not None:
+            opened.insert(0, shown[1:])
+        if errors:
+            _show_opening_errors(errors)
+        if callback is not None:
+            callback(opened)
 
     def close_tab(self, tab):
         # destroy a tab without calling can_be_closed
         self.forget(tab)
+        self._tabs = tuple(other for other in self._tabs if other is not tab)
+        self._tab_set.discard(tab)
+        self._unregister_tab(tab)
+        self._last_selected.pop(tab, None)
         tab.destroy()
 
     def select_another_tab(self, diff):
@@ -141,12 +396,40 @@ class TabManager(ttk.Notebook):
 
         self.forget(i2)
         self.insert(i1, tab, **options)
+        tab_list = list(self._tabs)
+        tab_list.insert(i1, tab_list.pop(i2))
+        self._tabs = tuple(tab_list)
         if selected:
             self.select(tab)
 
         return True
 
 
+def _read_unless_big(path, encoding):
+    # Return the result of FileTab.read_file(), or None if
+    # FileTab.open_file() should load the file gradually.
+    if os.path.getsize(path) >= _PROGRESSIVE_LOAD_SIZE:
+        return None
+    with tracing.span('read file', path=path):
+        return FileTab.read_file(path, encoding)
+
+
+def _show_opening_errors(errors):
+    # errors is a list of (path, exception) pairs
+    if len(errors) == 1:
+        title = type(errors[0][1]).__name__
+        message = "Opening failed!"
+    else:
+        title = "Errors"
+        message = "Opening %d files failed!" % len(errors)
+
+    details = []
+    for path, error in errors:
+        details.append(path + '\n' + ''.join(traceback.format_exception(
+            type(error), error, error.__traceback__)))
+    utils.errordialog(title, message, '\n'.join(details))
+
+
 class Tab(ttk.Frame):
 
     def __init__(self, manager):
@@ -171,7 +454,13 @@ class Tab(ttk.Frame):
 
     @status.setter
     def status(self, new_status):
-        self._status = new_status
+        # the status is often set many times in a row, and the
+        # <<StatusChanged>> handlers run only once for all of that
+        if new_status != self._status:
+            self._status = new_status
+            utils.schedule_update(self._generate_status_changed)
+
+    def _generate_status_changed(self):
         self.event_generate('<<StatusChanged>>')
 
     @property
@@ -180,9 +469,13 @@ class Tab(ttk.Frame):
 
     @title.setter
     def title(self, text):
-        self._title = text
+        if text != self._title:
+            self._title = text
+            utils.schedule_update(self._show_title)
+
+    def _show_title(self):
         if self in self.master.tabs():
-            self.master.tab(self, text=text)
+            self.master.tab(self, text=self._title)
 
     def can_be_closed(self):
         # This is usually called before the tab is closed. The tab
@@ -193,11 +486,35 @@ class Tab(ttk.Frame):
         """This is called when the tab is selected.
         """
 
-    def equivalent(self, other):
-        """This is explained in TabManager.add_tab
+    def is_same_kind(self, other):
+        """Return True if *other* can be used instead of this tab.
+
+        TabManager.add_tabs() calls this when both tabs are saved to the
+        same file, and then it selects *other* instead of adding this tab.
         """
         return False
 
+    def get_memory_usage(self):
+        """Return a rough estimate of how many bytes the tab uses.
+        """
+        return 0
+
+    def hibernate(self):
+        """Release memory of a tab that isn't being used.
+
+        TabManager calls this for tabs that haven't been selected for a
+        while, and wake_up() before the tab is selected again. Return True
+        if the tab was hibernated.
+        """
+        return False
+
+    def is_hibernating(self):
+        return False
+
+    def wake_up(self):
+        """Undo what hibernate() did.
+        """
+
 class _FileType:
     def __init__(self, name, pattern):
         self.name = name
@@ -210,91 +527,364 @@ def get_filedialog_kwargs():
 
 class FileTab(Tab):
 
-    def __init__(self, manager, content='', path=None):
+    def __init__(self, manager, content='', path=None, *, hibernation=None,
+                 disk_snapshot=None):
         super().__init__(manager)
 
         self._save_hash = None
+        # md5 object, version and length of the document when it was saved,
+        # see mark_saved() and is_saved()
+        self._save_hasher = None
+        self._save_version = None
+        self._save_length = None
+        # (document version, md5 object), see _get_hasher()
+        self._hash_cache = None
+        # None or (stat result, size, tail) from reading the file, see
+        # read_file(). filewatch.py needs to know which version of the file
+        # the content came from, because the file may change after that.
+        self.disk_snapshot = disk_snapshot
+        self._loader = None     # a _ProgressiveLoader or None
 
         self._path = path
         self._filetype = _FileType('Plain Text', '*.txt')
-        self.bind('<<PathChanged>>', self._update_title, add=True)
+        self.bind('<<PathChanged>>', self._schedule_title_update, add=True)
+
+        self._tokens = tokenizer.TokenSequence()
+        # None or a dict with what hibernate() saved, see also open_lazily()
+        self._hibernation = hibernation
+        if hibernation is None:
+            self._create_textwidget(content)
+        else:
+            self.textwidget = self.scrollbar = None
+
+        self.bind('<<PathChanged>>', self._schedule_status_update, add=True)
+        self.bind('<<FiletypeChanged>>', self._schedule_status_update,
+                  add=True)
+
+        self.mark_saved()
+        self._update_title()
+        self._update_status()
+
+    def _create_textwidget(self, content):
+        # versions of the old document mean nothing for the new one
+        self._save_version = None
+        self._hash_cache = None
 
-        self._tokens = []
         # we need to set width and height to 1 to make sure it's never too
         # large for seeing other widgets
-        self.textwidget = tkinter.Text(
-            self, width=1, height=1, wrap='none', undo=True)
+        self.textwidget = textwidget.Text(
+            self, width=1, height=1, wrap='none')
         self.textwidget.pack(side='left', fill='both', expand=True)
-        self.textwidget.bind('<<ContentChanged>>', self._update_title,
+        self.textwidget.bind('<<ContentChanged>>', self._schedule_title_update,
                              add=True)
 
         if content:
             self.textwidget.insert('1.0', content)
             self.textwidget.edit_reset()   # reset undo/redo
 
-        self.bind('<<PathChanged>>', self._update_status, add=True)
-        self.bind('<<FiletypeChanged>>', self._update_status, add=True)
-        self.textwidget.bind('<<CursorMoved>>', self._update_status, add=True)
+        self.textwidget.bind('<<CursorMoved>>', self._schedule_status_update,
+                             add=True)
 
         self.scrollbar = ttk.Scrollbar(self)
         self.scrollbar.pack(side='left', fill='y')
         self.textwidget['yscrollcommand'] = self.scrollbar.set
         self.scrollbar['command'] = self.textwidget.yview
+        # e.g. wordcount.py needs to know when wake_up() replaces the
+        # text widget
+        self.event_generate('<<TextWidgetCreated>>')
+
+    def get_memory_usage(self):
+        if self._hibernation is not None:
+            return 0
+        document = self.textwidget.document
+        return len(document) + document.line_count() * _TEXT_LINE_OVERHEAD
+
+    def hibernate(self):
+        # Write the content to a compressed file in dirs.cachedir and
+        # destroy the text widget. The undo history is lost.
+        if self._hibernation is not None or self._loader is not None:
+            return False
+
+        spill_dir = os.path.join(dirs.cachedir, 'hibernated_tabs')
+        try:
+            os.makedirs(spill_dir, exist_ok=True)
+            fd, spill_path = tempfile.mkstemp(suffix='.txt.gz', dir=spill_dir)
+            os.close(fd)
+        except OSError:
+            log.exception("cannot hibernate %r", self)
+            return False
+
+        try:
+            # compresslevel=1 is much faster than the default and still
+            # compresses text nicely
+            with gzip.open(spill_path, 'wt', encoding='utf-8',
+                           errors='surrogatepass', newline='',
+                           compresslevel=1) as file:
+                for chunk in self.iter_chunks():
+                    file.write(chunk)
+        except OSError:
+            log.exception("cannot hibernate %r", self)
+            self._remove_spill_file(spill_path)
+            return False
+
+        self._hibernation = {
+            'spill_path': spill_path,
+            'hash': self._get_hash(),
+            'cursor': self.textwidget.index('insert'),
+            'yview': self.textwidget.yview()[0],
+        }
+        # e.g. wordcount.py must forget the document, or its text would
+        # stay in memory. Tk's virtual events don't run for hidden widgets.
+        events.generate(self, '<<TextWidgetDestroyed>>')
+        self.textwidget.destroy()
+        self.scrollbar.destroy()
+        self.textwidget = self.scrollbar = None
+        return True
+
+    def is_hibernating(self):
+        return self._hibernation is not None
+
+    def wake_up(self):
+        if self._hibernation is None:
+            return
+
+        spill_path = self._hibernation['spill_path']
+        if spill_path is None:
+            self._load_lazily()
+            return
+        try:
+            with gzip.open(spill_path, 'rt', encoding='utf-8',
+                           errors='surrogatepass', newline='') as file:
+                content = file.read()
+        except (OSError, EOFError, zlib.error):
+            # the tab stays hibernating, and it can't be used without the
+            # text, so it's closed
+            self.after_idle(self.master.close_tab, self)
+            utils.errordialog("Waking up failed",
+                              "Reading the text of '%s' failed!" % self.title,
+                              traceback.format_exc())
+            return
+        self._create_textwidget(content)
+        self.textwidget.mark_set('insert', self._hibernation['cursor'])
+        self.textwidget.yview_moveto(self._hibernation['yview'])
+
+        self._hibernation = None
+        self._remove_spill_file(spill_path)
+        self._update_status()
+
+    def get_view_state(self):
+        # Return (cursor index, first visible fraction of the text).
+        if self._hibernation is not None:
+            return (self._hibernation['cursor'], self._hibernation['yview'])
+        return (self.textwidget.index('insert'), self.textwidget.yview()[0])
+
+    @classmethod
+    def open_lazily(cls, manager, path, cursor='1.0', yview=0.0):
+        # Return a FileTab that doesn't read the file before it's selected
+        # for the first time. Until then, the tab is hibernating without a
+        # spill file and uses almost no memory.
+        return cls(manager, path=path, hibernation={
+            'spill_path': None, 'hash': None,
+            'cursor': cursor, 'yview': yview})
+
+    def _load_lazily(self):
+        hibernation = self._hibernation
+        self._hibernation = None
+        encoding = settings.get_section('General')['encoding']
+        self._create_textwidget('')
+        try:
+            if os.path.getsize(self.path) < _PROGRESSIVE_LOAD_SIZE:
+                content, self.disk_snapshot = self.read_file(self.path,
+                                                             encoding)
+                self.textwidget.insert('1.0', content)
+                self.textwidget.edit_reset()
+            else:
+                self._loader = _ProgressiveLoader(self, self.path, encoding)
+                self._loader.start()
+        except (UnicodeError, OSError):
+            # saving the empty tab would overwrite the file
+            if self._loader is not None:
+                self._loader.cancel()
+                self._loader = None
+            self.textwidget['state'] = 'disabled'
+            self.after_idle(self.master.close_tab, self)
+            utils.errordialog("Opening failed", "Opening '%s' failed!"
+                              % self.path, traceback.format_exc())
+            return
 
         self.mark_saved()
-        self._update_title()
+        # a big file isn't fully loaded yet, and the cursor stays in the
+        # loaded part
+        self.textwidget.mark_set('insert', hibernation['cursor'])
+        self.textwidget.yview_moveto(hibernation['yview'])
         self._update_status()
 
+    @staticmethod
+    def _remove_spill_file(spill_path):
+        try:
+            os.remove(spill_path)
+        except OSError:
+            log.exception("cannot remove '%s'", spill_path)
+
+    @staticmethod
+    def read_file(path, encoding):
+        # Return (content, snapshot) where content is the content of a file
+        # as a string. The content is the first size bytes of the file, and
+        # snapshot is (stat result, size, last bytes of those) for
+        # disk_snapshot. This doesn't use tkinter, so this can be called
+        # from other threads.
+        with open(path, 'rb') as file:
+            # stat before reading, so that a change while reading makes
+            # the stat result look older than the content, not newer
+            stat = os.fstat(file.fileno())
+            data = file.read()
+        # this is what open(path, 'r') does
+        content = data.decode(encoding).replace('\r\n', '\n').replace(
+            '\r', '\n')
+        return (content, (stat, len(data), data[-_SNAPSHOT_TAIL_SIZE:]))
+
     @classmethod
+    @tracing.traced('open')
     def open_file(cls, manager, path):
-        # Read a file and return a new FileTab object.
+        # Read a file and return a new FileTab object. Big files are loaded
+        # gradually after this returns, see _ProgressiveLoader.
         config = settings.get_section('General')
-        with open(path, 'r', encoding=config['encoding']) as file:
-            content = file.read()
-        return cls(manager, content, path)
+        if os.path.getsize(path) < _PROGRESSIVE_LOAD_SIZE:
+            content, snapshot = cls.read_file(path, config['encoding'])
+            return cls(manager, content, path, disk_snapshot=snapshot)
 
-    def equivalent(self, other):
-        #Return True if *self* and *other* are saved to the same place.
-        return (isinstance(other, FileTab) and
-                self.path is not None and
-                other.path is not None and
-                os.path.samefile(self.path, other.path))
+        tab = cls(manager, path=path)
+        try:
+            tab._loader = _ProgressiveLoader(tab, path, config['encoding'])
+            tab._loader.start()
+        except (UnicodeError, OSError):
+            tab.destroy()
+            raise
+        return tab
+
+    def is_loading(self):
+        # Return True if open_file() is still loading the content.
+        return self._loader is not None
+
+    def finish_loading(self):
+        # Load everything that open_file() hasn't loaded yet right now.
+        if self._loader is not None:
+            self._loader.load_all()
+
+    def _on_loading_done(self):
+        self._loader = None
+        self.textwidget['state'] = 'normal'
+        self.textwidget.edit_reset()
+        self.mark_saved()
+        self._update_status()
+
+    def destroy(self):
+        if self._loader is not None:
+            self._loader.cancel()
+        if (self._hibernation is not None and
+                self._hibernation['spill_path'] is not None):
+            self._remove_spill_file(self._hibernation['spill_path'])
+        self._hibernation = None
+        super().destroy()
+
+    def is_same_kind(self, other):
+        return isinstance(other, FileTab)
+
+    def goto_line(self, lineno):
+        # Move the cursor to the beginning of a line, 1 is the first line.
+        self.wake_up()
+        if self.is_hibernating():
+            # wake_up() failed
+            return
+        self.textwidget.mark_set('insert', '%d.0' % lineno)
+        self.textwidget.see('insert')
+        self._update_status()
 
     def iter_chunks(self, n=100):
         # Iterate over the content as chunks of n lines.
-        start = 1     # this is not a mistake, line numbers start at 1
-        while True:
-            end = start + n
-            if self.textwidget.index('%d.0' % end) == self.textwidget.index('end'):
-                # '%d.0' % start can be 'end - 1 char' in a corner
-                # case, let's not yield an empty string
-                last_chunk = self.textwidget.get('%d.0' % start, 'end - 1 char')
-                if last_chunk:
-                    yield last_chunk
-                break
+        if self._hibernation is not None:
+            if self._hibernation['spill_path'] is None:
+                # not read yet, see open_lazily()
+                file = open(self.path, 'r', encoding=settings.get_section(
+                    'General')['encoding'])
+            else:
+                file = gzip.open(self._hibernation['spill_path'], 'rt',
+                                 encoding='utf-8', errors='surrogatepass',
+                                 newline='')
+            with file:
+                while True:
+                    chunk = ''.join(itertools.islice(file, n))
+                    if not chunk:
+                        break
+                    yield chunk
+            return
 
-            yield self.textwidget.get('%d.0' % start, '%d.0' % end)
-            start = end
+        yield from self.textwidget.document.iter_chunks(n)
 
     def _get_hash(self):
-        config = settings.get_section('General')
-        encoding = config['encoding']
-
-        result = hashlib.md5()
-        for chunk in self.iter_chunks():
-            chunk = chunk.encode(encoding, errors='replace')
-            result.update(chunk)
-
+        if self._hibernation is not None:
+            return self._hibernation['hash']
         # hash objects don't define an __eq__ so we need to use a string
         # representation of the hash
-        return result.hexdigest()
-
-    def mark_saved(self):
-        self._save_hash = self._get_hash()
+        return self._get_hasher().hexdigest()
+
+    def _get_hasher(self):
+        # Return an md5 object of the text. It's cached until the text
+        # changes, so it must not be updated.
+        version = self.textwidget.document.version
+        if self._hash_cache is None or self._hash_cache[0] != version:
+            self._hash_cache = (version, self._hash_text())
+        return self._hash_cache[1]
+
+    @tracing.traced('hash')
+    def _hash_text(self):
+        result = hashlib.md5()
+        for chunk in self.textwidget.document.iter_chunks():
+            # not the encoding of the file, because hashing more text after
+            # this must give the same hash as hashing all of it, and e.g.
+            # utf-16 would add a BOM to every chunk
+            result.update(chunk.encode('utf-8', errors='surrogatepass'))
+        return result
+
+    def mark_saved(self, appended=None):
+        # appended is text that was inserted to the end of the text after
+        # the previous mark_saved(), and nothing else was changed. Then the
+        # hash of the new text is computed from the old one, instead of
+        # hashing all of the text again, e.g. for every change of a log
+        # file that filewatch.py loads.
+        if self._hibernation is not None:
+            self._save_hash = self._hibernation['hash']
+            self._save_hasher = self._save_version = self._save_length = None
+        else:
+            document = self.textwidget.document
+            if appended is not None and self._save_hasher is not None:
+                hasher = self._save_hasher.copy()
+                hasher.update(appended.encode('utf-8', errors='surrogatepass'))
+                self._hash_cache = (document.version, hasher)
+            self._save_hasher = self._get_hasher()
+            self._save_hash = self._save_hasher.hexdigest()
+            self._save_version = document.version
+            self._save_length = len(document)
         self._update_title()
+        # e.g. filewatch.py needs to know when the text is the same as the
+        # file
+        events.generate(self, '<<Saved>>')
 
     def is_saved(self):
         #Return False if the text has changed since previous save.
+        if self._loader is not None:
+            # the text widget is disabled while loading
+            return True
+        if self._hibernation is None:
+            # this runs after every change, and hashing is slow with big
+            # files, see _update_title()
+            document = self.textwidget.document
+            if document.version == self._save_version:
+                return True
+            if (self._save_length is not None and
+                    len(document) != self._save_length):
+                return False
+        # e.g. undoing all changes since saving gives the saved text back
         return self._get_hash() == self._save_hash
 
     @property
@@ -329,6 +919,13 @@ class FileTab(Tab):
     def filetype(self):
         return self._filetype
 
+    # these run at most once per idle, no matter how many events come
+    def _schedule_title_update(self, junk_event=None):
+        utils.schedule_update(self._update_title)
+
+    def _schedule_status_update(self, junk_event=None):
+        utils.schedule_update(self._update_status)
+
     def _update_title(self, junk=None):
         text = 'New File' if self.path is None else os.path.basename(self.path)
         if not self.is_saved():
@@ -340,11 +937,21 @@ class FileTab(Tab):
             prefix = "New file"
         else:
             prefix = "File '%s'" % self.path
-        line, column = self.textwidget.index('insert').split('.')
+        if self._hibernation is None:
+            cursor = self.textwidget.index('insert')
+        else:
+            cursor = self._hibernation['cursor']
+        line, column = cursor.split('.')
 
         self.status = "%s, %s\tLine %s, column %s" % (
             prefix, self.filetype.name,
             line, column)
+        if self._hibernation is None:
+            self.status += "\tUndo: %s (all tabs: %s)" % (
+                utils.format_size(self.textwidget.undo_journal.memory_usage),
+                utils.format_size(textwidget.get_total_undo_memory()))
+        if self._loader is not None:
+            self.status += "\tLoading... %d%%" % self._loader.get_percentage()
 
     def can_be_closed(self):
         # If the file has been saved, this returns True. Otherwise, return False.
@@ -367,13 +974,29 @@ class FileTab(Tab):
         return True
 
     def on_focus(self):
-        self.textwidget.focus()
+        if self.textwidget is not None:
+            self.textwidget.focus()
 
+    @tracing.traced('save')
     def save(self):
         # Save the file to the current path
         if self.path is None:
             return self.save_as()
 
+        # saving a half-loaded file would lose the rest of the file, and
+        # a tab from open_lazily() must read its file before saving
+        try:
+            self.wake_up()
+            self.finish_loading()
+        except (OSError, UnicodeError) as e:
+            utils.errordialog(type(e).__name__, "Saving failed!",
+                              traceback.format_exc())
+            return None
+        if self.is_hibernating() or self.textwidget['state'] == 'disabled':
+            # reading the file failed in _load_lazily() or the spill file
+            # failed in wake_up(), and the tab will be closed soon
+            return None
+
         self.event_generate('<<Save>>')
 
         encoding = settings.get_section('General')['encoding']
@@ -396,6 +1019,530 @@ class FileTab(Tab):
         if not path:
             return False
 
+        # open_lazily() tabs read the content from self.path
+        self.wake_up()
+        if self.is_hibernating():
+            return False
         self.path = path
         self.save()
         return True
+
+
+class BigFileTab(Tab):
+    # A read-only view of a file that is too big for a tkinter.Text. The
+    # file is memory-mapped and only the lines that fit on the screen are
+    # decoded and put to the text widget. Line start offsets are found
+    # with numpy and cached to dirs.cachedir.
+
+    def __init__(self, manager, path):
+        super().__init__(manager)
+        self._path = path
+        self._tokens = tokenizer.TokenSequence()
+        encoding = settings.get_section('General')['encoding']
+        self._encoding = encoding
+
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(file.fileno())
+        self._index_path = _get_line_index_path(path, stat)
+
+        # offsets of line beginnings in bytes, see _find_line_starts()
+        self._line_starts = _load_line_index(self._index_path)
+        self._index_pieces = None
+        self._indexed_size = len(self._mmap)
+        self._index_after_id = None
+        # functions to call when indexing is done, see goto_line()
+        self._after_indexing = []
+        self._search_after_id = None
+        self._search_callback = None
+        if self._line_starts is None:
+            # index the beginning now and the rest in the background, the
+            # beginning can be viewed while indexing
+            self._index_pieces = [numpy.zeros(1, dtype=numpy.int64)]
+            self._indexed_size = 0
+            self._index_some()
+            self._line_starts = numpy.concatenate(self._index_pieces)
+            self._index_after_id = self.after_idle(self._index_in_background)
+
+        self._top = 0               # first visible line, 0-based
+        self._cursor_line = 0       # 0-based
+        self._visible_lines = 1
+
+        self.textwidget = tkinter.Text(self, width=1, height=1, wrap='none')
+        self.textwidget.pack(side='left', fill='both', expand=True)
+        self.textwidget.tag_config('cursorline', background='#e8e8ff')
+        self.textwidget.tag_config('find_highlight',
+                                   foreground='black', background='yellow')
+        self.scrollbar = ttk.Scrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side='left', fill='y')
+
+        self.textwidget.bind('<Configure>', self._on_configure, add=True)
+        for sequence, lines in [('<Up>', -1), ('<Down>', 1),
+                                ('<Prior>', 'page-up'), ('<Next>', 'page-down'),
+                                ('<Control-Home>', 'start'),
+                                ('<Control-End>', 'end')]:
+            self.textwidget.bind(
+                sequence, functools.partial(self._on_key, lines))
+        self.textwidget.bind('<MouseWheel>', self._on_wheel)
+        self.textwidget.bind('<Button-4>', functools.partial(self._scroll, -3))
+        self.textwidget.bind('<Button-5>', functools.partial(self._scroll, 3))
+        self.textwidget.bind('<Button-1>', self._on_click)
+
+        self.title = os.path.basename(path)
+        self._render()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    @tokens.setter
+    def tokens(self, new_tokens):
+        if len(new_tokens) > 0:
+            self._tokens = new_tokens
+
+    def get_line_count(self):
+        return len(self._line_starts)
+
+    def is_indexing(self):
+        return self._index_pieces is not None
+
+    def finish_indexing(self):
+        # Index the rest of the file right now.
+        if self._index_after_id is not None:
+            self.after_cancel(self._index_after_id)
+            self._index_after_id = None
+        if self._index_pieces is not None:
+            while self._index_some():
+                pass
+            self._on_indexing_done()
+
+    def is_same_kind(self, other):
+        return isinstance(other, (FileTab, BigFileTab))
+
+    def on_focus(self):
+        self.textwidget.focus()
+
+    def destroy(self):
+        if self._index_after_id is not None:
+            self.after_cancel(self._index_after_id)
+        self.cancel_search()
+        self._after_indexing.clear()
+        super().destroy()
+        self._mmap.close()
+
+    # indexing
+    def _index_some(self):
+        # returns False when everything has been indexed
+        start = self._indexed_size
+        end = min(start + _INDEX_BLOCK_SIZE, len(self._mmap))
+        self._index_pieces.append(_find_line_starts(self._mmap, start, end))
+        self._indexed_size = end
+        return end < len(self._mmap)
+
+    def _index_in_background(self):
+        self._index_after_id = None
+        if self._index_some():
+            self._update_status()
+            self._index_after_id = self.after_idle(self._index_in_background)
+        else:
+            self._on_indexing_done()
+
+    def _on_indexing_done(self):
+        self._line_starts = numpy.concatenate(self._index_pieces)
+        self._index_pieces = None
+        _save_line_index(self._index_path, self._line_starts)
+        self._render()
+        callbacks = self._after_indexing
+        self._after_indexing = []
+        for callback in callbacks:
+            callback()
+
+    # reading lines from the mmap
+    def _get_line_bytes(self, index):
+        start = int(self._line_starts[index])
+        if index + 1 < len(self._line_starts):
+            end = int(self._line_starts[index + 1]) - 1     # without \n
+        else:
+            end = self._indexed_size
+        return start, end
+
+    def get_line(self, index, limit=None):
+        # Return a line without the newline character, 0 is the first line.
+        start, end = self._get_line_bytes(index)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._mmap[start:end].decode(
+            self._encoding, errors='replace').rstrip('\r')
+
+    def iter_chunks(self, n=100000):
+        # Iterate over the content as strings of n lines. The chunks always
+        # end at a line boundary.
+        self.finish_indexing()
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(self._encoding)(errors='replace'),
+            translate=True)
+        line_count = len(self._line_starts)
+        for first in range(0, line_count, n):
+            start = int(self._line_starts[first])
+            if first + n < line_count:
+                end = int(self._line_starts[first + n])
+            else:
+                end = len(self._mmap)
+            chunk = decoder.decode(self._mmap[start:end],
+                                   final=(end == len(self._mmap)))
+            if chunk:
+                yield chunk
+
+    def line_of_offset(self, offset):
+        # Return the 0-based number of the line that contains a byte offset.
+        return int(numpy.searchsorted(self._line_starts, offset, 'right')) - 1
+
+    # rendering
+    def _on_configure(self, junk_event=None):
+        linespace = self.textwidget.tk.call(
+            'font', 'metrics', self.textwidget['font'], '-linespace')
+        self._visible_lines = max(1, self.textwidget.winfo_height() //
+                                  int(linespace))
+        self._render()
+
+    def _set_top(self, top, highlight=None):
+        max_top = max(0, len(self._line_starts) - self._visible_lines)
+        self._top = min(max(0, top), max_top)
+        self._render(highlight)
+
+    def _render(self, highlight=None):
+        # highlight is None or a (line, start_column, end_column) tuple
+        end = min(self._top + self._visible_lines, len(self._line_starts))
+        lines = []
+        for index in range(self._top, end):
+            line = self.get_line(index, _MAX_DISPLAYED_LINE)
+            line_start, line_end = self._get_line_bytes(index)
+            if line_end - line_start > _MAX_DISPLAYED_LINE:
+                line += '\N{horizontal ellipsis}'
+            lines.append(line)
+
+        self.textwidget['state'] = 'normal'
+        self.textwidget.delete('1.0', 'end')
+        self.textwidget.insert('1.0', '\n'.join(lines))
+        if self._top <= self._cursor_line < end:
+            screen_line = self._cursor_line - self._top + 1
+            self.textwidget.tag_add('cursorline', '%d.0' % screen_line,
+                                    '%d.0 + 1 line' % screen_line)
+            if highlight is not None:
+                line, start, end_column = highlight
+                self.textwidget.tag_add(
+                    'find_highlight', '%d.%d' % (screen_line, start),
+                    '%d.%d' % (screen_line, end_column))
+        self.textwidget['state'] = 'disabled'
+
+        total = max(len(self._line_starts), 1)
+        self.scrollbar.set(self._top / total, end / total)
+        self._update_status()
+
+    def _update_status(self):
+        self.status = "File '%s' (read-only)\tLine %d of %d" % (
+            self.path, self._cursor_line + 1, len(self._line_starts))
+        if self.is_indexing():
+            percentage = 100 * self._indexed_size // len(self._mmap)
+            self.status += "\tIndexing... %d%%" % percentage
+
+    # scrolling and moving around
+    def _on_scrollbar(self, action, number, what=None):
+        if action == 'moveto':
+            self._set_top(int(float(number) * len(self._line_starts)))
+        elif what == 'pages':
+            self._set_top(self._top + int(number) * self._visible_lines)
+        else:
+            self._set_top(self._top + int(number))
+
+    def _scroll(self, lines, junk_event=None):
+        self._set_top(self._top + lines)
+        return 'break'
+
+    def _on_wheel(self, event):
+        return self._scroll(-3 if event.delta > 0 else 3)
+
+    def _on_click(self, event):
+        screen_line = int(self.textwidget.index(
+            '@%d,%d' % (event.x, event.y)).split('.')[0])
+        self._cursor_line = min(self._top + screen_line - 1,
+                                len(self._line_starts) - 1)
+        self._render()
+
+    def _on_key(self, how, junk_event):
+        if how == 'page-up':
+            target = self._cursor_line - self._visible_lines
+        elif how == 'page-down':
+            target = self._cursor_line + self._visible_lines
+        elif how == 'start':
+            target = 0
+        elif how == 'end':
+            target = len(self._line_starts) - 1
+        else:
+            target = self._cursor_line + how
+        self._move_cursor(target)
+        return 'break'
+
+    def _move_cursor(self, line, highlight=None):
+        self._cursor_line = min(max(0, line), len(self._line_starts) - 1)
+        top = self._top
+        if not top <= self._cursor_line < top + self._visible_lines:
+            # put the cursor line in the middle of the screen
+            top = self._cursor_line - self._visible_lines // 2
+        self._set_top(top, highlight)
+
+    def goto_line(self, lineno):
+        # Show a line, 1 is the first line. A line that isn't indexed yet
+        # is shown when the background indexing is done, because indexing
+        # a big file right now would freeze the editor.
+        if lineno - 1 < len(self._line_starts) or not self.is_indexing():
+            self._move_cursor(lineno - 1)
+        else:
+            self._after_indexing.append(
+                functools.partial(self._move_cursor, lineno - 1))
+
+    def search(self, pattern, backwards=False, callback=None):
+        # Find the next or previous match of a compiled bytes regex from
+        # the cursor line and show it. The file is searched one index
+        # block at a time when tkinter has nothing else to do, and then
+        # callback(found) is called with True if something was found.
+        # Starting another search cancels this search.
+        self.cancel_search()
+        start, end = self._get_line_bytes(self._cursor_line)
+        self._search_callback = callback
+        if backwards:
+            self._search_after_id = self.after_idle(
+                self._search_backwards, pattern, start)
+        else:
+            self._search_after_id = self.after_idle(
+                self._search_forwards, pattern, end)
+
+    def cancel_search(self):
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        self._search_callback = None
+
+    def _search_backwards(self, pattern, block_end):
+        # re can't search backwards, so this looks at the lines before the
+        # cursor line one index block at a time, and those lines are
+        # always indexed
+        self._search_after_id = None
+        if block_end == 0:
+            self._on_search_done(None)
+            return
+        # blocks start at line beginnings, so that matches aren't cut
+        block_start = int(self._line_starts[self.line_of_offset(
+            max(0, block_end - _INDEX_BLOCK_SIZE))])
+        matches = list(pattern.finditer(self._mmap, block_start, block_end))
+        if matches:
+            self._on_search_done(matches[-1])
+        else:
+            self._search_after_id = self.after_idle(
+                self._search_backwards, pattern, block_start)
+
+    def _search_forwards(self, pattern, start):
+        self._search_after_id = None
+        size = len(self._mmap)
+        # blocks end at a newline, so that matches aren't cut, and the
+        # lines after start may not be indexed yet
+        block_end = self._mmap.find(b'\n', min(start + _INDEX_BLOCK_SIZE,
+                                                size))
+        if block_end == -1:
+            block_end = size
+        match = pattern.search(self._mmap, start, block_end)
+        if match is not None:
+            self._on_search_done(match)
+        elif block_end == size:
+            self._on_search_done(None)
+        else:
+            self._search_after_id = self.after_idle(
+                self._search_forwards, pattern, block_end)
+
+    def _on_search_done(self, match):
+        callback = self._search_callback
+        self._search_callback = None
+        if match is not None:
+            # the line of the match must be indexed before showing it, and
+            # the last indexed line may continue in the part not indexed
+            if (self.is_indexing() and
+                    match.start() >= int(self._line_starts[-1])):
+                self._after_indexing.append(
+                    functools.partial(self._show_match, match))
+            else:
+                self._show_match(match)
+        if callback is not None:
+            callback(match is not None)
+
+    def _show_match(self, match):
+        line = self.line_of_offset(match.start())
+        line_start = self._get_line_bytes(line)[0]
+        decode = functools.partial(bytes.decode, encoding=self._encoding,
+                                   errors='replace')
+        # the columns are for the text widget
+        start_column = document.tk_length(
+            decode(self._mmap[line_start:match.start()]))
+        end_column = start_column + document.tk_length(decode(match.group()))
+        self._move_cursor(line, (line, start_column, end_column))
+
+
+class TokensTab(Tab):
+    # Shows the words of a tokenizer.TokenSequence in a table. The table
+    # renders only the visible rows, so this works with lots of words.
+
+    def __init__(self, manager, tokens, title):
+        super().__init__(manager)
+        self._tokens = tokens
+        self.table = tableview.WordTable(
+            self, tokens.vocabulary, tokens.ids, [("Position", None)])
+        self.table.pack(fill='both', expand=True)
+        self.title = title
+        self.status = "%d words, %d different" % (
+            len(tokens), len(tokens.vocabulary))
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def iter_chunks(self, n=100000):
+        # The words, one per line, as chunks of n lines.
+        for start in range(0, len(self._tokens), n):
+            chunk = self._tokens[start:start + n]
+            yield ''.join(word + '\n' for word in chunk)
+
+    def on_focus(self):
+        self.table.focus()
+
+
+def _get_line_index_path(path, stat):
+    # the cache file name changes when the file is modified
+    name = hashlib.md5(os.path.abspath(path).encode(
+        'utf-8', errors='replace')).hexdigest()
+    return os.path.join(dirs.cachedir, 'line_index', '%s-%d-%d.npy' % (
+        name, stat.st_size, stat.st_mtime_ns))
+
+
+def _load_line_index(index_path):
+    try:
+        # mmap_mode makes this fast even if the index is huge
+        return numpy.load(index_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+
+def _save_line_index(index_path, line_starts):
+    directory, filename = os.path.split(index_path)
+    prefix = filename.split('-')[0] + '-'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # indexes of older versions of the file are useless
+        for old_filename in os.listdir(directory):
+            if old_filename.startswith(prefix):
+                os.remove(os.path.join(directory, old_filename))
+        numpy.save(index_path, line_starts)
+    except OSError:
+        traceback.print_exc()    # the index is just not cached then
+
+
+def _find_line_starts(buffer, start, end):
+    # Return an array of the offsets after each b'\n' in buffer[start:end].
+    block = numpy.frombuffer(buffer, dtype=numpy.uint8,
+                             count=(end - start), offset=start)
+    result = numpy.flatnonzero(block == ord('\n')).astype(numpy.int64)
+    result += start + 1
+    # the block must not refer to the mmap, otherwise closing the mmap fails
+    del block
+    return result
+
+
+class _ProgressiveLoader:
+    # Inserts a big file to a FileTab in pieces when tkinter has nothing
+    # else to do. The beginning of the file is inserted right away, so the
+    # user can look at it while the rest is loading.
+
+    def __init__(self, tab, path, encoding):
+        self._tab = tab
+        self._file = open(path, 'rb')
+        # for the disk_snapshot of the tab, see FileTab.read_file()
+        self._stat = os.fstat(self._file.fileno())
+        self._tail = b''
+        self._total_size = self._stat.st_size
+        self._bytes_read = 0
+        # this is what open(path, 'r') does, but we get to decide how much
+        # is decoded at a time
+        self._decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(encoding)(), translate=True)
+        self._after_id = None
+
+    def get_percentage(self):
+        if self._total_size == 0:
+            return 100
+        return 100 * self._bytes_read // self._total_size
+
+    def start(self):
+        # errors from the first block go to the caller of open_file()
+        self._tab.textwidget['state'] = 'disabled'
+        if self._load_block():
+            self._after_id = self._tab.after_idle(self._load_slice)
+
+    def load_all(self):
+        if self._after_id is not None:
+            self._tab.after_cancel(self._after_id)
+            self._after_id = None
+        while self._load_block():
+            pass
+
+    def cancel(self):
+        if self._after_id is not None:
+            self._tab.after_cancel(self._after_id)
+            self._after_id = None
+        self._file.close()
+
+    # returns False when everything has been loaded
+    def _load_block(self):
+        data = self._file.read(_LOAD_BLOCK_SIZE)
+        self._bytes_read += len(data)
+        self._tail = (self._tail + data[-_SNAPSHOT_TAIL_SIZE:])[
+            -_SNAPSHOT_TAIL_SIZE:]
+        text = self._decoder.decode(data, final=(not data))
+
+        widget = self._tab.textwidget
+        widget['state'] = 'normal'
+        widget.insert('end - 1 char', text)
+        widget['state'] = 'disabled'
+        # the loaded content must not end up in the undo history
+        widget.edit_reset()
+
+        if not data:
+            self._file.close()
+            self._tab.disk_snapshot = (self._stat, self._bytes_read,
+                                       self._tail)
+            self._tab._on_loading_done()
+            return False
+        return True
+
+    def _load_slice(self):
+        self._after_id = None
+        end_time = time.perf_counter() + _LOAD_SLICE_TIME
+        try:
+            while time.perf_counter() < end_time:
+                if not self._load_block():
+                    return
+        except (UnicodeError, OSError) as e:
+            # the tab must not be left open because saving it would
+            # overwrite the file with a part of its content
+            self.cancel()
+            if self._tab in self._tab.master.tabs():
+                self._tab.master.close_tab(self._tab)
+            else:
+                self._tab.destroy()
+            utils.errordialog(type(e).__name__, "Opening failed!",
+                              traceback.format_exc())
+            return
+
+        self._tab._update_status()
+        self._after_id = self._tab.after_idle(self._load_slice)
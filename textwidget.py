@@ -0,0 +1,435 @@
+"""The text widget used by FileTab.
+
+The widget keeps its own undo history instead of using the undo feature
+of tkinter.Text. Tk's undo stack stores full copies of everything that
+is replaced and has no memory limit, but this module stores each change
+once, merges typed characters into one change and drops the oldest
+changes when a tab or all tabs together use too much memory.
+
+Every change is also applied to a document.Document, so code that only
+reads the text doesn't need to ask Tk for it.
+"""
+import collections
+import contextlib
+import itertools
+import tkinter
+import weakref
+
+import document
+import settings
+
+# a change is charged len(text) bytes and this once, for the string
+# object, the list and the index
+_CHANGE_OVERHEAD = 100      # bytes
+
+# groups of changes are numbered, lower numbers are older
+_group_counter = itertools.count()
+# the groups of all UndoJournal objects from oldest to newest, for
+# enforcing the memory limit of all tabs, including groups that have been
+# removed from their journals since they were added
+_all_groups = collections.deque()
+_removed_group_count = 0
+# memory_usage of all UndoJournal objects added together
+_total_memory = 0
+# (limit of one journal, limit of all journals) in bytes, see _get_limits()
+_limits = None
+
+
+def get_total_undo_memory():
+    # Return the number of bytes used by the undo history of all widgets.
+    return _total_memory
+
+
+def _update_limits(junk_value=None):
+    global _limits
+    config = settings.get_section('General')
+    _limits = (config['undo_memory_limit_per_tab'] * 1024 * 1024,
+               config['undo_memory_limit'] * 1024 * 1024)
+
+
+def _get_limits():
+    # the settings are read only when they change, because this is needed
+    # for every change of every text widget
+    if _limits is None:
+        config = settings.get_section('General')
+        config.connect('undo_memory_limit_per_tab', _update_limits,
+                       run_now=False)
+        config.connect('undo_memory_limit', _update_limits, run_now=False)
+        _update_limits()
+    return _limits
+
+
+class _Group:
+    # changes that are undone and redone together
+
+    def __init__(self, journal):
+        self.number = next(_group_counter)
+        # None when the group has been removed from the journal
+        self.journal = weakref.ref(journal)
+        # each change is a list [kind, index, text] where kind is 'insert'
+        # or 'delete' and index is a 'line.column' string
+        self.changes = []
+        self.memory_usage = 0
+        _all_groups.append(self)
+
+    def remove(self):
+        # Call this when the journal forgets the group.
+        global _removed_group_count
+        self.journal = None
+        self.changes = []       # the group may stay in _all_groups for a while
+        _removed_group_count += 1
+        if _removed_group_count > len(_all_groups) // 2 + 1000:
+            _compact_all_groups()
+
+
+def _forget_removed_group():
+    global _removed_group_count
+    _removed_group_count -= 1
+
+
+def _compact_all_groups():
+    global _all_groups, _removed_group_count
+    _all_groups = collections.deque(
+        group for group in _all_groups if group.journal is not None)
+    _removed_group_count = 0
+
+
+class UndoJournal:
+    # Undo and redo history that doesn't need tkinter. The text widget
+    # calls record_insert() and record_delete() for every change.
+
+    def __init__(self):
+        self._undo_groups = collections.deque()
+        self._redo_groups = []
+        self._open = False          # can the last undo group be extended?
+        self._batch_depth = 0       # see batch()
+        # bytes, redo history included. This must be changed with
+        # _charge(), and reset() must be called before the journal is
+        # thrown away, like Text.destroy() does, so that the total of all
+        # journals stays right.
+        self.memory_usage = 0
+
+    def can_undo(self):
+        return bool(self._undo_groups)
+
+    def can_redo(self):
+        return bool(self._redo_groups)
+
+    def _charge(self, size):
+        global _total_memory
+        self.memory_usage += size
+        _total_memory += size
+
+    def reset(self):
+        for group in itertools.chain(self._undo_groups, self._redo_groups):
+            group.remove()
+        self._undo_groups.clear()
+        self._redo_groups.clear()
+        self._open = False
+        self._charge(-self.memory_usage)
+
+    def separator(self):
+        # The next change won't be merged with the previous change.
+        if self._batch_depth == 0:
+            self._open = False
+
+    @contextlib.contextmanager
+    def batch(self):
+        # All changes in the with statement are undone at once.
+        self.separator()
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            self.separator()
+
+    def _add_change(self, kind, index, text):
+        for group in self._redo_groups:
+            self._charge(-group.memory_usage)
+            group.remove()
+        self._redo_groups.clear()
+
+        size = len(text)
+        if not (self._open and self._try_merge(kind, index, text)):
+            size += _CHANGE_OVERHEAD
+            if not self._open:
+                self._undo_groups.append(_Group(self))
+                self._open = True
+            elif (self._batch_depth == 0 and
+                    self._undo_groups[-1].changes[-1][0] != kind):
+                # like tk's autoseparators: typing and deleting are undone
+                # separately
+                self._undo_groups.append(_Group(self))
+            self._undo_groups[-1].changes.append([kind, index, text])
+
+        self._undo_groups[-1].memory_usage += size
+        self._charge(size)
+
+        if (self._batch_depth == 0 and kind == 'insert' and
+                len(text) == 1 and text.isspace()):
+            # typed words are undone one by one
+            self._open = False
+        self._enforce_limits()
+
+    def _try_merge(self, kind, index, text):
+        # merge single typed or deleted characters to the previous change
+        if len(text) != 1 or text == '\n':
+            return False
+        previous = self._undo_groups[-1].changes[-1]
+        if previous[0] != kind or '\n' in previous[2]:
+            return False
+
+        line, column = map(int, index.split('.'))
+        prev_line, prev_column = map(int, previous[1].split('.'))
+        if line != prev_line:
+            return False
+
+        # the columns are Tk's columns, see document.tk_length()
+        if kind == 'insert' and column == prev_column + document.tk_length(
+                previous[2]):
+            previous[2] += text
+        elif kind == 'delete' and column == prev_column:
+            # the delete key
+            previous[2] += text
+        elif (kind == 'delete' and
+                column + document.tk_length(text) == prev_column):
+            # backspace
+            previous[1] = index
+            previous[2] = text + previous[2]
+        else:
+            return False
+        return True
+
+    def record_insert(self, index, text):
+        if text:
+            self._add_change('insert', index, text)
+
+    def record_delete(self, index, text):
+        if text:
+            self._add_change('delete', index, text)
+
+    def _drop_oldest_group(self):
+        if self._undo_groups:
+            group = self._undo_groups.popleft()
+        else:
+            group = self._redo_groups.pop(0)
+        self._charge(-group.memory_usage)
+        group.remove()
+        if not self._undo_groups:
+            self._open = False
+
+    def _enforce_limits(self):
+        per_tab_limit, total_limit = _get_limits()
+
+        # the group being edited is never dropped
+        while self.memory_usage > per_tab_limit and len(self._undo_groups) > 1:
+            self._drop_oldest_group()
+
+        # drop the oldest groups of all widgets, _all_groups is in that
+        # order and the groups at the start are removed as they're found
+        skipped = None
+        while _total_memory > total_limit and _all_groups:
+            group = _all_groups.popleft()
+            journal = None if group.journal is None else group.journal()
+            if journal is None:
+                _forget_removed_group()
+                continue
+            if (journal is self and len(self._undo_groups) <= 1 and
+                    not self._redo_groups):
+                # the group being edited, put back to its place below
+                skipped = group
+                continue
+            _all_groups.appendleft(group)
+            journal._drop_oldest_group()
+        if skipped is not None:
+            _all_groups.appendleft(skipped)
+
+    # undo() and redo() return a list of (kind, index, text) changes to
+    # apply to the text, in the order that they should be applied
+    def undo(self):
+        self._open = False
+        if not self._undo_groups:
+            return []
+        group = self._undo_groups.pop()
+        self._redo_groups.append(group)
+        inverse = {'insert': 'delete', 'delete': 'insert'}
+        return [(inverse[kind], index, text)
+                for kind, index, text in reversed(group.changes)]
+
+    def redo(self):
+        self._open = False
+        if not self._redo_groups:
+            return []
+        group = self._redo_groups.pop()
+        self._undo_groups.append(group)
+        return [tuple(change) for change in group.changes]
+
+
+_astral_width_set = False
+
+
+def _set_astral_width(widget):
+    # Tk 8.6 counts characters outside the BMP as two characters and
+    # newer Tks as one. Tcl strings count them like the text widget does.
+    global _astral_width_set
+    width = int(widget.tk.call('string', 'length', '\U0001F600'))
+    document.set_astral_width(width)
+    _astral_width_set = True
+
+
+class Text(tkinter.Text):
+    # A tkinter.Text that uses UndoJournal for undo and redo.
+    #
+    # This also generates <<ContentChanged>> when the text changes and
+    # <<CursorMoved>> when the insert mark moves. The document attribute is
+    # a document.Document with the same text.
+
+    def __init__(self, master=None, **kwargs):
+        kwargs.pop('undo', None)
+        kwargs.pop('maxundo', None)
+        super().__init__(master, undo=False, **kwargs)
+        if not _astral_width_set:
+            _set_astral_width(self)
+        self.undo_journal = UndoJournal()
+        self.document = document.Document()
+        self._replaying = False
+
+        # every change goes through _proxy(), including changes done by
+        # tk's own key bindings
+        self._orig = self._w + '_orig'
+        self.tk.call('rename', self._w, self._orig)
+        self.tk.createcommand(self._w, self._proxy)
+
+    def destroy(self):
+        self.undo_journal.reset()
+        super().destroy()
+        self.tk.deletecommand(self._w)
+
+    def undo_batch(self):
+        # Return a context manager that makes all changes done in the with
+        # statement undo at once.
+        return self.undo_journal.batch()
+
+    def _call(self, *args):
+        return self.tk.call((self._orig,) + args)
+
+    def _index(self, index):
+        result = self._call('index', index)
+        # inserting to 'end' inserts before the last newline
+        if self._call('compare', result, '==', 'end'):
+            result = self._call('index', 'end - 1 char')
+        return str(result)
+
+    def _is_disabled(self):
+        return str(self._call('cget', '-state')) == 'disabled'
+
+    def _proxy(self, *args):
+        # _tkinter re-raises an error of a createcommand() callback from
+        # mainloop() even if Tcl code catches it, and that would quit the
+        # editor. Like idlelib's WidgetRedirector, a failing command
+        # returns '' instead.
+        try:
+            return self._dispatch(*args)
+        except tkinter.TclError:
+            return ''
+
+    def _dispatch(self, command, *args):
+        if command in {'insert', 'delete'} and self._is_disabled():
+            # tk ignores changes to a disabled widget, and so must the undo
+            # history and the document
+            return ''
+
+        if command == 'insert' and not self._replaying:
+            index = self._index(args[0])
+            result = self._call(command, *args)
+            # args are index, chars, tags, chars, tags, ...
+            text = ''.join(args[1::2])
+            self.document.insert(index, text)
+            self.undo_journal.record_insert(index, text)
+            self._content_changed()
+            return result
+
+        if command == 'delete' and not self._replaying:
+            if len(args) > 2:
+                # multiple ranges, delete the last one first so that the
+                # other indexes stay valid
+                ranges = sorted(
+                    zip(args[0::2], args[1::2]),
+                    key=lambda pair: tuple(map(int, str(
+                        self._call('index', pair[0])).split('.'))),
+                    reverse=True)
+                for start, end in ranges:
+                    self._dispatch('delete', start, end)
+                return ''
+
+            start = self._index(args[0])
+            end = args[1] if len(args) == 2 else start + ' + 1 char'
+            # tk never deletes the last newline, so it must not be in the
+            # undo history either
+            if self._call('compare', end, '>', 'end - 1 char'):
+                end = 'end - 1 char'
+            deleted = self._call('get', start, end)
+            self.document.delete(start, self._index(end))
+            result = self._call(command, start, end)
+            self.undo_journal.record_delete(start, deleted)
+            self._content_changed()
+            return result
+
+        if command == 'replace' and not self._replaying:
+            start = self._index(args[0])
+            with self.undo_journal.batch():
+                self._dispatch('delete', start, args[1])
+                self._dispatch('insert', start, *args[2:])
+            return ''
+
+        if command == 'edit':
+            return self._proxy_edit(*args)
+
+        result = self._call(command, *args)
+        if command == 'mark' and args[:2] == ('set', 'insert'):
+            self.event_generate('<<CursorMoved>>')
+        return result
+
+    def _proxy_edit(self, subcommand, *args):
+        journal = self.undo_journal
+        if subcommand in {'undo', 'redo'}:
+            changes = journal.undo() if subcommand == 'undo' else journal.redo()
+            if changes:
+                self._apply_changes(changes)
+            return ''
+        if subcommand == 'separator':
+            journal.separator()
+            return ''
+        if subcommand == 'reset':
+            journal.reset()
+            return ''
+        if subcommand == 'canundo':
+            return journal.can_undo()
+        if subcommand == 'canredo':
+            return journal.can_redo()
+        return self._call('edit', subcommand, *args)
+
+    def _apply_changes(self, changes):
+        self._replaying = True
+        try:
+            for kind, index, text in changes:
+                if kind == 'insert':
+                    self._call('insert', index, text)
+                    end = self.document.insert(index, text)
+                    self._call('mark', 'set', 'insert', end)
+                else:
+                    # tk counts some characters as two, see document.py
+                    end = self._call('index', '%s + %d chars' % (
+                        index, document.tk_length(text)))
+                    self.document.delete(index, str(end))
+                    self._call('delete', index, end)
+                    self._call('mark', 'set', 'insert', index)
+        finally:
+            self._replaying = False
+        self._call('see', 'insert')
+        self._content_changed()
+
+    def _content_changed(self):
+        self.event_generate('<<ContentChanged>>')
+        self.event_generate('<<CursorMoved>>')
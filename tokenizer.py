@@ -0,0 +1,106 @@
+"""Splitting text into words for the tokenizer and statistics.
+
+This module doesn't use tkinter, so it can be used without a GUI.
+"""
+import array
+import collections.abc
+import itertools
+import re
+
+import numpy
+
+# a word is a run of characters that str.isalpha() accepts, and this
+# regex matches all of them and a few others like '²'
+_WORD_RE = re.compile(r'[^\W\d_]+')
+
+# this must change when the words found by this module change, because
+# statscache uses it in the keys of cached results
+CONFIG = 'words-1 %s lowercase' % _WORD_RE.pattern
+
+
+def iter_words(text):
+    # Yield the words of a string in lowercase.
+    for match in _WORD_RE.finditer(text):
+        word = match.group()
+        if word.isalpha():
+            yield word.lower()
+        else:
+            # rare, only happens with things like superscript digits
+            for is_alpha, chars in itertools.groupby(word, str.isalpha):
+                if is_alpha:
+                    yield ''.join(chars).lower()
+
+
+def tokenize(chunks):
+    # Return a list of the words in an iterable of strings. Words don't
+    # continue from one chunk to the next, so the chunks should be split
+    # at line boundaries, e.g. with FileTab.iter_chunks().
+    words = []
+    for chunk in chunks:
+        words.extend(iter_words(chunk))
+    return words
+
+
+class TokenSequence(collections.abc.Sequence):
+    # An immutable sequence of words that uses much less memory than a
+    # list of strings. Each different word is stored once in the
+    # vocabulary list, in the order that the words first appear, and the
+    # sequence itself is a numpy array of uint32 indexes of the
+    # vocabulary. Indexing and iterating give strings like a list would.
+
+    def __init__(self, vocabulary=(), ids=None, counts=None):
+        self.vocabulary = list(vocabulary)
+        if ids is None:
+            ids = numpy.zeros(0, dtype=numpy.uint32)
+        self.ids = ids
+        self._counts = counts
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        # Tokenize an iterable of strings, see tokenize().
+        indexes = {}
+        setdefault = indexes.setdefault
+        ids = array.array('I')
+        for chunk in chunks:
+            # len(indexes) is evaluated before setdefault() adds a new word
+            ids.extend([setdefault(word, len(indexes))
+                        for word in iter_words(chunk)])
+        # frombuffer() doesn't copy, the array stays alive as its base
+        return cls(indexes, numpy.frombuffer(ids, dtype=numpy.uint32))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TokenSequence(self.vocabulary, self.ids[index])
+        return self.vocabulary[self.ids[index]]
+
+    def __iter__(self):
+        vocabulary = self.vocabulary
+        # tolist() is much faster than iterating over a numpy array, and
+        # doing it in pieces doesn't create a huge list
+        for start in range(0, len(self.ids), 65536):
+            yield from map(vocabulary.__getitem__,
+                           self.ids[start:start + 65536].tolist())
+
+    def __repr__(self):
+        return '<%s: %d words, %d different>' % (
+            type(self).__name__, len(self), len(self.vocabulary))
+
+    def counts(self):
+        # Return a numpy array, counts()[i] is the number of times that
+        # vocabulary[i] appears.
+        if self._counts is None:
+            self._counts = numpy.bincount(
+                self.ids, minlength=len(self.vocabulary)).astype(numpy.uint64)
+        return self._counts
+
+    def most_common(self):
+        # Return a list of (word, count) pairs, most common first. Words
+        # that appear equally many times are in the order of the text.
+        counts = self.counts()
+        order = numpy.argsort(-counts.astype(numpy.int64), kind='stable')
+        vocabulary = self.vocabulary
+        return [(vocabulary[i], count) for i, count in
+                zip(order.tolist(), counts[order].tolist())]
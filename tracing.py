@@ -0,0 +1,145 @@
+"""Recording a session as a Chrome trace.
+
+When the record_trace setting is on, spans of editor operations are
+collected and written to a JSON file in dirs.cachedir when the editor
+quits. The file uses the Trace Event Format, so it can be opened in
+chrome://tracing, Perfetto or speedscope. Spans nest, e.g.::
+
+    with tracing.span('statistics'):
+        with tracing.span('tokenize', path=tab.path):
+            ...
+
+When tracing is off, span() returns the same do-nothing context manager
+every time, so leaving the spans in the code costs almost nothing. Only
+the newest _MAX_TRACE_EVENTS spans are kept, so that recording for a
+long time doesn't use more and more memory.
+
+This module doesn't use tkinter until setup() is called, so it can be
+used in code that must work without a GUI.
+"""
+import collections
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import dirs
+
+log = logging.getLogger(__name__)
+
+# a span takes roughly 500 bytes of memory
+_MAX_TRACE_EVENTS = 100000
+
+_NULL_SPAN = contextlib.nullcontext()
+_trace_events = None        # a deque while tracing, None otherwise
+_trace_event_count = 0      # including spans that didn't fit
+
+
+class _Span:
+
+    def __init__(self, name, args):
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _trace_event_count
+        end = time.perf_counter_ns()
+        if _trace_events is None:
+            # tracing was stopped inside the span
+            return
+        # 'X' is a "complete event" with a start time and a duration, and
+        # times are in microseconds
+        _trace_events.append({
+            'name': self._name,
+            'ph': 'X',
+            'ts': self._start / 1000,
+            'dur': (end - self._start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': self._args,
+        })
+        _trace_event_count += 1
+
+
+def span(name, **args):
+    # Return a context manager that records how long the with statement
+    # takes. The keyword arguments are shown in the trace viewer.
+    if _trace_events is None:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name):
+    # A decorator that puts every call of the function in a span.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_tracing():
+    return _trace_events is not None
+
+
+def start():
+    # Start collecting spans. This discards previously collected spans.
+    global _trace_events, _trace_event_count
+    _trace_events = collections.deque(maxlen=_MAX_TRACE_EVENTS)
+    _trace_event_count = 0
+
+
+def stop():
+    # Stop collecting spans and write them to a file. Returns the path of
+    # the file or None if there was nothing to write.
+    global _trace_events
+    trace_events = _trace_events
+    _trace_events = None
+    if not trace_events:
+        return None
+
+    trace_dir = os.path.join(dirs.cachedir, 'traces')
+    path = os.path.join(trace_dir, time.strftime('trace-%Y%m%d-%H%M%S.json'))
+    try:
+        os.makedirs(trace_dir, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': list(trace_events),
+                       'displayTimeUnit': 'ms'}, file)
+    except OSError:
+        log.exception("writing the trace to '%s' failed", path)
+        return None
+
+    log.info("wrote %d trace events to '%s'", len(trace_events), path)
+    if _trace_event_count > len(trace_events):
+        log.info("the %d oldest trace events didn't fit and were dropped",
+                 _trace_event_count - len(trace_events))
+    return path
+
+
+def _set_recording(enabled):
+    if enabled and not is_tracing():
+        start()
+    elif not enabled and is_tracing():
+        stop()
+
+
+def setup():
+    import _run, settings
+    config = settings.get_section('General')
+    config.add_option('record_trace', False)
+    config.add_checkbutton(
+        'record_trace', "Record a performance trace to " +
+        os.path.join(dirs.cachedir, 'traces'))
+    config.connect('record_trace', _set_recording)
+
+    _run.get_main_window().bind(
+        '<<SimpleEditorQuit>>', (lambda event: stop()), add=True)
@@ -17,6 +17,7 @@ from tkinter import ttk
 import traceback
 
 import _run
+import perfmonitor
 
 log = logging.getLogger(__name__)
 
@@ -25,6 +26,11 @@ def bind_with_data(widget, sequence, callback, add=False):
     Like ``widget.bind(sequence, callback)``, but supports the ``data``
     argument of ``event_generate()``.
 
+    ``add`` works like in ``widget.bind()``: if it's False, the callback
+    replaces the other bindings of ``sequence`` on the widget. This has
+    always been the case, also before bind_with_data() started to pass
+    %d with the other substitutions.
+
     Here's an example::
 
         import utils
@@ -62,58 +68,116 @@ def bind_with_data(widget, sequence, callback, add=False):
             elements can't be converted or the iterable passed to
             :func:`.create_tcl_list` didn't contain exactly 4 elements.
     """
-    # tkinter creates event objects normally and appends them to the
-    # deque, then run_callback() adds data_blablabla attributes to the
-    # event objects and runs callback(event)
-    event_objects = collections.deque()
-    widget.bind(sequence, event_objects.append, add=add)
+    callback = perfmonitor.wrap(perfmonitor.get_callback_name(callback),
+                                callback)
+
+    # tkinter's bind() would create the event object, but it doesn't
+    # give %d to the callback, so the substitution is done here instead
+    def run_the_callback(*args):
+        event = _EventWithData()
+        event.__dict__.update(vars(widget._substitute(*args[:-1])[0]))
+        event.data = args[-1]
+        return callback(event)      # may return 'break'
 
-    def run_the_callback(data_string):
-        event = event_objects.popleft()
-        event.data = data_string
+    # tkinter's bind() ignores the add argument when the callback is a
+    # string :(
+    funcname = widget._register(run_the_callback)
+    widget.tk.eval('bind %s %s {%s if {"[%s %s %%d]" == "break"} break }'
+                   % (widget, sequence, ('+' if add else ''), funcname,
+                      widget._subst_format_str))
+    return funcname
 
-        # TODO: test this
-        try:
-            split_result = event.widget.tk.splitlist(data_string)
-        except tkinter.TclError:
-            event.data_tuple = None
-        else:
-            def data_tuple(*converters):
-                if len(split_result) != len(converters):
-                    raise ValueError(
-                        "the event data has %d elements, but %d converters "
-                        "were given" % (len(split_result), len(converters)))
-                return tuple(
-                    converter(string)
-                    for converter, string in zip(converters, split_result))
 
-            event.data_tuple = data_tuple
+class _EventWithData(tkinter.Event):
+    # the data_blabla attributes are computed only when they are used,
+    # see bind_with_data()
 
+    @functools.cached_property
+    def data_int(self):
         try:
-            event.data_int = int(data_string)
+            return int(self.data)
         except ValueError:
-            event.data_int = None
+            return None
 
+    @functools.cached_property
+    def data_float(self):
         try:
-            event.data_float = float(data_string)
+            return float(self.data)
         except ValueError:
-            event.data_float = None
+            return None
 
+    @functools.cached_property
+    def data_widget(self):
         try:
-            event.data_widget = widget.nametowidget(data_string)
+            return self.widget.nametowidget(self.data)
         # nametowidget raises KeyError when the widget is unknown, but
         # that feels like an implementation detail
         except Exception:
-            event.data_widget = None
+            return None
 
-        return callback(event)      # may return 'break'
+    @functools.cached_property
+    def data_tuple(self):
+        try:
+            split_result = self.widget.tk.splitlist(self.data)
+        except tkinter.TclError:
+            return None
+
+        def data_tuple(*converters):
+            if len(split_result) != len(converters):
+                raise ValueError(
+                    "the event data has %d elements, but %d converters "
+                    "were given" % (len(split_result), len(converters)))
+            return tuple(
+                converter(string)
+                for converter, string in zip(converters, split_result))
+
+        return data_tuple
+
+
+# callbacks for schedule_update(), a dict is used as an ordered set
+_pending_updates = {}
+_flush_scheduled = False
+
+
+def schedule_update(callback):
+    """Run ``callback()`` when tkinter is idle, but only once.
+
+    Use this for updating things that depend on events that may come in
+    large amounts, like ``<<ContentChanged>>`` during a paste. However
+    many times this is called with the same callback before tkinter gets
+    idle, the callback runs once. Bound methods of the same object and
+    function compare equal, so they work as expected::
+
+        textwidget.bind('<<ContentChanged>>',
+                        lambda event: utils.schedule_update(self.refresh))
+
+    Callbacks that are methods of a widget are not called if the widget
+    has been destroyed before tkinter got idle.
+    """
+    global _flush_scheduled
+    _pending_updates[callback] = None
+    if not _flush_scheduled:
+        _run.get_main_window().after_idle(_flush_updates)
+        _flush_scheduled = True
+
+
+def _flush_updates():
+    global _flush_scheduled
+    _flush_scheduled = False
+
+    # callbacks may schedule more updates, they run on the next idle
+    callbacks = list(_pending_updates)
+    _pending_updates.clear()
+    for callback in callbacks:
+        widget = getattr(callback, '__self__', None)
+        if isinstance(widget, tkinter.Misc) and not widget.winfo_exists():
+            continue
+        try:
+            callback()
+        except Exception:
+            # one failing callback must not prevent the others from running
+            log.exception("scheduled update %r failed", callback)
 
-    # tkinter's bind() ignores the add argument when the callback is a
-    # string :(
-    funcname = widget.register(run_the_callback)
-    widget.tk.eval('bind %s %s {+ if {"[%s %%d]" == "break"} break }'
-                   % (widget, sequence, funcname))
-    return funcname
 
 try:
     Spinbox = ttk.Spinbox
@@ -228,6 +292,25 @@ def backup_open(path, *args, **kwargs):
         yield open(path, *args, **kwargs)
 
 
+def format_size(size):
+    """Convert a number of bytes to a human-readable string.
+
+    >>> format_size(123)
+    '123 B'
+    >>> format_size(123456)
+    '120.6 KB'
+    >>> format_size(1024 * 1024)
+    '1.0 MB'
+    """
+    if size < 1024:
+        return '%d B' % size
+    for unit in ['KB', 'MB', 'GB']:
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            break
+    return '%.1f %s' % (size, unit)
+
+
 def get_keyboard_shortcut(binding):
     """Convert a Tk binding string to a format that most people are used to.
 
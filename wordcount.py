@@ -0,0 +1,253 @@
+"""A sidebar with live word counts of each file.
+
+WordCounter keeps the word counts of a document.Document up to date
+without tokenizing the whole text again. The Document tells it which
+lines each change removed and added, and those lines are tokenized later
+in small batches, so that counting takes at most _TIME_BUDGET seconds
+before tk gets to handle events again, even right after a huge paste.
+Words are also grouped by their count, so finding the most common words
+doesn't need to look at every word.
+"""
+import collections
+import functools
+import heapq
+import time
+import weakref
+from tkinter import ttk
+
+import tokenizer
+
+# how long one batch of counting may take, in seconds
+_TIME_BUDGET = 0.004
+# how many characters are tokenized at a time, the time budget is
+# checked between these
+_BATCH_SIZE = 4 * 1024
+_TOP_COUNT = 10
+
+# the word_count_sidebar setting
+_enabled = False
+# {tab: WordCountSidebar}
+_sidebars = weakref.WeakKeyDictionary()
+
+
+class WordCounter:
+    # This doesn't use tkinter.
+
+    def __init__(self):
+        self.total = 0
+        self._counts = {}               # {word: count}
+        self._words_by_count = {}       # {count: {word, ...}}
+        # strings waiting to be counted, the lines that the document
+        # doesn't contain anymore are subtracted
+        self._added = []
+        self._removed = []
+
+    def on_change(self, removed_lines, added_lines):
+        # this is a document.Document change callback
+        self._removed.extend(removed_lines)
+        self._added.extend(added_lines)
+
+    def has_pending(self):
+        return bool(self._added or self._removed)
+
+    def process(self, time_budget):
+        # Count waiting strings until they run out or time_budget seconds
+        # have passed. Returns True if everything is counted.
+        deadline = time.perf_counter() + time_budget
+        while self._added or self._removed:
+            # removed lines were added to the counts earlier or are still
+            # in self._added, so counting added lines first means that
+            # the counts never go negative
+            if self._added:
+                pending, sign = self._added, 1
+            else:
+                pending, sign = self._removed, -1
+
+            batch = []
+            size = 0
+            while pending and size < _BATCH_SIZE:
+                batch.append(pending.pop())
+                size += len(batch[-1])
+            self._update(collections.Counter(
+                tokenizer.iter_words('\n'.join(batch))), sign)
+
+            if time.perf_counter() > deadline:
+                break
+        return not self.has_pending()
+
+    def _update(self, batch_counts, sign):
+        counts = self._counts
+        by_count = self._words_by_count
+        for word, count in batch_counts.items():
+            old = counts.get(word, 0)
+            new = old + sign * count
+            if old:
+                words = by_count[old]
+                words.discard(word)
+                if not words:
+                    del by_count[old]
+            if new:
+                counts[word] = new
+                by_count.setdefault(new, set()).add(word)
+            else:
+                del counts[word]
+            self.total += sign * count
+
+    def distinct_count(self):
+        return len(self._counts)
+
+    def most_common(self, n):
+        # Return a list of at most n (word, count) pairs, the most common
+        # first and equally common words in alphabetical order.
+        result = []
+        for count in heapq.nlargest(n, self._words_by_count):
+            words = heapq.nsmallest(n - len(result),
+                                    self._words_by_count[count])
+            result.extend((word, count) for word in words)
+            if len(result) == n:
+                break
+        return result
+
+
+class WordCountSidebar(ttk.Frame):
+
+    def __init__(self, master, tab, **kwargs):
+        super().__init__(master, **kwargs)
+        self._tab = tab
+        self._counter = WordCounter()
+        self._counted = False       # has the text been given to _counter?
+        self._document = None
+        self._after_id = None
+
+        self._total_label = ttk.Label(self)
+        self._total_label.pack(side='top', anchor='w')
+        self._distinct_label = ttk.Label(self)
+        self._distinct_label.pack(side='top', anchor='w')
+        self._tree = ttk.Treeview(self, columns=('word', 'count'),
+                                  show='headings', height=_TOP_COUNT,
+                                  selectmode='none')
+        self._tree.heading('word', text="Word")
+        self._tree.heading('count', text="Count")
+        self._tree.column('word', width=100)
+        self._tree.column('count', width=60, anchor='e')
+        self._tree.pack(side='top', fill='y', expand=True)
+
+        self.attach()
+
+    def attach(self):
+        # Start following the document of the tab's text widget. Waking up
+        # a hibernated tab creates a new text widget and document, but the
+        # text is the same and the counts stay.
+        if self._tab.textwidget is None or self._document is not None:
+            return
+        document = self._tab.textwidget.document
+        if not self._counted:
+            self._counter.on_change([], list(document.iter_chunks(100)))
+            self._counted = True
+            self._schedule()
+        document.change_callbacks.append(self._on_change)
+        self._document = document
+
+    def detach(self):
+        # Stop following the document, e.g. because the tab hibernates and
+        # the document must not stay in memory.
+        if self._document is not None:
+            try:
+                self._document.change_callbacks.remove(self._on_change)
+            except ValueError:
+                pass
+            self._document = None
+
+    def destroy(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        self.detach()
+        self._tab = None
+        super().destroy()
+
+    def _on_change(self, removed_lines, added_lines):
+        self._counter.on_change(removed_lines, added_lines)
+        self._schedule()
+
+    def _schedule(self):
+        if self._after_id is None:
+            self._after_id = self.after_idle(self._process)
+
+    def _process(self):
+        self._after_id = None
+        done = self._counter.process(_TIME_BUDGET)
+        self._show()
+        if not done:
+            # let tk handle events before counting more
+            self._after_id = self.after(1, self._process)
+
+    def _show(self):
+        counter = self._counter
+        self._total_label['text'] = "Words: %d" % counter.total
+        self._distinct_label['text'] = "Different words: %d" % (
+            counter.distinct_count())
+        self._tree.delete(*self._tree.get_children())
+        for word, count in counter.most_common(_TOP_COUNT):
+            self._tree.insert('', 'end', values=(word, count))
+
+
+def _add_sidebar(tab):
+    import tabs
+    if not (_enabled and isinstance(tab, tabs.FileTab)) or tab in _sidebars:
+        return
+    if tab.is_hibernating():
+        # e.g. a restored session can have hundreds of tabs that are never
+        # selected, and they don't need sidebars, see _on_new_tab()
+        return
+    sidebar = WordCountSidebar(tab.right_frame, tab)
+    sidebar.pack(fill='y', expand=True)
+    _sidebars[tab] = sidebar
+
+
+def _set_enabled(tab_manager, enabled):
+    global _enabled
+    _enabled = enabled
+    if enabled:
+        for tab in tab_manager.tabs():
+            _add_sidebar(tab)
+    else:
+        for sidebar in list(_sidebars.values()):
+            sidebar.destroy()
+        _sidebars.clear()
+
+
+def _on_text_widget_created(tab, junk_event=None):
+    if tab in _sidebars:
+        _sidebars[tab].attach()
+    else:
+        _add_sidebar(tab)
+
+
+def _on_text_widget_destroyed(event):
+    if event.widget in _sidebars:
+        _sidebars[event.widget].detach()
+
+
+def _on_new_tab(event):
+    import events, tabs
+    tab = event.data
+    if isinstance(tab, tabs.FileTab):
+        # bound once here and not in each sidebar, because each bind()
+        # creates a Tcl command that keeps the callback alive
+        tab.bind('<<TextWidgetCreated>>',
+                 functools.partial(_on_text_widget_created, tab), add=True)
+        events.bind(tab, '<<TextWidgetDestroyed>>', _on_text_widget_destroyed)
+    _add_sidebar(tab)
+
+
+def setup():
+    import _run, events, settings
+    tab_manager = _run.get_tab_manager()
+    config = settings.get_section('General')
+    config.add_option('word_count_sidebar', True)
+    config.add_checkbutton('word_count_sidebar',
+                           "Show live word counts next to files")
+    config.connect('word_count_sidebar',
+                   functools.partial(_set_enabled, tab_manager))
+    events.bind(tab_manager, '<<NewTab>>', _on_new_tab)
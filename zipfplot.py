@@ -0,0 +1,91 @@
+"""A log-log plot of word frequency by rank for the whole vocabulary.
+
+Giving matplotlib millions of points makes drawing slow, so ZipfPlot
+draws at most _MAX_POINTS points. The frequencies sorted from the most
+common word to the least common are a decreasing sequence, so the
+frequencies between two plotted ranks are between the frequencies of
+those ranks, and points at logarithmically spaced ranks look the same as
+all points on a log scale. When the plot is zoomed or panned, the points
+are picked again for the visible ranks only.
+"""
+import numpy
+from tkinter import ttk
+
+from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg,
+                                               NavigationToolbar2Tk)
+from matplotlib.figure import Figure
+
+_MAX_POINTS = 2000
+
+
+def sample_ranks(first, last, max_points=_MAX_POINTS):
+    # Return a numpy array of at most max_points ranks between first and
+    # last, inclusive, spaced evenly on a log scale. Ranks start at 1.
+    if last - first + 1 <= max_points:
+        return numpy.arange(first, last + 1)
+    ranks = numpy.geomspace(first, last, max_points).round()
+    return numpy.unique(ranks.astype(numpy.int64))
+
+
+def fit_exponent(frequencies):
+    # Return s of a Zipf distribution, frequency ~ rank**-s, fitted to
+    # frequencies sorted from the most common. Returns None if there are
+    # less than two frequencies.
+    if len(frequencies) < 2:
+        return None
+    # fitting to log-spaced ranks weights all parts of the curve equally,
+    # all ranks would give the rare words almost all of the weight
+    ranks = sample_ranks(1, len(frequencies))
+    slope, intercept = numpy.polyfit(numpy.log(ranks),
+                                     numpy.log(frequencies[ranks - 1]), 1)
+    return -slope
+
+
+class ZipfPlot(ttk.Frame):
+
+    def __init__(self, master, counts, **kwargs):
+        super().__init__(master, **kwargs)
+        # frequencies of all words, the most common first
+        self._frequencies = numpy.sort(counts[counts > 0])[::-1]
+
+        figure = Figure(figsize=(5, 4), dpi=100)
+        self._axes = figure.add_subplot(111)
+        self._axes.set_xscale('log')
+        self._axes.set_yscale('log')
+        self._axes.set_xlabel('Rank')
+        self._axes.set_ylabel('Frequency')
+        exponent = fit_exponent(self._frequencies)
+        if exponent is None:
+            self._axes.set_title('Frequency by rank')
+        else:
+            self._axes.set_title('Frequency by rank (Zipf exponent %.2f)'
+                                 % exponent)
+        self._line, = self._axes.plot([], [], marker='.', markersize=3)
+
+        if len(self._frequencies) > 0:
+            # the limits must not change when the points change
+            self._axes.set_autoscale_on(False)
+            self._axes.set_xlim(0.8, len(self._frequencies) * 1.25)
+            self._axes.set_ylim(self._frequencies[-1] * 0.8,
+                                self._frequencies[0] * 1.25)
+        self._update_points()
+        self._axes.callbacks.connect('xlim_changed', self._update_points)
+
+        self._canvas = FigureCanvasTkAgg(figure, master=self)
+        toolbar = NavigationToolbar2Tk(self._canvas, self, pack_toolbar=False)
+        toolbar.pack(side='bottom', fill='x')
+        self._canvas.get_tk_widget().pack(side='top', fill='both',
+                                          expand=True)
+        self._canvas.draw_idle()
+
+    def _update_points(self, junk_axes=None):
+        # runs when zooming or panning changes the visible ranks, and
+        # matplotlib redraws after this
+        xmin, xmax = self._axes.get_xlim()
+        first = max(int(numpy.floor(max(xmin, 1))), 1)
+        last = min(int(numpy.ceil(xmax)), len(self._frequencies))
+        if first > last:
+            self._line.set_data([], [])
+            return
+        ranks = sample_ranks(first, last)
+        self._line.set_data(ranks, self._frequencies[ranks - 1])